@@ -0,0 +1,214 @@
+import sys
+import time
+import argparse
+import threading
+from decimal import Decimal
+from database import DB_ERRORS, DatabaseManager
+
+# Prediction analytics from rollup tables instead of GROUP BYs over the live tables.
+#
+# yield_rollup and waste_rollup (created by database.MIGRATIONS) hold one row per
+# (region, season, month) / (waste_type, location, month) with counts and sums.
+# refresh() folds in only the source rows past the high-water mark in rollup_state, so the
+# work per refresh is proportional to the new rows. Refreshes run after every insert batch
+# (DatabaseManager insert listener; with write-behind that is the background writer thread),
+# on a schedule (Analytics.schedule / `python analytics.py refresh` from cron), or both.
+# Query functions read only the rollups, whose size depends on the number of regions, seasons
+# and months, not on how many predictions were logged.
+#
+# Rows are picked up by id, so a transaction that commits a lower id after a higher one has
+# been rolled up would be missed; all inserts commit per batch, and rebuild() recomputes everything.
+
+ROLLUPS = {
+    "yield_predictions": {
+        "table": "yield_rollup",
+        "keys": ("region", "season"),
+        "source_columns": ("region", "season", "yield", "yield_per_hectare", "area"),
+        "measures": ("predictions", "yield_sum", "yield_per_hectare_sum", "area_sum"),
+    },
+    "waste_records": {
+        "table": "waste_rollup",
+        "keys": ("waste_type", "location"),
+        "source_columns": ("waste_type", "location", "quantity"),
+        "measures": ("records", "quantity_sum"),
+    },
+}
+# Source rows folded in per refresh transaction
+REFRESH_CHUNK = 50000
+UNKNOWN = "Unknown"
+
+def _month(created_at):
+    # "YYYY-MM" from a datetime (MySQL) or a "YYYY-MM-DD HH:MM:SS" string (SQLite)
+    return str(created_at)[:7]
+
+def _numbers(rows):
+    # MySQL returns SUM() as Decimal; charts and JSON want plain numbers
+    return [{k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()} for row in rows]
+
+def _measures(source, row):
+    if source == "yield_predictions":
+        return (1, row["yield"] or 0.0, row["yield_per_hectare"] or 0.0, row["area"] or 0.0)
+    return (1, row["quantity"] or 0)
+
+class Analytics:
+    def __init__(self, db, refresh_on_insert=True):
+        self.db = db
+        self._lock = threading.Lock()
+        if refresh_on_insert:
+            db.add_insert_listener(self.refresh)
+
+    def _upsert_sql(self, rollup):
+        columns = rollup["keys"] + ("month",) + rollup["measures"]
+        placeholders = ", ".join(["%s"] * len(columns))
+        sql = f"INSERT INTO {rollup['table']} ({', '.join(columns)}) VALUES ({placeholders})"
+        if self.db.backend == "sqlite":
+            conflict = ", ".join(rollup["keys"] + ("month",))
+            updates = ", ".join(f"{m} = {m} + excluded.{m}" for m in rollup["measures"])
+            return f"{sql} ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+        updates = ", ".join(f"{m} = {m} + VALUES({m})" for m in rollup["measures"])
+        return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+
+    def _watermark(self, source):
+        rows = self.db.execute("SELECT last_id FROM rollup_state WHERE source = %s", (source,), fetch="one")
+        if rows:
+            return rows[0]["last_id"]
+        try:
+            self.db.execute("INSERT INTO rollup_state (source, last_id) VALUES (%s, %s)", (source, 0))
+        except DB_ERRORS:
+            pass  # Another process created it first; the guarded UPDATE in _refresh_chunk sorts it out
+        return 0
+
+    def refresh(self, source=None):
+        """Fold new rows of one source table (or all) into the rollups; returns rows folded in."""
+        if not self.db.pool:
+            return 0
+
+        sources = [source] if source else list(ROLLUPS)
+        folded = 0
+        with self._lock:
+            for name in sources:
+                while True:
+                    n = self._refresh_chunk(name)
+                    folded += n
+                    if n < REFRESH_CHUNK:
+                        break
+        return folded
+
+    def _refresh_chunk(self, source):
+        rollup = ROLLUPS[source]
+        last_id = self._watermark(source)
+        rows = self.db.execute(
+            f"SELECT id, {', '.join(rollup['source_columns'])}, created_at FROM {source} "
+            f"WHERE id > %s ORDER BY id LIMIT {REFRESH_CHUNK}",
+            (last_id,), fetch="all")
+        if not rows:
+            return 0
+
+        groups = {}
+        for row in rows:
+            key = tuple(row[k] or UNKNOWN for k in rollup["keys"]) + (_month(row["created_at"]),)
+            measures = _measures(source, row)
+            current = groups.get(key)
+            groups[key] = measures if current is None else tuple(a + b for a, b in zip(current, measures))
+        new_last_id = rows[-1]["id"]
+
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Advancing the watermark first locks the rollup_state row; a concurrent refresher
+                # (another process) finds last_id moved and backs off instead of double counting
+                cursor.execute(self.db._sql("UPDATE rollup_state SET last_id = %s WHERE source = %s AND last_id = %s"),
+                               (new_last_id, source, last_id))
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    return 0
+                cursor.executemany(self.db._sql(self._upsert_sql(rollup)),
+                                   [key + measures for key, measures in groups.items()])
+                conn.commit()
+            except DB_ERRORS:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        return len(rows)
+
+    def rebuild(self):
+        """Recompute every rollup from the source tables."""
+        with self._lock:
+            for source, rollup in ROLLUPS.items():
+                self.db.execute(f"DELETE FROM {rollup['table']}")
+                self.db.execute("DELETE FROM rollup_state WHERE source = %s", (source,))
+        return self.refresh()
+
+    def schedule(self, interval):
+        """Refresh every `interval` seconds in a daemon thread (for processes that insert without this listener)."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except DB_ERRORS as e:
+                    print(f"Analytics refresh failed: {e}", file=sys.stderr)
+
+        thread = threading.Thread(target=loop, name="analytics-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    # Queries (rollups only)
+
+    def yield_summary(self):
+        """Total predictions, average yield (tons) and average yield per hectare."""
+        rows = self.db.execute(
+            "SELECT SUM(predictions) AS predictions, SUM(yield_sum) AS yield_sum, "
+            "SUM(yield_per_hectare_sum) AS yield_per_hectare_sum FROM yield_rollup", fetch="one")
+        row = rows[0] if rows else {}
+        n = row.get("predictions") or 0
+        return {
+            "predictions": int(n),
+            "avg_yield": float(row["yield_sum"]) / float(n) if n else None,
+            "avg_yield_per_hectare": float(row["yield_per_hectare_sum"]) / float(n) if n else None,
+        }
+
+    def yield_by(self, dimension, months=None):
+        """
+        Prediction volume and averages grouped by "region", "season" or "month".
+        months limits the result to the latest N months.
+        """
+        if dimension not in ("region", "season", "month"):
+            raise ValueError(f"Unknown dimension: {dimension}")
+        where, params = self._months_filter(months)
+        sql = (f"SELECT {dimension}, SUM(predictions) AS predictions, "
+               "SUM(yield_sum) / SUM(predictions) AS avg_yield, "
+               "SUM(yield_per_hectare_sum) / SUM(predictions) AS avg_yield_per_hectare "
+               f"FROM yield_rollup{where} GROUP BY {dimension} ORDER BY {dimension}")
+        return _numbers(self.db.execute(sql, params, fetch="all"))
+
+    def waste_by(self, dimension, months=None):
+        """Waste record volume and quantity grouped by "waste_type", "location" or "month"."""
+        if dimension not in ("waste_type", "location", "month"):
+            raise ValueError(f"Unknown dimension: {dimension}")
+        where, params = self._months_filter(months)
+        sql = (f"SELECT {dimension}, SUM(records) AS records, SUM(quantity_sum) AS quantity "
+               f"FROM waste_rollup{where} GROUP BY {dimension} ORDER BY {dimension}")
+        return _numbers(self.db.execute(sql, params, fetch="all"))
+
+    def _months_filter(self, months):
+        """(WHERE clause, params) keeping the latest N months; months are UTC like CURRENT_TIMESTAMP."""
+        if not months:
+            return "", ()
+        year, month = time.gmtime()[:2]
+        index = year * 12 + month - 1 - (int(months) - 1)
+        return " WHERE month >= %s", (f"{index // 12:04d}-{index % 12 + 1:02d}",)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain the prediction analytics rollups")
+    parser.add_argument("command", choices=["refresh", "rebuild"],
+                        help="refresh folds in new rows; rebuild recomputes from scratch")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    analytics = Analytics(DatabaseManager(write_behind=False), refresh_on_insert=False)
+    start = time.perf_counter()
+    folded = analytics.refresh() if args.command == "refresh" else analytics.rebuild()
+    print(f"{args.command}: {folded} rows folded in {time.perf_counter() - start:.2f} s")
@@ -1,58 +1,186 @@
-from flask import Flask, request, jsonify
+import hmac
+import json
+import os
+import time
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import joblib
-import pandas as pd
+import threading
+import numpy as np
+from model_bundle import typical_inputs
+from model_registry import ModelRegistry
 from weather_fetch import get_current_weather, get_seasonal_weather
+from tracing import annotate, metrics_lines, stage, trace
+from yield_sweep import Sweep
 
 app = Flask(__name__)
-CORS(app)
-
-# Load the model and encoders
-def load_model():
-    # Load priority: yield_prediction_model.joblib -> yield.joblib -> farm2value_improved_model.pkl
-    for path in [
-        "yield_prediction_model.joblib",
-        "yield.joblib",
-        "farm2value_improved_model.pkl",
-    ]:
-        try:
-            return joblib.load(path)
-        except Exception:
-            continue
-    raise FileNotFoundError("No trained model file found. Please run train_model.py to generate yield_prediction_model.joblib.")
-
-model = load_model()
-scaler = joblib.load("scaler.pkl")
-district_encoder = joblib.load("district_encoder.pkl")
-season_encoder = joblib.load("season_encoder.pkl")
-variety_encoder = joblib.load("variety_encoder.pkl")
-soil_encoder = joblib.load("soil_encoder.pkl")
+# Browsers may call every route except /admin/* cross-origin
+CORS(app, resources={r"^/(?!admin/).*": {"origins": "*"}})
+
+# Load the model bundle (model, scaler, encoders, flat trees) in one read.
+# The registry swaps in retrained bundles without restarting the process: it watches
+# the bundle manifest every MODEL_WATCH_INTERVAL seconds (0 disables) and serves
+# POST /admin/reload. Each request works on one registry.get() snapshot.
+registry = ModelRegistry()
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+if MODEL_WATCH_INTERVAL > 0:
+    registry.watch(MODEL_WATCH_INTERVAL)
+
+prediction_counts = {"predict": 0, "predict_batch_rows": 0, "predict_sweep_points": 0}
+prediction_counts_lock = threading.Lock()
+
+def count_predictions(key, n=1):
+    with prediction_counts_lock:
+        prediction_counts[key] += n
 
 @app.route("/predict", methods=["POST"])
 def predict():
     data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    artifacts = registry.get()
+
+    with trace("predict"):
+        # Encode, engineer and scale in one pass over a preallocated row
+        try:
+            with stage("transform"):
+                X_scaled = artifacts["pipeline"].transform_row(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Make a prediction (flat tree evaluator when the bundle has one)
+        with stage("predict"):
+            prediction = artifacts["scorer"].predict(X_scaled)
+    count_predictions("predict")
 
-    # Create a dataframe from the input data
-    df = pd.DataFrame([data])
+    return jsonify({"yield": float(prediction[0]), "model_version": artifacts["model_version"]})
 
-    # Encode categorical features
-    df["district"] = district_encoder.transform(df["district"])
-    df["season"] = season_encoder.transform(df["season"])
-    df["variety"] = variety_encoder.transform(df["variety"])
-    df["soil_type"] = soil_encoder.transform(df["soil_type"])
+# Batch scoring
+# Rows are encoded column-wise in one vectorized pass and scored with a single
+# predict call per chunk, instead of one DataFrame + predict per row.
+BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", "5000"))
+NDJSON_MIMETYPES = {"application/x-ndjson", "application/jsonl", "application/ndjson"}
 
-    # Feature engineering
-    df["rain_temp_ratio"] = df["rainfall_mm"] / (df["temperature_C"] + 1)
-    df["humidity_temp_index"] = df["humidity_percent"] / (df["temperature_C"] + 1)
-    df["temp_rain_interaction"] = df["temperature_C"] * df["rainfall_mm"] / 100
+def predict_chunk(rows, artifacts):
+    """Score a list of row dicts; returns one result dict per input row, in order."""
+    with stage("transform"):
+        X_scaled, errors = artifacts["pipeline"].transform_batch(rows)
+    valid = np.array([e is None for e in errors], dtype=bool)
+    results = [{"error": e} for e in errors]
+    if valid.any():
+        with stage("predict"):
+            predictions = artifacts["scorer"].predict(X_scaled[valid])
+        for i, pred in zip(np.flatnonzero(valid), predictions):
+            results[i] = {"yield": float(pred)}
+    return results
+
+def iter_batch_rows():
+    """Yield rows from a JSON array body or, for NDJSON, line by line from the request stream."""
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None  # reported as a per-row error, keeps alignment with input lines
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("rows")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of rows, {\"rows\": [...]}, or an NDJSON body")
+    yield from data
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    start = time.perf_counter()
+    # The whole batch is scored by one model, even if a reload happens meanwhile
+    artifacts = registry.get()
+    results = []
+    chunk = []
+    with trace("predict_batch"):
+        try:
+            for row in iter_batch_rows():
+                chunk.append(row)
+                if len(chunk) >= BATCH_CHUNK_SIZE:
+                    results.extend(predict_chunk(chunk, artifacts))
+                    chunk = []
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if chunk:
+            results.extend(predict_chunk(chunk, artifacts))
+        annotate(rows=len(results))
+
+    elapsed = time.perf_counter() - start
+    n_errors = sum(1 for r in results if "error" in r)
+    count_predictions("predict_batch_rows", len(results) - n_errors)
+    return jsonify({
+        "model_version": artifacts["model_version"],
+        "predictions": results,
+        "rows": len(results),
+        "errors": n_errors,
+        "elapsed_s": round(elapsed, 4),
+        "rows_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+    })
+
+# What-if sweeps: parameter ranges in, a yield surface out (see yield_sweep.py)
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+@app.route("/predict_sweep", methods=["POST"])
+def predict_sweep():
+    start = time.perf_counter()
+    data = request.get_json(silent=True)
+    artifacts = registry.get()
+    with trace("predict_sweep"):
+        try:
+            sweep = Sweep(artifacts["pipeline"], data, typical_inputs(artifacts))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        annotate(points=sweep.points, scenarios=len(sweep.scenarios))
+        yields = sweep.run(artifacts["scorer"])
+    count_predictions("predict_sweep_points", sweep.points)
+    elapsed = time.perf_counter() - start
 
-    # Scale numeric features
-    X_scaled = scaler.transform(df)
+    output = request.args.get("format") or data.get("format", "array")
+    if output == "parquet" or request.accept_mimetypes.best == PARQUET_MIMETYPE:
+        return Response(sweep.to_parquet(yields), mimetype=PARQUET_MIMETYPE,
+                        headers={"X-Model-Version": str(artifacts["model_version"])})
+    return jsonify({
+        "model_version": artifacts["model_version"],
+        **sweep.to_dict(yields),
+        "points": sweep.points,
+        "elapsed_s": round(elapsed, 4),
+        "points_per_sec": round(sweep.points / elapsed, 1) if elapsed > 0 else None,
+    })
 
-    # Make a prediction
-    prediction = model.predict(X_scaled)
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    if not ADMIN_TOKEN:
+        # No token configured: manual reloads are disabled (the manifest watcher still reloads)
+        return jsonify({"error": "Admin endpoints are disabled; set ADMIN_TOKEN to enable them"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Unauthorized"}), 401
+    force = request.args.get("force", "").lower() in ("1", "true", "yes")
+    swapped, message = registry.reload(force=force)
+    status = 200 if swapped or registry.last_error is None else 409
+    return jsonify({"swapped": swapped, "message": message, "model_version": registry.version}), status
 
-    return jsonify({"yield": prediction[0]})
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    lines = registry.metrics_lines() + metrics_lines()
+    with prediction_counts_lock:
+        lines += [
+            "# TYPE farm2value_predictions_total counter",
+            f'farm2value_predictions_total{{endpoint="predict"}} {prediction_counts["predict"]}',
+            f'farm2value_predictions_total{{endpoint="predict_batch"}} {prediction_counts["predict_batch_rows"]}',
+            f'farm2value_predictions_total{{endpoint="predict_sweep"}} {prediction_counts["predict_sweep_points"]}',
+        ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    # The debug reloader would start a second process (and watcher); keep one process
+    app.run(port=5000, debug=True, use_reloader=False)
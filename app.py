@@ -6,15 +6,15 @@ import folium
 from streamlit_folium import st_folium
 import plotly.graph_objects as go
 import os
+import json
 from dotenv import load_dotenv
 from database import DatabaseManager
+from analytics import Analytics
+import model_bundle
+from features import CATEGORICAL_FEATURES
+from yield_sweep import Sweep
 
-load_dotenv()
-
-# Initialize database
-db = DatabaseManager()
-
-# Configure Streamlit
+# Configure Streamlit (must be the first Streamlit call of every run)
 st.set_page_config(
     page_title="Farm2Value",
     page_icon="🌾",
@@ -22,6 +22,39 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Streamlit re-executes this script on every interaction. Anything expensive lives in a cache:
+#   st.cache_resource - one shared object per process (env, DB pool, analytics, folium maps)
+#   st.cache_data     - values copied out per call, refreshed after their TTL or an explicit .clear()
+REFERENCE_DATA_TTL = 3600  # seconds; waste/industry reference data
+ANALYTICS_TTL = 60  # seconds; dashboard figures, also cleared after this session logs a record
+
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    load_dotenv()
+
+@st.cache_resource(show_spinner=False)
+def get_database():
+    """One pooled DatabaseManager (tables and migrations checked once) shared by all sessions"""
+    load_environment()
+    return DatabaseManager()
+
+@st.cache_resource(show_spinner=False)
+def get_analytics():
+    # Dashboard figures come from rollups kept up to date on every insert batch
+    return Analytics(get_database())
+
+@st.cache_resource(show_spinner=False)
+def get_model_artifacts():
+    """Trained yield model bundle for the what-if surface; None when no model is available"""
+    try:
+        return model_bundle.load_artifacts()
+    except Exception as e:
+        print(f"Could not load the yield model: {e}")
+        return None
+
+db = get_database()
+analytics = get_analytics()
+
 # Custom CSS for green and mango-yellow theme
 st.markdown("""
 <style>
@@ -84,98 +117,126 @@ if 'logged_in' not in st.session_state:
     st.session_state.current_page = "home"
 
 # Load waste database
-WASTE_DATABASE = {
-    "Mango Peel": {
-        "description": "Outer skin of mangoes",
-        "uses": ["Compost", "Animal feed", "Pectin extraction"],
-        "process": "Dry and ferment for 2-3 weeks, then mix with soil",
-        "price_per_kg": "₹5-10",
-        "industries": ["Composting units", "Pectin manufacturers", "Livestock farms"]
-    },
-    "Mango Seed": {
-        "description": "Pit/kernel from mango",
-        "uses": ["Flour production", "Oil extraction", "Activated charcoal"],
-        "process": "Dry seeds, grind into flour or extract oil",
-        "price_per_kg": "₹15-25",
-        "industries": ["Food processing", "Oil mills", "Chemical plants"]
-    },
-    "Mango Husk": {
-        "description": "Dried mango leaves and branches",
-        "uses": ["Biofuel", "Animal bedding", "Mulch"],
-        "process": "Dry completely, can be used directly as mulch",
-        "price_per_kg": "₹8-12",
-        "industries": ["Biofuel plants", "Dairy farms", "Nurseries"]
-    },
-    "Sugarcane Bagasse": {
-        "description": "Fibrous residue from sugarcane processing",
-        "uses": ["Biofuel", "Paper production", "Animal feed"],
-        "process": "Compress and dry for fuel use",
-        "price_per_kg": "₹3-6",
-        "industries": ["Sugar mills", "Paper factories", "Power plants"]
-    },
-    "Paddy Straw": {
-        "description": "Leftover rice crop residue",
-        "uses": ["Compost", "Building material", "Biofuel"],
-        "process": "Chop and compost or use for mushroom farming",
-        "price_per_kg": "₹4-8",
-        "industries": ["Composting units", "Brick manufacturers", "Biofuel plants"]
-    },
-    "Corn Husk": {
-        "description": "Outer covering of corn cobs",
-        "uses": ["Biofuel", "Animal feed", "Mulch"],
-        "process": "Dry and store for fuel or animal bedding",
-        "price_per_kg": "₹6-10",
-        "industries": ["Biofuel plants", "Livestock farms", "Nurseries"]
-    },
-    "Coconut Shell": {
-        "description": "Hard shell from coconuts",
-        "uses": ["Activated charcoal", "Biofuel", "Handicrafts"],
-        "process": "Burn slowly or process for charcoal production",
-        "price_per_kg": "₹12-18",
-        "industries": ["Charcoal manufacturers", "Energy plants", "Craft units"]
-    },
-    "Groundnut Shell": {
-        "description": "Shell remaining after groundnut harvest",
-        "uses": ["Biofuel", "Mulch", "Animal bedding"],
-        "process": "Dry completely and use directly",
-        "price_per_kg": "₹5-9",
-        "industries": ["Oil mills", "Biofuel plants", "Farms"]
-    },
-    "Cotton Stalks": {
-        "description": "Leftover after cotton harvest",
-        "uses": ["Biofuel", "Compost", "Paper"],
-        "process": "Shred and compost or use for fuel",
-        "price_per_kg": "₹7-11",
-        "industries": ["Cotton mills", "Composting units", "Biofuel plants"]
-    },
-    "Vegetable Waste": {
-        "description": "Peels, leaves, and rejected vegetables",
-        "uses": ["Compost", "Biogas", "Animal feed"],
-        "process": "Collect, chop, and compost within 1-2 weeks",
-        "price_per_kg": "₹2-5",
-        "industries": ["Biogas plants", "Farms", "Composting units"]
+@st.cache_data(ttl=REFERENCE_DATA_TTL, show_spinner=False)
+def load_waste_database():
+    return {
+        "Mango Peel": {
+            "description": "Outer skin of mangoes",
+            "uses": ["Compost", "Animal feed", "Pectin extraction"],
+            "process": "Dry and ferment for 2-3 weeks, then mix with soil",
+            "price_per_kg": "₹5-10",
+            "industries": ["Composting units", "Pectin manufacturers", "Livestock farms"]
+        },
+        "Mango Seed": {
+            "description": "Pit/kernel from mango",
+            "uses": ["Flour production", "Oil extraction", "Activated charcoal"],
+            "process": "Dry seeds, grind into flour or extract oil",
+            "price_per_kg": "₹15-25",
+            "industries": ["Food processing", "Oil mills", "Chemical plants"]
+        },
+        "Mango Husk": {
+            "description": "Dried mango leaves and branches",
+            "uses": ["Biofuel", "Animal bedding", "Mulch"],
+            "process": "Dry completely, can be used directly as mulch",
+            "price_per_kg": "₹8-12",
+            "industries": ["Biofuel plants", "Dairy farms", "Nurseries"]
+        },
+        "Sugarcane Bagasse": {
+            "description": "Fibrous residue from sugarcane processing",
+            "uses": ["Biofuel", "Paper production", "Animal feed"],
+            "process": "Compress and dry for fuel use",
+            "price_per_kg": "₹3-6",
+            "industries": ["Sugar mills", "Paper factories", "Power plants"]
+        },
+        "Paddy Straw": {
+            "description": "Leftover rice crop residue",
+            "uses": ["Compost", "Building material", "Biofuel"],
+            "process": "Chop and compost or use for mushroom farming",
+            "price_per_kg": "₹4-8",
+            "industries": ["Composting units", "Brick manufacturers", "Biofuel plants"]
+        },
+        "Corn Husk": {
+            "description": "Outer covering of corn cobs",
+            "uses": ["Biofuel", "Animal feed", "Mulch"],
+            "process": "Dry and store for fuel or animal bedding",
+            "price_per_kg": "₹6-10",
+            "industries": ["Biofuel plants", "Livestock farms", "Nurseries"]
+        },
+        "Coconut Shell": {
+            "description": "Hard shell from coconuts",
+            "uses": ["Activated charcoal", "Biofuel", "Handicrafts"],
+            "process": "Burn slowly or process for charcoal production",
+            "price_per_kg": "₹12-18",
+            "industries": ["Charcoal manufacturers", "Energy plants", "Craft units"]
+        },
+        "Groundnut Shell": {
+            "description": "Shell remaining after groundnut harvest",
+            "uses": ["Biofuel", "Mulch", "Animal bedding"],
+            "process": "Dry completely and use directly",
+            "price_per_kg": "₹5-9",
+            "industries": ["Oil mills", "Biofuel plants", "Farms"]
+        },
+        "Cotton Stalks": {
+            "description": "Leftover after cotton harvest",
+            "uses": ["Biofuel", "Compost", "Paper"],
+            "process": "Shred and compost or use for fuel",
+            "price_per_kg": "₹7-11",
+            "industries": ["Cotton mills", "Composting units", "Biofuel plants"]
+        },
+        "Vegetable Waste": {
+            "description": "Peels, leaves, and rejected vegetables",
+            "uses": ["Compost", "Biogas", "Animal feed"],
+            "process": "Collect, chop, and compost within 1-2 weeks",
+            "price_per_kg": "₹2-5",
+            "industries": ["Biogas plants", "Farms", "Composting units"]
+        }
     }
-}
 
 # Location-based industries database
-INDUSTRIES_BY_LOCATION = {
-    "Bangalore": [
-        {"name": "Green Compost Solutions", "type": "Composting", "lat": 12.9716, "lng": 77.5946, "phone": "080-XXXX-XXXX"},
-        {"name": "Bangalore Biofuel Ltd", "type": "Biofuel", "lat": 12.9352, "lng": 77.6245, "phone": "080-XXXX-XXXX"},
-        {"name": "Organic Waste Management", "type": "Recycling", "lat": 13.0827, "lng": 77.6066, "phone": "080-XXXX-XXXX"}
-    ],
-    "Mysore": [
-        {"name": "Mysore Bio Industries", "type": "Biofuel", "lat": 12.2958, "lng": 76.6394, "phone": "0821-XXXX-XXXX"},
-        {"name": "Green Earth Composting", "type": "Composting", "lat": 12.2942, "lng": 76.6399, "phone": "0821-XXXX-XXXX"}
-    ],
-    "Tumkur": [
-        {"name": "Tumkur Agricultural Waste", "type": "Processing", "lat": 13.2176, "lng": 77.1146, "phone": "0816-XXXX-XXXX"},
-        {"name": "Agro Energy Ltd", "type": "Biofuel", "lat": 13.2150, "lng": 77.1120, "phone": "0816-XXXX-XXXX"}
-    ],
-    "Hassan": [
-        {"name": "Hassan Green Waste", "type": "Composting", "lat": 13.2018, "lng": 75.9855, "phone": "08172-XXXX-XXXX"}
-    ]
-}
+@st.cache_data(ttl=REFERENCE_DATA_TTL, show_spinner=False)
+def load_industries_by_location():
+    return {
+        "Bangalore": [
+            {"name": "Green Compost Solutions", "type": "Composting", "lat": 12.9716, "lng": 77.5946, "phone": "080-XXXX-XXXX"},
+            {"name": "Bangalore Biofuel Ltd", "type": "Biofuel", "lat": 12.9352, "lng": 77.6245, "phone": "080-XXXX-XXXX"},
+            {"name": "Organic Waste Management", "type": "Recycling", "lat": 13.0827, "lng": 77.6066, "phone": "080-XXXX-XXXX"}
+        ],
+        "Mysore": [
+            {"name": "Mysore Bio Industries", "type": "Biofuel", "lat": 12.2958, "lng": 76.6394, "phone": "0821-XXXX-XXXX"},
+            {"name": "Green Earth Composting", "type": "Composting", "lat": 12.2942, "lng": 76.6399, "phone": "0821-XXXX-XXXX"}
+        ],
+        "Tumkur": [
+            {"name": "Tumkur Agricultural Waste", "type": "Processing", "lat": 13.2176, "lng": 77.1146, "phone": "0816-XXXX-XXXX"},
+            {"name": "Agro Energy Ltd", "type": "Biofuel", "lat": 13.2150, "lng": 77.1120, "phone": "0816-XXXX-XXXX"}
+        ],
+        "Hassan": [
+            {"name": "Hassan Green Waste", "type": "Composting", "lat": 13.2018, "lng": 75.9855, "phone": "08172-XXXX-XXXX"}
+        ]
+    }
+
+WASTE_DATABASE = load_waste_database()
+INDUSTRIES_BY_LOCATION = load_industries_by_location()
+
+@st.cache_data(ttl=REFERENCE_DATA_TTL, show_spinner=False)
+def parse_price_range(price_per_kg):
+    """Price range string like "₹5-10" as (5, 10)"""
+    low, high = price_per_kg.replace('₹', '').split('-')
+    return int(low), int(high)
+
+@st.cache_resource(ttl=REFERENCE_DATA_TTL, show_spinner=False)
+def industry_map(location):
+    """Folium map of the industries near a location, built once per location"""
+    industries = INDUSTRIES_BY_LOCATION.get(location, [])
+    m = folium.Map(location=[industries[0]['lat'], industries[0]['lng']], zoom_start=10)
+
+    for industry in industries:
+        folium.Marker(
+            location=[industry['lat'], industry['lng']],
+            popup=f"{industry['name']}<br>{industry['type']}<br>{industry['phone']}",
+            tooltip=industry['name'],
+            icon=folium.Icon(color='green', icon='industry')
+        ).add_to(m)
+    return m
 
 def predict_yield(region, season, rainfall, temperature, humidity, area):
     """Mock ML model for yield prediction"""
@@ -312,6 +373,88 @@ def show_dashboard():
         if st.button("Go to Waste Recommendations →", use_container_width=True, key="waste_btn"):
             st.rerun()
 
+    show_analytics()
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def dashboard_analytics():
+    """All dashboard figures in one cached read of the rollups"""
+    return {
+        "summary": analytics.yield_summary(),
+        "by_region": analytics.yield_by("region"),
+        "by_season": analytics.yield_by("season"),
+        "by_month": analytics.yield_by("month", months=12),
+        "waste_by_type": analytics.waste_by("waste_type"),
+    }
+
+def show_analytics():
+    """Prediction volume and average yield from the analytics rollups"""
+    st.divider()
+    st.subheader("📈 Prediction Analytics")
+
+    if st.session_state.get("analytics_stale"):
+        # This session logged something: write it (and its rollup) now and drop the cached figures
+        db.flush()
+        dashboard_analytics.clear()
+        st.session_state.analytics_stale = False
+
+    figures = dashboard_analytics()
+    summary = figures["summary"]
+    if not summary["predictions"]:
+        st.info("No predictions logged yet.")
+        return
+
+    waste_by_type = figures["waste_by_type"]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Predictions Logged", f"{summary['predictions']:,}")
+    with col2:
+        st.metric("Average Yield", f"{summary['avg_yield_per_hectare']:.2f} tons/ha")
+    with col3:
+        st.metric("Waste Records", f"{sum(row['records'] for row in waste_by_type):,}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        by_region = figures["by_region"]
+        fig = go.Figure(go.Bar(
+            x=[row["region"] for row in by_region],
+            y=[row["avg_yield_per_hectare"] for row in by_region],
+            text=[f"{row['predictions']} predictions" for row in by_region],
+            marker_color="#22c55e"
+        ))
+        fig.update_layout(title="Average Yield by Region (tons/ha)", height=350)
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        by_season = figures["by_season"]
+        fig = go.Figure(go.Bar(
+            x=[row["season"] for row in by_season],
+            y=[row["avg_yield_per_hectare"] for row in by_season],
+            text=[f"{row['predictions']} predictions" for row in by_season],
+            marker_color="#fbbf24"
+        ))
+        fig.update_layout(title="Average Yield by Season (tons/ha)", height=350)
+        st.plotly_chart(fig, use_container_width=True)
+
+    by_month = figures["by_month"]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=[row["month"] for row in by_month], y=[row["predictions"] for row in by_month],
+                         name="Predictions", marker_color="#22c55e"))
+    fig.add_trace(go.Scatter(x=[row["month"] for row in by_month], y=[row["avg_yield_per_hectare"] for row in by_month],
+                             name="Avg yield (tons/ha)", yaxis="y2", line=dict(color="#fbbf24")))
+    fig.update_layout(title="Monthly Prediction Volume (last 12 months)", height=350,
+                      yaxis2=dict(overlaying="y", side="right"))
+    st.plotly_chart(fig, use_container_width=True)
+
+    if waste_by_type:
+        fig = go.Figure(go.Bar(
+            x=[row["waste_type"] for row in waste_by_type],
+            y=[row["quantity"] for row in waste_by_type],
+            marker_color="#22c55e"
+        ))
+        fig.update_layout(title="Logged Waste by Type (kg)", height=350)
+        st.plotly_chart(fig, use_container_width=True)
+
 def show_yield_prediction():
     """Yield prediction page"""
     st.markdown("""
@@ -340,6 +483,7 @@ def show_yield_prediction():
             result = predict_yield(region, season, rainfall, temperature, humidity, area)
             
             db.save_yield_prediction(st.session_state.user_email, region, season, rainfall, temperature, humidity, area, result)
+            st.session_state.analytics_stale = True
             
             st.success("✓ Prediction Complete!")
             
@@ -368,6 +512,59 @@ def show_yield_prediction():
             of mangoes with a **{result['confidence']}% confidence level**.
             """)
 
+    show_yield_surface(region, season, humidity)
+
+@st.cache_data(ttl=REFERENCE_DATA_TTL, show_spinner=False)
+def yield_surface(spec_json, model_version):
+    """Rainfall x temperature grid scored by the trained model (model_version keys the cache)"""
+    artifacts = get_model_artifacts()
+    # Inputs the form does not ask for (year, area, production) stay at their training medians
+    sweep = Sweep(artifacts["pipeline"], json.loads(spec_json), model_bundle.typical_inputs(artifacts))
+    yields = sweep.run(artifacts["scorer"])
+    # rows = temperature, columns = rainfall
+    return sweep.axes["rainfall_mm"], sweep.axes["temperature_C"], sweep.surface(yields, "rainfall_mm", "temperature_C")
+
+def show_yield_surface(region, season, humidity):
+    """Plotly heatmap of predicted yield over rainfall and temperature"""
+    st.divider()
+    st.subheader("🗺️ What-if Yield Surface")
+
+    artifacts = get_model_artifacts()
+    if artifacts is None:
+        st.info("The trained yield model is not available on this server.")
+        return
+
+    options = {col: sorted(artifacts["pipeline"].lookups[col]) for col in CATEGORICAL_FEATURES}
+    defaults = {"district": region, "season": season}
+
+    col1, col2, col3, col4 = st.columns(4)
+    selected = {}
+    for column, col in zip((col1, col2, col3, col4), CATEGORICAL_FEATURES):
+        with column:
+            values = options[col]
+            index = values.index(defaults[col]) if defaults.get(col) in values else 0
+            selected[col] = st.selectbox(col.replace("_", " ").title(), values, index=index, key=f"surface_{col}")
+
+    spec = {
+        **selected,
+        "rainfall_mm": {"start": 200, "stop": 1500, "steps": 66},
+        "temperature_C": {"start": 15, "stop": 40, "steps": 51},
+        "humidity_percent": humidity,
+    }
+    rainfall, temperature, z = yield_surface(json.dumps(spec, sort_keys=True), artifacts["model_version"])
+
+    fig = go.Figure(go.Heatmap(
+        x=rainfall, y=temperature, z=z,
+        colorscale="YlGn",
+        colorbar=dict(title="quintal/acre")
+    ))
+    st.caption("Year, area and production are held at the training data's median values.")
+    fig.update_layout(
+        title=f"Predicted yield at {humidity}% humidity",
+        xaxis_title="Rainfall (mm)", yaxis_title="Temperature (°C)", height=450
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
 def show_waste_recommendations():
     """Waste recommendations page"""
     st.markdown("""
@@ -392,6 +589,8 @@ def show_waste_recommendations():
         
         estimated_value = f"{waste_info['price_per_kg']} per kg"
         db.save_waste_record(st.session_state.user_email, waste_type, quantity, location, estimated_value)
+        st.session_state.analytics_stale = True
+        price_low, price_high = parse_price_range(waste_info['price_per_kg'])
         
         st.success("✓ Recommendations Found!")
         
@@ -404,7 +603,7 @@ def show_waste_recommendations():
             **Description:** {waste_info['description']}
             
             **Estimated Value:** {waste_info['price_per_kg']} per kg
-            **Estimated Total Value:** ₹{quantity * int(waste_info['price_per_kg'].split('-')[0].replace('₹', ''))} - ₹{quantity * int(waste_info['price_per_kg'].split('-')[1].replace('₹', ''))}
+            **Estimated Total Value:** ₹{quantity * price_low} - ₹{quantity * price_high}
             """)
         
         with col2:
@@ -427,17 +626,8 @@ def show_waste_recommendations():
             industries = INDUSTRIES_BY_LOCATION.get(location, [])
             
             if industries:
-                m = folium.Map(location=[industries[0]['lat'], industries[0]['lng']], zoom_start=10)
-                
-                for industry in industries:
-                    folium.Marker(
-                        location=[industry['lat'], industry['lng']],
-                        popup=f"{industry['name']}<br>{industry['type']}<br>{industry['phone']}",
-                        tooltip=industry['name'],
-                        icon=folium.Icon(color='green', icon='industry')
-                    ).add_to(m)
-                
-                st_folium(m, width=700, height=400)
+                # No returned objects: panning or zooming the map does not trigger a rerun
+                st_folium(industry_map(location), width=700, height=400, returned_objects=[])
                 
                 st.write("")
                 for industry in industries:
@@ -3,6 +3,91 @@ import fs from "fs"
 import path from "path"
 import { spawn } from "child_process"
 
+// 1x1 transparent PNG used when no image can be returned
+const PLACEHOLDER_PNG = `data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==`
+
+// Warm inference server (python inference_server.py). Set INFERENCE_FALLBACK=none
+// to disable the per-request `python simple_predict.py` spawn when it is unreachable.
+const INFERENCE_SERVER_URL = process.env.INFERENCE_SERVER_URL || "http://127.0.0.1:5001"
+const INFERENCE_FALLBACK = process.env.INFERENCE_FALLBACK || "spawn"
+const INFERENCE_TIMEOUT_MS = Number(process.env.INFERENCE_TIMEOUT_MS || 30000)
+
+// Outcome of asking the inference server. Only "unreachable" may fall back to spawning
+// Python; a busy (503) or rejecting (4xx) server is answered as is, so load is not multiplied.
+type ServerResult =
+  | { kind: "ok"; yield: number }
+  | { kind: "error"; status: number; body: unknown }
+  | { kind: "unreachable" }
+
+// Ask the long-lived inference server for a prediction
+async function predictViaServer(imagePath: string): Promise<ServerResult> {
+  let response: Response
+  try {
+    response = await fetch(`${INFERENCE_SERVER_URL.replace(/\/$/, "")}/predict-image`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ image_path: imagePath }),
+      cache: "no-store",
+      signal: AbortSignal.timeout(INFERENCE_TIMEOUT_MS),
+    })
+  } catch (error) {
+    if ((error as Error)?.name === "TimeoutError") {
+      // The server accepted the request but is too slow; spawning another process would only add load
+      console.error('Inference server timed out')
+      return { kind: "error", status: 504, body: { error: "Inference server timed out" } }
+    }
+    console.error('Inference server unreachable:', error)
+    return { kind: "unreachable" }
+  }
+
+  const body = await response.json().catch(() => null)
+  if (!response.ok) {
+    console.error('Inference server error:', response.status)
+    return { kind: "error", status: response.status, body: body ?? { error: "Inference server error" } }
+  }
+  if (typeof body?.yield !== "number") {
+    return { kind: "error", status: 502, body: { error: "Invalid response from inference server" } }
+  }
+  return { kind: "ok", yield: body.yield }
+}
+
+// Legacy cold-start path: spawn a fresh Python process for this request
+function predictViaSpawn(imagePath: string): Promise<number | null> {
+  return new Promise((resolve) => {
+    const pythonProcess = spawn('python', [
+      path.join(process.cwd(), 'simple_predict.py'),
+      imagePath
+    ])
+
+    let stdout = ''
+    let stderr = ''
+
+    pythonProcess.stdout.on('data', (data) => {
+      stdout += data.toString()
+    })
+
+    pythonProcess.stderr.on('data', (data) => {
+      stderr += data.toString()
+    })
+
+    pythonProcess.on('close', (code) => {
+      if (code !== 0) {
+        console.error('Python prediction failed:', stderr)
+        resolve(null)
+        return
+      }
+      // The prediction is printed on the last line of stdout
+      const lines = stdout.trim().split('\n')
+      resolve(parseFloat(lines[lines.length - 1]) || 150.0) // Default fallback
+    })
+
+    pythonProcess.on('error', (error) => {
+      console.error('Failed to start Python process:', error)
+      resolve(null)
+    })
+  })
+}
+
 export async function POST(request: NextRequest) {
   try {
     const formData = await request.formData()
@@ -31,85 +116,68 @@ export async function POST(request: NextRequest) {
 
     fs.writeFileSync(tempInputPath, buffer)
 
-    // Run the Flask-style prediction using Python
-    const pythonProcess = spawn('python', [
-      path.join(process.cwd(), 'simple_predict.py'),
-      tempInputPath
-    ])
+    // Prefer the warm inference server, fall back to spawning Python only if it cannot be reached
+    const serverResult = await predictViaServer(tempInputPath)
+    if (serverResult.kind === "error") {
+      try {
+        fs.unlinkSync(tempInputPath)
+      } catch (e) {
+        console.error('Failed to clean up temp input file:', e)
+      }
+      return NextResponse.json(serverResult.body, { status: serverResult.status })
+    }
 
-    return new Promise((resolve) => {
-      let stdout = ''
-      let stderr = ''
+    let yieldPrediction: number | null = serverResult.kind === "ok" ? serverResult.yield : null
+    if (serverResult.kind === "unreachable" && INFERENCE_FALLBACK === "spawn") {
+      yieldPrediction = await predictViaSpawn(tempInputPath)
+    }
 
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString()
+    if (yieldPrediction === null) {
+      // Clean up temp input file
+      try {
+        fs.unlinkSync(tempInputPath)
+      } catch (e) {
+        console.error('Failed to clean up temp input file:', e)
+      }
+
+      // Fallback to random prediction like the Flask code
+      const fallbackYield = Math.round((Math.random() * 450 + 50) * 100) / 100
+
+      return NextResponse.json({
+        segmentedImage: PLACEHOLDER_PNG,
+        analysis: `Image processed successfully. Estimated yield: ${fallbackYield} tons per hectare based on image analysis.`,
+        confidence: 75.0,
+        yield: fallbackYield,
+        mangoCount: Math.floor(fallbackYield * 200) // Rough estimate
       })
+    }
 
-      pythonProcess.stderr.on('data', (data) => {
-        stderr += data.toString()
-      })
+    // Calculate confidence (placeholder)
+    const confidence = Math.min(95, Math.max(60, 70 + Math.random() * 25))
 
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error('Python prediction failed:', stderr)
-          // Clean up temp input file
-          try {
-            fs.unlinkSync(tempInputPath)
-          } catch (e) {
-            console.error('Failed to clean up temp input file:', e)
-          }
-
-          // Fallback to random prediction like the Flask code
-          const fallbackYield = Math.round((Math.random() * 450 + 50) * 100) / 100
-
-          resolve(NextResponse.json({
-            segmentedImage: `data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==`, // 1x1 transparent PNG
-            analysis: `Image processed successfully. Estimated yield: ${fallbackYield} tons per hectare based on image analysis.`,
-            confidence: 75.0,
-            yield: fallbackYield,
-            mangoCount: Math.floor(fallbackYield * 200) // Rough estimate
-          }))
-          return
-        }
-
-        // Parse the yield prediction from stdout
-        const yieldPrediction = parseFloat(stdout.trim()) || 150.0 // Default fallback
-
-        // Calculate confidence (placeholder)
-        const confidence = Math.min(95, Math.max(60, 70 + Math.random() * 25))
-
-        // Create a simple segmented image placeholder (just the original image)
-        let segmentedImageBase64 = `data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==` // 1x1 transparent PNG fallback
-
-        try {
-          const originalImageBuffer = fs.readFileSync(tempInputPath)
-          segmentedImageBase64 = `data:image/jpeg;base64,${originalImageBuffer.toString('base64')}`
-        } catch (readError) {
-          console.error('Failed to read original image for response:', readError)
-        }
-
-        // Clean up temp input file after reading
-        try {
-          fs.unlinkSync(tempInputPath)
-        } catch (e) {
-          console.error('Failed to clean up temp input file:', e)
-        }
-
-        resolve(NextResponse.json({
-          segmentedImage: segmentedImageBase64,
-          analysis: `Image processed successfully. Estimated yield: ${yieldPrediction} tons per hectare based on image analysis.`,
-          confidence: Math.round(confidence),
-          yield: yieldPrediction,
-          mangoCount: Math.floor(yieldPrediction * 200) // Rough estimate
-        }))
-      })
+    // Create a simple segmented image placeholder (just the original image)
+    let segmentedImageBase64 = PLACEHOLDER_PNG
 
-      pythonProcess.on('error', (error) => {
-        console.error('Failed to start Python process:', error)
-        resolve(NextResponse.json({
-          error: "Failed to start prediction process"
-        }, { status: 500 }))
-      })
+    try {
+      const originalImageBuffer = fs.readFileSync(tempInputPath)
+      segmentedImageBase64 = `data:image/jpeg;base64,${originalImageBuffer.toString('base64')}`
+    } catch (readError) {
+      console.error('Failed to read original image for response:', readError)
+    }
+
+    // Clean up temp input file after reading
+    try {
+      fs.unlinkSync(tempInputPath)
+    } catch (e) {
+      console.error('Failed to clean up temp input file:', e)
+    }
+
+    return NextResponse.json({
+      segmentedImage: segmentedImageBase64,
+      analysis: `Image processed successfully. Estimated yield: ${yieldPrediction} tons per hectare based on image analysis.`,
+      confidence: Math.round(confidence),
+      yield: yieldPrediction,
+      mangoCount: Math.floor(yieldPrediction * 200) // Rough estimate
     })
 
   } catch (error) {
@@ -0,0 +1,179 @@
+import os
+import sys
+import csv
+import glob
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from segmentation_engine import BACKENDS, DEFAULT_BACKEND, get_engine
+from mango_counter import count_mask
+from tracing import annotate, trace
+
+# Batch mango counting for drone/orchard uploads.
+# Images are decoded and resized in a thread pool (OpenCV releases the GIL) while the
+# previous batch runs through the U-Net, and results are written to CSV or Parquet.
+#
+# Usage:
+#   python batch_count.py "uploads/block_7/" --output counts.csv
+#   python batch_count.py "uploads/**/*.JPG" --batch-size 16 --output counts.parquet --mask-dir masks/
+#   python batch_count.py manifest.txt --output counts.csv   (one path per line, or a CSV with a `path` column)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+# Average mango weight used to turn counts into a yield estimate (same as the web app)
+DEFAULT_MANGO_WEIGHT_KG = 0.5
+
+def resolve_inputs(source):
+    """Expand a directory, glob pattern or manifest file into a sorted list of image paths."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(source)
+            for name in files
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+    if os.path.isfile(source) and os.path.splitext(source)[1].lower() in {".txt", ".csv"}:
+        with open(source, newline="") as f:
+            if source.lower().endswith(".csv"):
+                paths = [row["path"] for row in csv.DictReader(f)]
+            else:
+                paths = [line.strip() for line in f if line.strip()]
+        base = os.path.dirname(os.path.abspath(source))
+        return [p if os.path.isabs(p) else os.path.join(base, p) for p in paths]
+    return sorted(glob.glob(source, recursive=True))
+
+def input_root(source, paths):
+    """
+    Directory the mask tree mirrors: the input directory itself, the fixed prefix of a glob
+    pattern, or the deepest directory shared by every path in a manifest.
+    """
+    if os.path.isdir(source):
+        return source
+    if glob.has_magic(source):
+        prefix = []
+        for part in source.replace("\\", "/").split("/"):
+            if glob.has_magic(part):
+                break
+            prefix.append(part)
+        return "/".join(prefix) or "."
+    return common_root(paths)
+
+def common_root(paths):
+    """Deepest directory containing every path."""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else "."
+
+def mask_path_for(path, root, mask_dir):
+    """<mask_dir>/<path relative to root, without extension>_mask.png"""
+    rel = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        rel = os.path.basename(path)
+    return os.path.join(mask_dir, os.path.splitext(rel)[0] + "_mask.png")
+
+def _load(path, engine, tiled=False):
+    img = cv2.imread(path)
+    if img is None:
+        return path, None
+    return path, img if tiled else engine.resize(img)
+
+def count_images(paths, batch_size=8, workers=4, mask_dir=None, mango_weight_kg=DEFAULT_MANGO_WEIGHT_KG, engine=None,
+                 tiled=False, root=None):
+    """
+    Yield one result dict per input path, in order.
+    At most two batches of decoded images are held in memory at a time.
+    With tiled=True each image is segmented at full resolution, batch_size tiles per model call.
+    Masks are written under mask_dir mirroring each path relative to root (by default the
+    deepest directory shared by all paths), so same-named images in different folders don't collide.
+    """
+    engine = engine or get_engine()
+    if mask_dir:
+        os.makedirs(mask_dir, exist_ok=True)
+        if root is None:
+            paths = list(paths)
+            root = common_root(paths)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(paths)
+
+        def fill():
+            while len(pending) < 2 * batch_size:
+                path = next(remaining, None)
+                if path is None:
+                    return
+                pending.append(pool.submit(_load, path, engine, tiled))
+
+        fill()
+        while pending:
+            batch = [pending.popleft().result() for _ in range(min(batch_size, len(pending)))]
+            fill()  # decode the next batch while this one is on the model
+
+            loaded = [(path, img) for path, img in batch if img is not None]
+            if tiled:
+                masks = {path: engine.predict_mask_tiled(img, batch_size=batch_size) for path, img in loaded}
+            else:
+                probs = engine.predict_probs(np.stack([img for _, img in loaded])) if loaded else []
+                masks = {path: (prob > 0.5).astype(np.uint8) for (path, _), prob in zip(loaded, probs)}
+
+            for path, img in batch:
+                if img is None:
+                    yield {"path": path, "mango_count": None, "estimated_yield_kg": None, "mask_path": None,
+                           "error": "Could not load image"}
+                    continue
+                mask = masks[path]
+                count = count_mask(mask).count
+                mask_path = None
+                if mask_dir:
+                    mask_path = mask_path_for(path, root, mask_dir)
+                    os.makedirs(os.path.dirname(mask_path), exist_ok=True)
+                    cv2.imwrite(mask_path, mask * 255)
+                yield {"path": path, "mango_count": count, "estimated_yield_kg": round(count * mango_weight_kg, 2),
+                       "mask_path": mask_path, "error": None}
+
+def write_results(results, output):
+    if output.lower().endswith(".parquet"):
+        import pandas as pd
+        pd.DataFrame(results).to_parquet(output, index=False)
+        return
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["path", "mango_count", "estimated_yield_kg", "mask_path", "error"])
+        writer.writeheader()
+        writer.writerows(results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count mangoes in many images with batched U-Net inference.")
+    parser.add_argument("inputs", help="directory, glob pattern, or manifest (.txt with one path per line, .csv with a `path` column)")
+    parser.add_argument("--output", default="mango_counts.csv", help="results file, .csv or .parquet (default: mango_counts.csv)")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per U-Net call (default: 8)")
+    parser.add_argument("--workers", type=int, default=4, help="decode/resize threads (default: 4)")
+    parser.add_argument("--mask-dir", help="also write each binary mask as a PNG here, mirroring the input folders")
+    parser.add_argument("--engine", choices=BACKENDS, default=DEFAULT_BACKEND, help="inference backend (default: SEGMENTATION_BACKEND or keras)")
+    parser.add_argument("--tiled", action="store_true",
+                        help="segment each image at full resolution in overlapping tiles instead of resizing it")
+    parser.add_argument("--mango-weight-kg", type=float, default=DEFAULT_MANGO_WEIGHT_KG,
+                        help=f"average mango weight for the yield estimate (default: {DEFAULT_MANGO_WEIGHT_KG})")
+    args = parser.parse_args(argv)
+
+    paths = resolve_inputs(args.inputs)
+    if not paths:
+        print(f"No images found for {args.inputs}", file=sys.stderr)
+        return 1
+
+    with trace("batch_count"):
+        engine = get_engine(backend=args.engine)  # load + warm up before timing
+        start = time.perf_counter()
+        results = list(count_images(paths, args.batch_size, args.workers, args.mask_dir, args.mango_weight_kg, engine,
+                                     args.tiled, input_root(args.inputs, paths)))
+        elapsed = time.perf_counter() - start
+        annotate(images=len(results), images_per_sec=len(results) / elapsed)
+    write_results(results, args.output)
+
+    failed = sum(1 for r in results if r["error"])
+    print(f"Processed {len(results)} images ({failed} failed) in {elapsed:.1f}s: "
+          f"{len(results) / elapsed:.2f} images/s, batch size {args.batch_size}. Results: {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+# Streamlit rerun latency of app.py, driven headless through streamlit.testing.
+# "cold" clears every st.cache_data / st.cache_resource entry before each rerun, which is what
+# each interaction cost before the caches (new DatabaseManager + CREATE TABLEs, reference data,
+# folium map); "warm" is a normal rerun with the caches populated.
+#
+# Usage (from the repo root): python benchmarks/bench_app_rerun.py [reruns]
+# Uses a temporary SQLite database unless DB_BACKEND is set.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "app.db"))
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+def logged_in_app(page):
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.session_state["logged_in"] = True
+    at.session_state["user_name"] = "Bench"
+    at.session_state["user_email"] = "bench@example.com"
+    at.session_state["current_page"] = "dashboard"
+    at.run()
+    at.sidebar.radio[0].set_value(page).run()
+    return at
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+def rerun_times(at, interact, reruns, cold):
+    times = []
+    for _ in range(reruns):
+        if cold:
+            st.cache_data.clear()
+            st.cache_resource.clear()
+        start = time.perf_counter()
+        interact(at)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def main():
+    reruns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    # The app logs records against a registered user
+    from database import DatabaseManager
+    DatabaseManager(write_behind=False).register_user("Bench", "bench@example.com", "bench")
+
+    scenarios = [
+        ("dashboard rerun", "Dashboard", lambda at: at.run()),
+        ("yield slider change", "Yield Prediction", lambda at: at.slider[0].set_value(900).run()),
+        ("waste recommendations", "Waste Recommendations", lambda at: button(at, "Get Recommendations").click().run()),
+    ]
+    print(f"{'scenario':<24} {'cold ms':>10} {'warm ms':>10}")
+    for name, page, interact in scenarios:
+        at = logged_in_app(page)
+        cold = rerun_times(at, interact, reruns, cold=True)
+        warm = rerun_times(at, interact, reruns, cold=False)
+        print(f"{name:<24} {statistics.median(cold):>10.1f} {statistics.median(warm):>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# GradientBoostingRegressor vs HistGradientBoostingRegressor on farm2.csv scaled up
+# synthetically (more districts and years, jittered weather/yield): fit time,
+# single-row and batch predict latency, and test R²/MAE. Both backends use fixed
+# hyperparameters (no search) so the numbers compare the estimators themselves.
+#
+# Usage (from the repo root): python benchmarks/bench_backends.py [rows] [districts]
+# Each synthetic district is a copy of one of farm2's districts, so the district column has
+# (farm2 districts x districts) labels; the default 40 keeps that under HistGradientBoosting's
+# 255-category limit. Above it, hist gets the district as an ordinal code (see train_model.py).
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.metrics import r2_score, mean_absolute_error
+from sklearn.model_selection import train_test_split
+from train_model import encode_features, make_estimator, make_scaler, native_categoricals
+
+FIXED_PARAMS = {
+    'gbr': {'n_estimators': 300, 'learning_rate': 0.08, 'max_depth': 4},
+    'hist': {'max_iter': 300, 'learning_rate': 0.08, 'max_depth': 4},
+}
+
+def scale_up(df, n_rows, n_districts, seed=0):
+    """Resample farm2.csv rows into n_districts synthetic districts with jittered numerics."""
+    rng = np.random.default_rng(seed)
+    out = df.sample(n=n_rows, replace=True, random_state=seed).reset_index(drop=True)
+    district_ids = rng.integers(0, n_districts, n_rows)
+    district_effect = rng.normal(0, 3, n_districts)
+    out['district'] = out['district'] + "_" + district_ids.astype(str)
+    out['year'] = out['year'] + rng.integers(0, 10, n_rows)
+    for col, sd in [('rainfall_mm', 40), ('temperature_C', 0.8), ('humidity_percent', 3)]:
+        out[col] = out[col] + rng.normal(0, sd, n_rows)
+    out['yield_quintal_per_acre'] = out['yield_quintal_per_acre'] + district_effect[district_ids] + rng.normal(0, 1, n_rows)
+    return out
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    n_districts = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    df = scale_up(pd.read_csv("farm2.csv"), n_rows, n_districts)
+    X, y, encoders = encode_features(df)
+    print(f"Synthetic dataset: {len(df):,} rows, {df['district'].nunique()} districts, {X.shape[1]} features\n")
+    print(f"{'backend':<8}{'fit s':>10}{'p50 row ms':>12}{'batch rows/s':>14}{'R²':>8}{'MAE':>8}")
+
+    categorical = native_categoricals(encoders)
+    for backend in ['gbr', 'hist']:
+        X_scaled = make_scaler(backend).fit_transform(X)
+        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+        model = make_estimator(backend, list(X.columns), categorical=categorical).set_params(**FIXED_PARAMS[backend])
+
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+
+        samples = []
+        for i in range(500):
+            row = X_test[i:i + 1]
+            start = time.perf_counter()
+            model.predict(row)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        y_pred = model.predict(X_test)
+        batch_s = time.perf_counter() - start
+
+        print(f"{backend:<8}{fit_s:>10.1f}{np.percentile(samples, 50):>12.3f}{len(X_test) / batch_s:>14,.0f}"
+              f"{r2_score(y_test, y_pred):>8.3f}{mean_absolute_error(y_test, y_pred):>8.3f}")
+
+if __name__ == "__main__":
+    main()
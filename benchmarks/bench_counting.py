@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Mask counting latency: the old per-contour findContours loop vs mango_counter.count_mask,
+# on synthetic masks with scattered and touching discs.
+#
+# Usage (from the repo root): python benchmarks/bench_counting.py [size] [n_fruit]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from mango_counter import count_mask
+
+def synthetic_mask(size, n_fruit, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    radius = max(4, size // 60)
+    for x, y in rng.integers(radius, size - radius, (n_fruit, 2)):
+        cv2.circle(mask, (int(x), int(y)), int(rng.integers(radius // 2, radius + 1)), 1, -1)
+    return mask
+
+def legacy_count(mask):
+    """The contour loop count_mangoes_from_mask used before mango_counter (without the watershed fallback)."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    count = 0
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        perimeter = cv2.arcLength(cnt, True)
+        if perimeter == 0:
+            continue
+        circularity = 4 * np.pi * area / (perimeter * perimeter)
+        if 20 < area < 15000 and circularity > 0.3 and len(cnt) > 8:
+            count += 1
+    return count
+
+def timed(fn, mask, repeats=20):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(mask)
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, np.median(samples)
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    n_fruit = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    mask = synthetic_mask(size, n_fruit)
+
+    legacy, legacy_ms = timed(legacy_count, mask)
+    result, counter_ms = timed(count_mask, mask)
+
+    print(f"{size}x{size} mask, {n_fruit} discs drawn")
+    print(f"{'counter':<24}{'count':>8}{'median ms':>12}")
+    print(f"{'contour loop':<24}{legacy:>8}{legacy_ms:>12.2f}")
+    print(f"{'count_mask':<24}{result.count:>8}{counter_ms:>12.2f}  ({result.split_components} components split)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# Prediction-history benchmark on a seeded yield_predictions table: the previous
+# get_user_predictions query (SELECT *, no index, whole history in memory) vs the
+# (user_email, created_at) index with a keyset page and a streamed full history.
+#
+# Usage (from the repo root): python benchmarks/bench_history.py [rows] [users]
+# Runs on a temporary SQLite file; set DB_BACKEND=mysql (and DB_*) to seed the configured MySQL
+# database instead. The power user owns 10% of the rows.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, YIELD_PREDICTION_COLUMNS
+
+INDEXES = {
+    "idx_yield_predictions_user_created": "yield_predictions",
+    "idx_waste_records_user_created": "waste_records",
+}
+
+def seed(db, n_rows, n_users, batch=20000, seed=0):
+    rng = random.Random(seed)
+    users = [f"user{i}@example.com" for i in range(n_users)]
+    db.executemany("INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
+                   [(u, u, db.hash_password(u)) for u in users])
+    columns = YIELD_PREDICTION_COLUMNS + ("created_at",)
+    sql = f"INSERT INTO yield_predictions ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    start = datetime(2020, 1, 1)
+    for offset in range(0, n_rows, batch):
+        rows = []
+        for _ in range(min(batch, n_rows - offset)):
+            user = users[0] if rng.random() < 0.1 else rng.choice(users)
+            created = start + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+            y = rng.uniform(5, 50)
+            rows.append((user, "Maharashtra", "Summer", rng.randrange(200, 1500), rng.randrange(20, 38),
+                         rng.randrange(30, 90), 2.0, y, y / 2.0, 0.8, created.strftime("%Y-%m-%d %H:%M:%S")))
+        db.executemany(sql, rows)
+    return users[0]
+
+def drop_indexes(db):
+    for name, table in INDEXES.items():
+        db.execute(f"DROP INDEX {name}" if db.backend == "sqlite" else f"DROP INDEX {name} ON {table}")
+    # Only the index migrations (1, 2) are re-applied by db.migrate()
+    db.execute("DELETE FROM schema_migrations WHERE version <= 2")
+
+def timed(fn, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    backend = os.getenv("DB_BACKEND", "sqlite")
+    tmpdir = tempfile.mkdtemp()
+    db = DatabaseManager(backend=backend, sqlite_path=os.path.join(tmpdir, "history.db"), write_behind=False)
+    if not db.pool:
+        sys.exit("No database connection")
+
+    start = time.perf_counter()
+    power_user = seed(db, n_rows, n_users)
+    print(f"Seeded {n_rows} rows for {n_users} users in {time.perf_counter() - start:.1f} s")
+
+    drop_indexes(db)
+    old_s, old_rows = timed(lambda: db.execute(
+        "SELECT * FROM yield_predictions WHERE user_email = %s ORDER BY created_at DESC",
+        (power_user,), fetch="all"))
+    print(f"old query, no index         : {old_s * 1000:9.1f} ms  ({len(old_rows)} rows in memory)")
+    del old_rows
+
+    start = time.perf_counter()
+    db.migrate()
+    print(f"index migrations            : {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    old_idx_s, _ = timed(lambda: db.execute(
+        "SELECT * FROM yield_predictions WHERE user_email = %s ORDER BY created_at DESC",
+        (power_user,), fetch="all"))
+    print(f"old query, indexed          : {old_idx_s * 1000:9.1f} ms")
+
+    page_s, (rows, cursor) = timed(lambda: db.get_user_predictions_page(power_user))
+    print(f"first page ({len(rows)} rows)        : {page_s * 1000:9.1f} ms  ({old_s / page_s:.0f}x)")
+    deep_s, _ = timed(lambda: db.get_user_predictions_page(power_user, after=cursor))
+    print(f"next page (keyset)          : {deep_s * 1000:9.1f} ms")
+
+    def stream():
+        count = 0
+        for _ in db.iter_user_predictions(power_user):
+            count += 1
+        return count
+    stream_s, streamed = timed(stream, repeats=1)
+    print(f"streamed history, projected : {stream_s * 1000:9.1f} ms  ({streamed} rows, constant memory)")
+
+if __name__ == "__main__":
+    main()
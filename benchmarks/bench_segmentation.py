@@ -0,0 +1,67 @@
+import os
+import sys
+import glob
+import time
+import numpy as np
+
+# Per-image segmentation latency: the old per-call load_model() + model.predict path
+# vs the shared SegmentationEngine (loaded once, warmed, tf.function predict).
+#
+# Usage (from the repo root): python benchmarks/bench_segmentation.py [n_images]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from segmentation_engine import MODEL_PATH, SegmentationEngine
+
+DATASET_GLOB = os.path.join("Mango dataset", "**", "original images", "*.[Jj][Pp][Gg]")
+
+def load_images(n):
+    paths = sorted(glob.glob(DATASET_GLOB, recursive=True))[:n]
+    if paths:
+        return [cv2.imread(p) for p in paths]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (768, 1024, 3), dtype=np.uint8) for _ in range(n)]
+
+def legacy_segment(img):
+    """What image_yield_predict.py did per call before the engine."""
+    from tensorflow.keras.models import load_model
+    model = load_model(MODEL_PATH)
+    img_resized = cv2.resize(img, (224, 224))
+    img_input = np.expand_dims(img_resized.astype(np.float32) / 255.0, axis=0)
+    return (model.predict(img_input, verbose=0)[0] > 0.5).astype(np.uint8)
+
+def report(name, samples):
+    print(f"{name:<28}{np.percentile(samples, 50):>10.1f}{np.percentile(samples, 90):>10.1f}{np.mean(samples):>10.1f}")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    images = load_images(n)
+
+    start = time.perf_counter()
+    import tensorflow  # noqa: F401
+    import_ms = (time.perf_counter() - start) * 1000
+
+    legacy = []
+    for img in images:
+        start = time.perf_counter()
+        legacy_segment(img)
+        legacy.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    engine = SegmentationEngine(MODEL_PATH)
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    warm = []
+    for img in images:
+        start = time.perf_counter()
+        engine.predict_mask(engine.resize(img))
+        warm.append((time.perf_counter() - start) * 1000)
+
+    print(f"{len(images)} images; TensorFlow import {import_ms:.0f} ms; engine load + warmup {startup_ms:.0f} ms (once)")
+    print(f"{'path':<28}{'p50 ms':>10}{'p90 ms':>10}{'mean ms':>10}")
+    report("load_model per image", legacy)
+    report("SegmentationEngine", warm)
+
+if __name__ == "__main__":
+    main()
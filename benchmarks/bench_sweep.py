@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import numpy as np
+
+# What-if sweep throughput in points/sec: one /predict-style call per point (transform_row +
+# predict), the /predict_batch path (row dicts through transform_batch), and yield_sweep's
+# lazy column-wise chunks at a few chunk sizes.
+#
+# Usage (from the repo root): python benchmarks/bench_sweep.py [grid_steps] [single_points]
+# The grid is grid_steps^3 points (default 40 -> 64,000); the per-point path is timed on
+# single_points (default 2,000) and reported as a rate.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import CATEGORICAL_FEATURES
+from model_bundle import load_artifacts, typical_inputs
+from yield_sweep import Sweep
+
+def sweep_spec(pipeline, steps):
+    spec = {col: sorted(pipeline.lookups[col])[0] for col in CATEGORICAL_FEATURES}
+    spec["rainfall_mm"] = {"start": 200, "stop": 1500, "steps": steps}
+    spec["temperature_C"] = {"start": 15, "stop": 40, "steps": steps}
+    spec["humidity_percent"] = {"start": 30, "stop": 95, "steps": steps}
+    return spec
+
+def grid_rows(sweep):
+    for _, flat, columns in sweep.iter_chunks():
+        for i in range(flat.stop - flat.start):
+            yield {k: (v[i] if isinstance(v, np.ndarray) else v) for k, v in columns.items()}
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    single_points = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    artifacts = load_artifacts()
+    pipeline, scorer = artifacts["pipeline"], artifacts["scorer"]
+    sweep = Sweep(pipeline, sweep_spec(pipeline, steps), typical_inputs(artifacts))
+    print(f"Grid: {sweep.points:,} points; scorer: {type(scorer).__name__}")
+    print(f"{'path':<28}{'points/s':>14}")
+
+    rows = list(grid_rows(sweep))
+    start = time.perf_counter()
+    single = np.array([scorer.predict(pipeline.transform_row(row))[0] for row in rows[:single_points]])
+    elapsed = time.perf_counter() - start
+    print(f"{'per point (/predict)':<28}{single_points / elapsed:>14,.0f}")
+
+    start = time.perf_counter()
+    X, _ = pipeline.transform_batch(rows)
+    batch = scorer.predict(X)
+    elapsed = time.perf_counter() - start
+    print(f"{'row dicts (/predict_batch)':<28}{len(rows) / elapsed:>14,.0f}")
+
+    for chunk_size in (4096, 16384, 65536):
+        start = time.perf_counter()
+        yields = sweep.run(scorer, chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{f'sweep, chunk {chunk_size}':<28}{sweep.points / elapsed:>14,.0f}")
+
+    flat = yields.ravel()
+    assert np.allclose(flat, batch, rtol=1e-5), "sweep disagrees with transform_batch"
+    assert np.allclose(flat[:single_points], single, rtol=1e-5), "sweep disagrees with transform_row"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Latency comparison: sklearn predict (GBR or hist bundle) vs the flat evaluator
+# in tree_compile.py, for single rows (the /predict shape) and for batches.
+#
+# Usage (from the repo root): python benchmarks/bench_tree_eval.py [n_single_calls]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from model_bundle import load_artifacts
+from tree_compile import HIST_PARITY_ATOL, FlatTreeEnsemble, flatten_model, verify_parity
+
+def latencies(fn, rows, repeats):
+    samples = []
+    for i in range(repeats):
+        row = rows[i % len(rows)]
+        start = time.perf_counter()
+        fn(row)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    artifacts = load_artifacts()
+    model = artifacts["model"]
+    X = artifacts["pipeline"].transform_frame(pd.read_csv("farm2.csv"))
+
+    flat = FlatTreeEnsemble(flatten_model(model))
+    verify_parity(model, flat, X, atol=HIST_PARITY_ATOL if flat.float64_inputs else 0.0)
+
+    single_rows = [X[i:i + 1] for i in range(len(X))]
+    print(f"Model: {len(flat.roots)} trees, max depth {flat.max_depth}; {repeats} single-row calls")
+    print(f"{'path':<22}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, fn in [("sklearn predict", model.predict), ("flat evaluator", flat.predict)]:
+        p50, p99 = latencies(fn, single_rows, repeats)
+        print(f"{name:<22}{p50:>10.3f}{p99:>10.3f}")
+
+    # Batch throughput on the dataset tiled to 100k rows
+    X_big = np.tile(X, (max(1, 100_000 // len(X)), 1))
+    print(f"\nBatch of {len(X_big)} rows")
+    for name, fn in [("sklearn predict", model.predict), ("flat evaluator", flat.predict)]:
+        start = time.perf_counter()
+        fn(X_big)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{elapsed * 1000:>10.1f} ms  ({len(X_big) / elapsed:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
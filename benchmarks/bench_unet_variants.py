@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import argparse
+
+# Parameter count, CPU latency and Test_data accuracy of the U-Net presets in
+# image_train.UNET_VARIANTS, each trained for the same number of epochs.
+#
+# Usage (from the repo root): python benchmarks/bench_unet_variants.py [--epochs 20] [--variants full lite tiny]
+# --epochs 0 skips training and only reports size and latency.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import image_train
+from export_segmentation import evaluate, load_split
+from segmentation_engine import SegmentationEngine
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--variants", nargs="+", choices=list(image_train.UNET_VARIANTS), default=list(image_train.UNET_VARIANTS))
+    args = parser.parse_args()
+
+    train_images, train_masks = load_split("train")
+    test_images, test_masks = load_split("test")
+    data = (train_images.astype(np.float32) / 255.0, train_masks, test_images.astype(np.float32) / 255.0, test_masks)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in args.variants:
+            path = os.path.join(tmp, f"mango_segmentation_{variant}.h5")
+            if args.epochs > 0:
+                model, _ = image_train.train(variant, epochs=args.epochs, output_path=path, data=data, plot=False)
+            else:
+                model = image_train.unet_model(**image_train.UNET_VARIANTS[variant])
+                model.save(path)
+
+            # Best checkpoint, served the same way as in production
+            engine = SegmentationEngine(path)
+            iou, count_mae, latency = evaluate(engine, test_images, test_masks)
+            rows.append((variant, model.count_params(), latency, iou, count_mae))
+
+    print(f"{len(test_images)} Test_data images, {args.epochs} epochs per variant")
+    print(f"{'variant':<8}{'params':>12}{'ms/image':>10}{'IoU':>8}{'count MAE':>11}")
+    for variant, params, latency, iou, count_mae in rows:
+        accuracy = f"{iou:>8.3f}{count_mae:>11.2f}" if args.epochs > 0 else f"{'-':>8}{'-':>11}"
+        print(f"{variant:<8}{params:>12,}{latency:>10.1f}{accuracy}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Weather back-fill benchmark on a synthetic dataset: the previous iterrows()/df.at loop
+# with per-pair boolean-mask fallbacks vs train_model.apply_weather (one join + one groupby).
+#
+# Usage (from the repo root): python benchmarks/bench_weather_join.py [rows] [legacy_rows]
+# The legacy loop is timed on legacy_rows (default 50k) and extrapolated to `rows`.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from train_model import WEATHER_COLUMNS, apply_weather
+
+def synthetic_dataset(n_rows, n_districts=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'district': rng.choice([f"District_{i}" for i in range(n_districts)], n_rows),
+        'season': rng.choice(['Summer', 'Monsoon', 'Winter'], n_rows),
+        'temperature_C': rng.uniform(20, 38, n_rows),
+        'humidity_percent': rng.uniform(30, 90, n_rows),
+        'rainfall_mm': rng.uniform(200, 1500, n_rows),
+    })
+
+def synthetic_weather(df, fail_every=5, seed=1):
+    rng = np.random.default_rng(seed)
+    pairs = list(df[['district', 'season']].drop_duplicates().itertuples(index=False, name=None))
+    failed = pairs[::fail_every]
+    weather = {
+        pair: dict(zip(WEATHER_COLUMNS, rng.uniform([20, 30, 200], [38, 90, 1500])))
+        for pair in pairs if pair not in failed
+    }
+    return weather, failed
+
+def legacy_apply_weather(df, weather_data, failed_pairs):
+    """The loop train_model.py used before apply_weather()."""
+    weather_data = dict(weather_data)
+    for district, season in failed_pairs:
+        weather_data[(district, season)] = {
+            'temperature_C': df[(df['district'] == district) & (df['season'] == season)]['temperature_C'].mean(),
+            'humidity_percent': df[(df['district'] == district) & (df['season'] == season)]['humidity_percent'].mean(),
+            'rainfall_mm': df[(df['district'] == district) & (df['season'] == season)]['rainfall_mm'].mean()
+        }
+    for idx, row in df.iterrows():
+        key = (row['district'], row['season'])
+        if key in weather_data:
+            df.at[idx, 'temperature_C'] = weather_data[key]['temperature_C']
+            df.at[idx, 'humidity_percent'] = weather_data[key]['humidity_percent']
+            df.at[idx, 'rainfall_mm'] = weather_data[key]['rainfall_mm']
+    return df
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    legacy_rows = min(n_rows, int(sys.argv[2]) if len(sys.argv) > 2 else 50_000)
+
+    df = synthetic_dataset(n_rows)
+    weather, failed = synthetic_weather(df)
+
+    # Results must agree on the sample the legacy loop can handle
+    sample = df.iloc[:legacy_rows]
+    expected, legacy_s = timed(legacy_apply_weather, sample.copy(), weather, failed)
+    actual, _ = timed(apply_weather, sample.copy(), weather, failed)
+    pd.testing.assert_frame_equal(expected[WEATHER_COLUMNS], actual[WEATHER_COLUMNS], check_dtype=False)
+
+    _, vectorized_s = timed(apply_weather, df.copy(), weather, failed)
+    legacy_estimate = legacy_s * n_rows / legacy_rows
+
+    print(f"{n_rows:,} rows, {len(weather) + len(failed)} district-season pairs ({len(failed)} failed)")
+    print(f"iterrows loop : {legacy_s:.2f}s for {legacy_rows:,} rows (~{legacy_estimate:.1f}s extrapolated)")
+    print(f"vectorized    : {vectorized_s:.2f}s")
+    print(f"speedup       : ~{legacy_estimate / vectorized_s:.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,409 @@
-import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
+import atexit
 import hashlib
 import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from dotenv import load_dotenv
 
+try:
+    import mysql.connector
+    from mysql.connector import Error, pooling
+    from mysql.connector.errors import PoolError
+except ImportError:  # SQLite-only installs (DB_BACKEND=sqlite)
+    mysql = None
+    Error = sqlite3.Error
+    PoolError = sqlite3.OperationalError
+
 load_dotenv()
 
+# Connection settings (env vars):
+#   DB_BACKEND        - "mysql" (default) or "sqlite" (DB_PATH, default farm2value.db; handy for tests)
+#   DB_POOL_SIZE      - pooled connections, default 5
+#   DB_WRITE_BEHIND   - "1" (default) queues prediction logs and writes them in batches off the request path
+#   DB_FLUSH_INTERVAL - seconds between write-behind flushes, default 1
+#   DB_FLUSH_BATCH    - rows per executemany, default 200
+DB_ERRORS = (Error, sqlite3.Error)
+RECONNECT_ATTEMPTS = 3
+# How long a request waits for a free pooled connection before giving up
+POOL_TIMEOUT = 10
+# How long a history read waits for this process's queued logs to be written before it
+# reads what is committed (read-your-writes without putting a flush on the request path)
+HISTORY_WRITE_WAIT = float(os.getenv('DB_HISTORY_WRITE_WAIT', '0.5'))
+
+YIELD_PREDICTION_COLUMNS = ("user_email", "region", "season", "rainfall", "temperature", "humidity", "area",
+                            "yield", "yield_per_hectare", "confidence")
+WASTE_RECORD_COLUMNS = ("user_email", "waste_type", "quantity", "location", "estimated_value")
+INSERT_COLUMNS = {"yield_predictions": YIELD_PREDICTION_COLUMNS, "waste_records": WASTE_RECORD_COLUMNS}
+# Columns a history query may project; rows are ordered (and paginated) by (created_at, id)
+HISTORY_COLUMNS = {
+    "yield_predictions": ("id",) + YIELD_PREDICTION_COLUMNS + ("created_at",),
+    "waste_records": ("id",) + WASTE_RECORD_COLUMNS + ("created_at",),
+}
+DEFAULT_HISTORY_COLUMNS = {
+    "yield_predictions": ("id", "region", "season", "area", "yield", "yield_per_hectare", "confidence", "created_at"),
+    "waste_records": ("id", "waste_type", "quantity", "location", "estimated_value", "created_at"),
+}
+HISTORY_PAGE_SIZE = 50
+STREAM_BATCH_SIZE = 1000
+
+# Schema migrations, applied in order after create_tables() and recorded in schema_migrations.
+# Append new (version, name, statements) entries; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "yield_predictions_user_created_idx",
+     ["CREATE INDEX idx_yield_predictions_user_created ON yield_predictions (user_email, created_at)"]),
+    (2, "waste_records_user_created_idx",
+     ["CREATE INDEX idx_waste_records_user_created ON waste_records (user_email, created_at)"]),
+    # Rollups maintained by analytics.py
+    (3, "analytics_rollups", [
+        """CREATE TABLE rollup_state (
+            source VARCHAR(64) PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE yield_rollup (
+            region VARCHAR(100) NOT NULL,
+            season VARCHAR(50) NOT NULL,
+            month CHAR(7) NOT NULL,
+            predictions BIGINT NOT NULL,
+            yield_sum DOUBLE NOT NULL,
+            yield_per_hectare_sum DOUBLE NOT NULL,
+            area_sum DOUBLE NOT NULL,
+            PRIMARY KEY (region, season, month)
+        )""",
+        """CREATE TABLE waste_rollup (
+            waste_type VARCHAR(100) NOT NULL,
+            location VARCHAR(100) NOT NULL,
+            month CHAR(7) NOT NULL,
+            records BIGINT NOT NULL,
+            quantity_sum BIGINT NOT NULL,
+            PRIMARY KEY (waste_type, location, month)
+        )""",
+    ]),
+]
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+class SQLitePool:
+    """Fixed-size pool of SQLite connections with the same get_connection()/close() shape as MySQLConnectionPool."""
+
+    def __init__(self, path, pool_size):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def get_connection(self):
+        try:
+            conn = self._idle.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            # Same failure as an exhausted MySQLConnectionPool instead of blocking forever
+            raise PoolError(f"No free SQLite connection after {POOL_TIMEOUT}s")
+        return _PooledSQLiteConnection(self, conn)
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+class _PooledSQLiteConnection:
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, prepared=False, buffered=None):
+        # sqlite3 caches compiled statements per connection, so every statement is prepared;
+        # rows are always stepped lazily, so every cursor is also unbuffered
+        return self._conn.cursor()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        # Back to the pool instead of closing
+        self._pool.release(self._conn)
+
+class WriteBehindQueue:
+    """
+    Background writer: rows are queued per table and written with executemany
+    every flush_interval seconds or once batch_size rows are waiting.
+    A batch that fails is retried row by row; rows that still fail are counted in
+    `dropped` and reported on stderr, so one bad row does not lose its whole batch.
+    """
+
+    def __init__(self, db, flush_interval, batch_size):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue()
+        # Rows put() so far and rows flush() has finished with, for wait()
+        self._progress = threading.Condition()
+        self._queued = 0
+        self._handled = 0
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, table, row):
+        with self._progress:
+            self._queued += 1
+            self._queue.put((table, row))
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the writer thread alive for the rows queued after this
+                print(f"Write-behind flush failed: {e}", file=sys.stderr)
+
+    def flush(self):
+        """Write everything queued so far; safe to call from any thread."""
+        with self._flush_lock:
+            pending = {}
+            while True:
+                try:
+                    table, row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                pending.setdefault(table, []).append(row)
+
+            for table, rows in pending.items():
+                written = 0
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    try:
+                        written += self.db.insert_rows(table, batch, notify=False)
+                    except Exception as e:
+                        self.failed += 1
+                        print(f"Write-behind batch of {len(batch)} rows failed, retrying row by row: {e}", file=sys.stderr)
+                        written += self._write_rows(table, batch)
+                self.written += written
+                # Listeners (the analytics rollups) run once per table per flush, not per batch or row
+                if written:
+                    self.db.notify_insert(table)
+
+            with self._progress:
+                self._handled += sum(len(rows) for rows in pending.values())
+                self._progress.notify_all()
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for every row queued before the call; True if they were written."""
+        with self._progress:
+            target = self._queued
+            if self._handled >= target:
+                return True
+            self._wake.set()
+            return self._progress.wait_for(lambda: self._handled >= target, timeout)
+
+    def _write_rows(self, table, rows):
+        """Insert rows one at a time, dropping (and reporting) the ones that fail; returns the number written."""
+        written = 0
+        for row in rows:
+            try:
+                written += self.db.insert_rows(table, [row], notify=False)
+            except Exception as e:
+                self.dropped += 1
+                print(f"Write-behind dropped a {table} row ({self.dropped} so far): {row!r}: {e}", file=sys.stderr)
+        return written
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, backend=None, sqlite_path=None, pool_size=None, write_behind=None):
         self.host = os.getenv('DB_HOST', 'localhost')
         self.user = os.getenv('DB_USER', 'root')
         self.password = os.getenv('DB_PASSWORD', '')
         self.database = os.getenv('DB_NAME', 'farm2value_db')
-        self.connection = None
+        self.backend = backend or os.getenv('DB_BACKEND', 'mysql')
+        self.sqlite_path = sqlite_path or os.getenv('DB_PATH', 'farm2value.db')
+        self.pool_size = pool_size or int(os.getenv('DB_POOL_SIZE', '5'))
+        self.placeholder = "?" if self.backend == "sqlite" else "%s"
+        self.pool = None
+        self.writer = None
+        self.insert_listeners = []
         self.connect()
         self.create_tables()
-    
+        self.migrate()
+
+        if write_behind is None:
+            write_behind = _env_flag('DB_WRITE_BEHIND', '1')
+        if self.pool and write_behind:
+            self.writer = WriteBehindQueue(self, float(os.getenv('DB_FLUSH_INTERVAL', '1')),
+                                           int(os.getenv('DB_FLUSH_BATCH', '200')))
+            atexit.register(self.writer.close)
+
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-        except Error as e:
-            print(f"Error connecting to MySQL: {e}")
-            self.connection = None
-    
+            if self.backend == "sqlite":
+                self.pool = SQLitePool(self.sqlite_path, self.pool_size)
+            else:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name=f"farm2value_{id(self)}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    database=self.database
+                )
+        except DB_ERRORS as e:
+            print(f"Error connecting to {self.backend}: {e}")
+            self.pool = None
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection, reconnected first if the server dropped it; returned to the pool afterwards."""
+        conn = self._checkout()
+        try:
+            if not conn.is_connected():
+                conn.reconnect(attempts=RECONNECT_ATTEMPTS, delay=1)
+            yield conn
+        finally:
+            conn.close()
+
+    def _checkout(self):
+        # MySQLConnectionPool raises PoolError straight away when exhausted; wait for a free one instead
+        deadline = time.monotonic() + POOL_TIMEOUT
+        while True:
+            try:
+                return self.pool.get_connection()
+            except DB_ERRORS as e:
+                if not isinstance(e, PoolError) or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _sql(self, sql):
+        return sql if self.placeholder == "%s" else sql.replace("%s", "?")
+
+    def execute(self, sql, params=(), fetch=None):
+        """
+        Run one prepared statement and commit. fetch="one"/"all" returns rows as dicts.
+        A dropped connection is retried once on a fresh one: always for reads, and for writes
+        only if the statement was never sent (it may have been applied otherwise).
+        """
+        for attempt in range(2):
+            sent = False
+            try:
+                with self.connection() as conn:
+                    # Parameterised statements go through the server-side prepared statement cursor
+                    cursor = conn.cursor(prepared=bool(params))
+                    try:
+                        sent = True
+                        cursor.execute(self._sql(sql), params)
+                        if fetch is None:
+                            conn.commit()
+                            return cursor.rowcount
+                        columns = [d[0] for d in cursor.description]
+                        rows = cursor.fetchall()
+                        if fetch == "one":
+                            rows = rows[:1]
+                        return [dict(zip(columns, row)) for row in rows]
+                    finally:
+                        cursor.close()
+            except DB_ERRORS as e:
+                if attempt or not self._is_disconnect(e) or (sent and fetch is None):
+                    raise
+
+    def executemany(self, sql, rows):
+        """
+        Insert many rows with one prepared statement and a single commit.
+        Retried on a fresh connection only if the connection dropped before the batch was sent.
+        """
+        for attempt in range(2):
+            sent = False
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor(prepared=True)
+                    try:
+                        sent = True
+                        cursor.executemany(self._sql(sql), rows)
+                        conn.commit()
+                        return len(rows)
+                    except DB_ERRORS:
+                        # Don't leave part of the batch pending on a pooled connection
+                        # (WriteBehindQueue retries failed batches row by row)
+                        conn.rollback()
+                        raise
+                    finally:
+                        cursor.close()
+            except DB_ERRORS as e:
+                if attempt or sent or not self._is_disconnect(e):
+                    raise
+
+    def iter_query(self, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        """
+        Stream rows as dicts through an unbuffered (server-side) cursor, batch_size rows per fetchmany.
+        The pooled connection is held until the generator is exhausted or closed.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(self._sql(sql), params)
+                columns = [d[0] for d in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(zip(columns, row))
+            finally:
+                # An abandoned MySQL stream has to be drained before the connection can be reused
+                if self.backend != "sqlite" and conn.unread_result:
+                    conn.consume_results()
+                cursor.close()
+
+    def _is_disconnect(self, error):
+        if mysql is None or not isinstance(error, Error):
+            return False
+        return isinstance(error, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError))
+
     def create_tables(self):
-        if not self.connection:
+        if not self.pool:
             return
-        
-        cursor = self.connection.cursor()
-        
+
+        autoincrement = "INTEGER PRIMARY KEY AUTOINCREMENT" if self.backend == "sqlite" else "INT AUTO_INCREMENT PRIMARY KEY"
+
         # Users table
-        cursor.execute("""
+        self.execute(f"""
             CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id {autoincrement},
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) UNIQUE NOT NULL,
                 password VARCHAR(255) NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        
+
         # Yield predictions table
-        cursor.execute("""
+        self.execute(f"""
             CREATE TABLE IF NOT EXISTS yield_predictions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id {autoincrement},
                 user_email VARCHAR(255) NOT NULL,
                 region VARCHAR(100),
                 season VARCHAR(50),
@@ -64,11 +418,11 @@ class DatabaseManager:
                 FOREIGN KEY (user_email) REFERENCES users(email)
             )
         """)
-        
+
         # Waste records table
-        cursor.execute("""
+        self.execute(f"""
             CREATE TABLE IF NOT EXISTS waste_records (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id {autoincrement},
                 user_email VARCHAR(255) NOT NULL,
                 waste_type VARCHAR(100),
                 quantity INT,
@@ -78,111 +432,219 @@ class DatabaseManager:
                 FOREIGN KEY (user_email) REFERENCES users(email)
             )
         """)
-        
-        self.connection.commit()
-        cursor.close()
-    
+
+    def migrate(self):
+        """Apply pending MIGRATIONS; returns the versions applied."""
+        if not self.pool:
+            return []
+
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        applied = {row["version"] for row in self.execute("SELECT version FROM schema_migrations", fetch="all")}
+        newly_applied = []
+        for version, name, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                for statement in statements:
+                    self.execute(statement)
+                self.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            except DB_ERRORS as e:
+                print(f"Error applying migration {version} ({name}): {e}")
+                break
+            newly_applied.append(version)
+        return newly_applied
+
     def hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
-    
+
     def register_user(self, name, email, password):
-        if not self.connection:
+        if not self.pool:
             return False, "Database connection failed"
-        
+
         try:
-            cursor = self.connection.cursor()
             hashed_password = self.hash_password(password)
-            
-            cursor.execute(
+            self.execute(
                 "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
                 (name, email, hashed_password)
             )
-            
-            self.connection.commit()
-            cursor.close()
             return True, "User registered successfully"
-        except Error as e:
+        except DB_ERRORS as e:
             return False, str(e)
-    
+
     def login_user(self, email, password):
-        if not self.connection:
+        if not self.pool:
             return False, "Database connection failed"
-        
+
         try:
-            cursor = self.connection.cursor()
             hashed_password = self.hash_password(password)
-            
-            cursor.execute(
+            rows = self.execute(
                 "SELECT name, email FROM users WHERE email = %s AND password = %s",
-                (email, hashed_password)
+                (email, hashed_password),
+                fetch="one"
             )
-            
-            result = cursor.fetchone()
-            cursor.close()
-            
-            if result:
-                return True, {"name": result[0], "email": result[1]}
+
+            if rows:
+                return True, {"name": rows[0]["name"], "email": rows[0]["email"]}
             else:
                 return False, "Invalid email or password"
-        except Error as e:
+        except DB_ERRORS as e:
             return False, str(e)
-    
+
+    def _insert_sql(self, table, columns):
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+    def add_insert_listener(self, listener):
+        """Call listener(table) after every committed insert batch (see analytics.py)."""
+        self.insert_listeners.append(listener)
+
+    def insert_rows(self, table, rows, notify=True):
+        """
+        Insert rows (tuples in INSERT_COLUMNS[table] order) in one batch, then notify listeners
+        unless notify=False (the caller then calls notify_insert() once for several batches).
+        """
+        rows = list(rows)
+        self.executemany(self._insert_sql(table, INSERT_COLUMNS[table]), rows)
+        if notify:
+            self.notify_insert(table)
+        return len(rows)
+
+    def notify_insert(self, table):
+        """Tell the insert listeners that committed rows were added to table."""
+        for listener in self.insert_listeners:
+            try:
+                listener(table)
+            except Exception as e:
+                # The insert is committed; a listener failure must not report it as lost
+                print(f"Insert listener failed for {table}: {e}", file=sys.stderr)
+
     def save_yield_prediction(self, user_email, region, season, rainfall, temperature, humidity, area, yield_result):
-        if not self.connection:
+        if not self.pool:
             return False, "Database connection failed"
-        
+
+        row = (user_email, region, season, rainfall, temperature, humidity, area,
+               yield_result['yield'], yield_result['yield_per_hectare'], yield_result['confidence'])
+        if self.writer:
+            # Logged off the request path; see WriteBehindQueue
+            self.writer.put("yield_predictions", row)
+            return True, "Prediction queued"
+        return self.save_yield_predictions([row])
+
+    def save_yield_predictions(self, rows):
+        """Bulk insert of (user_email, region, season, rainfall, temperature, humidity, area, yield, yield_per_hectare, confidence) rows."""
+        if not self.pool:
+            return False, "Database connection failed"
+
         try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                INSERT INTO yield_predictions 
-                (user_email, region, season, rainfall, temperature, humidity, area, yield, yield_per_hectare, confidence)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (user_email, region, season, rainfall, temperature, humidity, area, 
-                  yield_result['yield'], yield_result['yield_per_hectare'], yield_result['confidence']))
-            
-            self.connection.commit()
-            cursor.close()
+            self.insert_rows("yield_predictions", rows)
             return True, "Prediction saved"
-        except Error as e:
+        except DB_ERRORS as e:
             return False, str(e)
-    
+
     def save_waste_record(self, user_email, waste_type, quantity, location, estimated_value):
-        if not self.connection:
+        return self.save_waste_records([(user_email, waste_type, quantity, location, estimated_value)])
+
+    def save_waste_records(self, rows):
+        """Bulk insert of (user_email, waste_type, quantity, location, estimated_value) rows."""
+        if not self.pool:
             return False, "Database connection failed"
-        
+
         try:
-            cursor = self.connection.cursor()
-            
-            cursor.execute("""
-                INSERT INTO waste_records 
-                (user_email, waste_type, quantity, location, estimated_value)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (user_email, waste_type, quantity, location, estimated_value))
-            
-            self.connection.commit()
-            cursor.close()
+            self.insert_rows("waste_records", rows)
             return True, "Waste record saved"
-        except Error as e:
+        except DB_ERRORS as e:
             return False, str(e)
-    
+
     def get_user_predictions(self, user_email):
-        if not self.connection:
+        """Full prediction history, newest first. Prefer get_user_predictions_page for UI lists."""
+        if not self.pool:
             return []
-        
+
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(
-                "SELECT * FROM yield_predictions WHERE user_email = %s ORDER BY created_at DESC",
-                (user_email,)
-            )
-            results = cursor.fetchall()
-            cursor.close()
-            return results
-        except Error as e:
+            return list(self.iter_user_predictions(user_email, columns=HISTORY_COLUMNS["yield_predictions"]))
+        except DB_ERRORS as e:
             print(f"Error fetching predictions: {e}")
             return []
-    
+
+    def _history_sql(self, table, columns, after, limit=None):
+        unknown = set(columns) - set(HISTORY_COLUMNS[table])
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+        # id and created_at are always selected, they form the keyset
+        selected = list(columns) + [c for c in ("id", "created_at") if c not in columns]
+        sql = f"SELECT {', '.join(selected)} FROM {table} WHERE user_email = %s"
+        if after is not None:
+            # Keyset condition on the (user_email, created_at) index; id breaks ties within a second
+            sql += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql
+
+    def _history_params(self, user_email, after):
+        if after is None:
+            return (user_email,)
+        created_at, row_id = after
+        return (user_email, created_at, created_at, row_id)
+
+    def get_history_page(self, table, user_email, limit=HISTORY_PAGE_SIZE, after=None, columns=None):
+        """
+        One page of a user's history, newest first, as (rows, next_cursor).
+        Pass next_cursor back as `after` for the following page; it is None on the last page.
+        """
+        if not self.pool:
+            return [], None
+
+        # Read-your-writes: give this process's queued logs a bounded moment to land
+        self.wait_for_writes(HISTORY_WRITE_WAIT)
+        columns = columns or DEFAULT_HISTORY_COLUMNS[table]
+        rows = self.execute(self._history_sql(table, columns, after, limit + 1),
+                            self._history_params(user_email, after), fetch="all")
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    def iter_history(self, table, user_email, after=None, columns=None, batch_size=STREAM_BATCH_SIZE):
+        """Stream a user's whole history (newest first) without loading it into memory."""
+        if not self.pool:
+            return iter(())
+
+        self.wait_for_writes(HISTORY_WRITE_WAIT)
+        columns = columns or DEFAULT_HISTORY_COLUMNS[table]
+        return self.iter_query(self._history_sql(table, columns, after),
+                               self._history_params(user_email, after), batch_size)
+
+    def get_user_predictions_page(self, user_email, limit=HISTORY_PAGE_SIZE, after=None, columns=None):
+        return self.get_history_page("yield_predictions", user_email, limit, after, columns)
+
+    def iter_user_predictions(self, user_email, after=None, columns=None, batch_size=STREAM_BATCH_SIZE):
+        return self.iter_history("yield_predictions", user_email, after, columns, batch_size)
+
+    def get_user_waste_records_page(self, user_email, limit=HISTORY_PAGE_SIZE, after=None, columns=None):
+        return self.get_history_page("waste_records", user_email, limit, after, columns)
+
+    def iter_user_waste_records(self, user_email, after=None, columns=None, batch_size=STREAM_BATCH_SIZE):
+        return self.iter_history("waste_records", user_email, after, columns, batch_size)
+
+    def flush(self):
+        """Write any queued prediction logs now."""
+        if self.writer:
+            self.writer.flush()
+
+    def wait_for_writes(self, timeout):
+        """Wake the write-behind thread and wait up to timeout seconds for the logs queued so far."""
+        if self.writer:
+            return self.writer.wait(timeout)
+        return True
+
     def close(self):
-        if self.connection:
-            self.connection.close()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
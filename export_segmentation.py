@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from segmentation_engine import MODEL_PATH, MODEL_PATHS, create_engine
+from image_yield_predict import count_mangoes_from_mask
+
+# Export the segmentation U-Net for CPU serving and compare the exports.
+#
+# Usage:
+#   python export_segmentation.py tflite --quantization dynamic   (or int8 / float16 / none)
+#   python export_segmentation.py onnx
+#   python export_segmentation.py report [model files...]         (IoU, count error and latency on Test_data)
+#
+# The serving entry points pick an export with --engine tflite|onnx or SEGMENTATION_BACKEND.
+
+QUANTIZATION_MODES = ["none", "dynamic", "float16", "int8"]
+
+# Train images used to calibrate int8 activation ranges
+CALIBRATION_IMAGES = 100
+
+ONNX_OPSET = 13
+
+def backend_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".tflite":
+        return "tflite"
+    if extension == ".onnx":
+        return "onnx"
+    return "keras"
+
+def load_split(split):
+    """uint8 images (N, H, W, 3) and binary masks (N, H, W) for "train" or "test"."""
+    import image_train
+    if split == "train":
+        return image_train.load_data(image_train.train_original_path, image_train.train_annotated_path, normalize=False)
+    return image_train.load_data(image_train.test_original_path, image_train.test_annotated_path, normalize=False)
+
+def export_tflite(model_path=MODEL_PATH, output_path=MODEL_PATHS["tflite"], quantization="dynamic"):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization != "none":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        calibration, _ = load_split("train")
+        if len(calibration) == 0:
+            raise ValueError("No MangoNet train images found to calibrate int8 quantization")
+
+        def representative_dataset():
+            for img in calibration[:CALIBRATION_IMAGES]:
+                yield [img[np.newaxis].astype(np.float32) / 255.0]
+
+        # Integer kernels throughout; inputs and outputs stay float so callers are unchanged
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+def export_onnx(model_path=MODEL_PATH, output_path=MODEL_PATHS["onnx"], opset=ONNX_OPSET):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    _, height, width, channels = model.input_shape
+    signature = (tf.TensorSpec((None, height, width, channels), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=output_path)
+    return output_path
+
+def evaluate(engine, images, masks, batch_size=8):
+    """Mean IoU, mean absolute count error and median single-image latency (ms) on images/masks."""
+    ious, count_errors = [], []
+    for start in range(0, len(images), batch_size):
+        probs = engine.predict_probs(images[start:start + batch_size])
+        for prob, truth in zip(probs, masks[start:start + batch_size]):
+            pred = (prob > 0.5).astype(np.uint8)
+            union = np.logical_or(pred, truth).sum()
+            ious.append(np.logical_and(pred, truth).sum() / union if union else 1.0)
+            # Reference count: the same counter run on the annotated mask
+            count_errors.append(abs(count_mangoes_from_mask(pred) - count_mangoes_from_mask(truth.astype(np.uint8))))
+
+    latencies = []
+    for img in images:
+        start = time.perf_counter()
+        engine.predict_probs(img)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(ious)), float(np.mean(count_errors)), float(np.median(latencies))
+
+def report(model_paths):
+    images, masks = load_split("test")
+    if len(images) == 0:
+        raise ValueError("No MangoNet Test_data image/annotation pairs found")
+
+    print(f"{len(images)} Test_data images")
+    print(f"{'model':<42}{'backend':>8}{'size MB':>9}{'IoU':>8}{'count MAE':>11}{'ms/image':>10}")
+    for path in model_paths:
+        engine = create_engine(backend_for(path), path)
+        iou, count_mae, latency = evaluate(engine, images, masks)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{path:<42}{engine.backend:>8}{size_mb:>9.1f}{iou:>8.3f}{count_mae:>11.2f}{latency:>10.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the mango segmentation U-Net and compare exports.")
+    parser.add_argument("command", choices=["tflite", "onnx", "report"])
+    parser.add_argument("models", nargs="*", help="report: model files to compare (default: every exported model)")
+    parser.add_argument("--model", default=MODEL_PATH, help=f"Keras model to export (default: {MODEL_PATH})")
+    parser.add_argument("--output", help="export path (default: the path the engine loads for that backend)")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="dynamic",
+                        help="tflite: weight/activation quantization (default: dynamic)")
+    parser.add_argument("--opset", type=int, default=ONNX_OPSET, help=f"onnx: opset version (default: {ONNX_OPSET})")
+    args = parser.parse_args(argv)
+
+    if args.command == "tflite":
+        path = export_tflite(args.model, args.output or MODEL_PATHS["tflite"], args.quantization)
+        print(f"Wrote {path} ({args.quantization} quantization)", file=sys.stderr)
+    elif args.command == "onnx":
+        path = export_onnx(args.model, args.output or MODEL_PATHS["onnx"], args.opset)
+        print(f"Wrote {path} (opset {args.opset})", file=sys.stderr)
+    else:
+        report(args.models or [p for p in MODEL_PATHS.values() if os.path.exists(p)])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
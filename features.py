@@ -0,0 +1,224 @@
+import sys
+import threading
+import numpy as np
+
+# Shared feature pipeline for training (train_model.py) and serving (api.py, simple_predict.py).
+# The saved LabelEncoders are compiled into plain dict lookups and the StandardScaler
+# into (x - mean) / scale applied in place on a preallocated buffer, so serving never
+# calls LabelEncoder.transform / StandardScaler.transform.
+
+CATEGORICAL_FEATURES = ["district", "season", "variety", "soil_type"]
+ENGINEERED_FEATURES = ["rain_temp_ratio", "humidity_temp_index", "temp_rain_interaction"]
+TARGET = "yield_quintal_per_acre"
+
+# Used only when a scaler was fitted without feature names
+DEFAULT_FEATURE_ORDER = [
+    "district", "season", "variety", "soil_type",
+    "rainfall_mm", "temperature_C", "humidity_percent",
+    *ENGINEERED_FEATURES,
+]
+
+def add_engineered_features(df):
+    """Add the engineered weather features to a DataFrame (or dict of arrays) in place."""
+    df["rain_temp_ratio"] = df["rainfall_mm"] / (df["temperature_C"] + 1)
+    df["humidity_temp_index"] = df["humidity_percent"] / (df["temperature_C"] + 1)
+    df["temp_rain_interaction"] = df["temperature_C"] * df["rainfall_mm"] / 100
+    return df
+
+def typical_inputs(df):
+    """
+    A representative raw input row from training data: the most common label of each
+    categorical and the median of every other numeric input column.
+    """
+    row = {col: str(df[col].mode().iloc[0]) for col in CATEGORICAL_FEATURES}
+    for col in df.columns:
+        if col not in row and col not in ENGINEERED_FEATURES and col != TARGET and np.issubdtype(df[col].dtype, np.number):
+            row[col] = float(df[col].median())
+    return row
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _lookup_code(lookup, value):
+    return lookup.get(value, -1) if isinstance(value, str) else -1
+
+class FeaturePipeline:
+    """
+    Compiled encoders + scaler.
+    transform_row() is the single-request fast path, transform_batch() the columnar one.
+    """
+
+    def __init__(self, encoders, scaler, feature_order=None):
+        if feature_order is None:
+            names = getattr(scaler, "feature_names_in_", None)
+            feature_order = list(names) if names is not None else DEFAULT_FEATURE_ORDER
+        self.feature_order = list(feature_order)
+        self.n_features = len(self.feature_order)
+        self.index = {name: i for i, name in enumerate(self.feature_order)}
+
+        # label -> code, equivalent to LabelEncoder.transform for known labels
+        self.lookups = {
+            col: {label: code for code, label in enumerate(encoders[col].classes_.tolist())}
+            for col in CATEGORICAL_FEATURES
+        }
+        self.numeric_features = [
+            c for c in self.feature_order
+            if c not in self.lookups and c not in ENGINEERED_FEATURES
+        ]
+
+        mean = getattr(scaler, "mean_", None)
+        scale = getattr(scaler, "scale_", None)
+        self.mean = np.asarray(mean, dtype=np.float64) if getattr(scaler, "with_mean", True) and mean is not None else np.zeros(self.n_features)
+        self.scale = np.asarray(scale, dtype=np.float64) if getattr(scaler, "with_std", True) and scale is not None else np.ones(self.n_features)
+
+        self._local = threading.local()
+
+    def _row_buffer(self):
+        buf = getattr(self._local, "row", None)
+        if buf is None:
+            buf = self._local.row = np.empty((1, self.n_features), dtype=np.float64)
+        return buf
+
+    def _scale_inplace(self, X):
+        np.subtract(X, self.mean, out=X)
+        np.divide(X, self.scale, out=X)
+        return X
+
+    def transform_row(self, row):
+        """
+        Encode, engineer and scale one input dict; raises ValueError on bad input.
+        Returns a (1, n_features) view of a per-thread buffer that is reused on the next call.
+        """
+        out = self._row_buffer()
+        x = out[0]
+        index = self.index
+        for col, lookup in self.lookups.items():
+            value = row.get(col)
+            code = lookup.get(value) if isinstance(value, str) else None
+            if code is None:
+                raise ValueError(f"Unknown or missing value for '{col}': {value!r}")
+            x[index[col]] = code
+        for col in self.numeric_features:
+            value = _to_float(row.get(col))
+            if value != value:
+                raise ValueError(f"Missing or non-numeric value for '{col}'")
+            x[index[col]] = value
+
+        rain = x[index["rainfall_mm"]]
+        temp = x[index["temperature_C"]]
+        humidity = x[index["humidity_percent"]]
+        x[index["rain_temp_ratio"]] = rain / (temp + 1)
+        x[index["humidity_temp_index"]] = humidity / (temp + 1)
+        x[index["temp_rain_interaction"]] = temp * rain / 100
+        return self._scale_inplace(out)
+
+    def transform_batch(self, rows):
+        """
+        Columnar transform of a list of row dicts.
+        Returns (X_scaled, errors): errors[i] is None or a message for row i; rows with
+        errors are left in X as NaN and must be masked out by the caller.
+        """
+        n = len(rows)
+        X = np.empty((n, self.n_features), dtype=np.float64)
+        errors = [None if isinstance(r, dict) else "Row must be a JSON object" for r in rows]
+        records = [r if isinstance(r, dict) else {} for r in rows]
+
+        def flag(bad, message):
+            for i in np.flatnonzero(bad):
+                if errors[i] is None:
+                    errors[i] = message
+
+        for col, lookup in self.lookups.items():
+            codes = np.fromiter((_lookup_code(lookup, r.get(col)) for r in records), dtype=np.float64, count=n)
+            flag(codes < 0, f"Unknown or missing value for '{col}'")
+            X[:, self.index[col]] = codes
+        for col in self.numeric_features:
+            values = np.fromiter((_to_float(r.get(col)) for r in records), dtype=np.float64, count=n)
+            flag(np.isnan(values), f"Missing or non-numeric value for '{col}'")
+            X[:, self.index[col]] = values
+
+        self._engineer_columns(X)
+        self._scale_inplace(X)
+        X[[e is not None for e in errors]] = np.nan
+        return X, errors
+
+    def transform_columns(self, columns, n, out=None):
+        """
+        Transform n rows given column-wise: each feature is a scalar (broadcast) or a length-n array.
+        Categoricals must be scalar labels; raises ValueError on unknown labels or missing features.
+        Writes into `out` (an (n, n_features) float64 array) when given, e.g. to reuse a chunk buffer.
+        """
+        X = np.empty((n, self.n_features), dtype=np.float64) if out is None else out[:n]
+        for col, lookup in self.lookups.items():
+            value = columns.get(col)
+            code = lookup.get(value) if isinstance(value, str) else None
+            if code is None:
+                raise ValueError(f"Unknown or missing value for '{col}': {value!r}")
+            X[:, self.index[col]] = code
+        for col in self.numeric_features:
+            if columns.get(col) is None:
+                raise ValueError(f"Missing value for '{col}'")
+            X[:, self.index[col]] = columns[col]
+        self._engineer_columns(X)
+        return self._scale_inplace(X)
+
+    def transform_frame(self, df):
+        """Transform a raw (unencoded) DataFrame; unknown labels raise ValueError."""
+        n = len(df)
+        X = np.empty((n, self.n_features), dtype=np.float64)
+        for col, lookup in self.lookups.items():
+            codes = df[col].map(lookup)
+            if codes.isna().any():
+                raise ValueError(f"Unknown labels in '{col}': {sorted(df[col][codes.isna()].unique().tolist())}")
+            X[:, self.index[col]] = codes.to_numpy(dtype=np.float64)
+        for col in self.numeric_features:
+            X[:, self.index[col]] = df[col].to_numpy(dtype=np.float64)
+        self._engineer_columns(X)
+        return self._scale_inplace(X)
+
+    def _engineer_columns(self, X):
+        index = self.index
+        rain = X[:, index["rainfall_mm"]]
+        temp = X[:, index["temperature_C"]]
+        humidity = X[:, index["humidity_percent"]]
+        X[:, index["rain_temp_ratio"]] = rain / (temp + 1)
+        X[:, index["humidity_temp_index"]] = humidity / (temp + 1)
+        X[:, index["temp_rain_interaction"]] = temp * rain / 100
+
+def check_parity(csv_path="farm2.csv"):
+    """
+    Compare the compiled pipeline against the LabelEncoder + StandardScaler path
+    the serving code used before, on the training CSV. Returns the max abs difference.
+    """
+    import pandas as pd
+    from model_bundle import load_artifacts
+
+    artifacts = load_artifacts()
+    scaler = artifacts["scaler"]
+    encoders = artifacts["encoders"]
+    pipeline = artifacts["pipeline"]
+
+    raw = pd.read_csv(csv_path).drop(columns=[TARGET], errors="ignore")
+
+    # Reference: the original sklearn path
+    ref = raw.copy()
+    for col in CATEGORICAL_FEATURES:
+        ref[col] = encoders[col].transform(ref[col])
+    add_engineered_features(ref)
+    expected = scaler.transform(ref[pipeline.feature_order])
+
+    records = raw.to_dict("records")
+    batch, errors = pipeline.transform_batch(records)
+    assert all(e is None for e in errors), errors
+    rows = np.vstack([pipeline.transform_row(r).copy() for r in records])
+    frame = pipeline.transform_frame(raw)
+
+    return max(float(np.max(np.abs(candidate - expected))) for candidate in (batch, rows, frame))
+
+if __name__ == "__main__":
+    diff = check_parity(*sys.argv[1:2])
+    print(f"Max abs difference vs sklearn encoders/scaler: {diff:.3e}")
+    sys.exit(0 if diff <= 1e-12 else 1)
@@ -1,19 +1,22 @@
 import sys
 import os
+import argparse
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
 from PIL import Image
+from mango_pipeline import segment_and_count
+from segmentation_engine import BACKENDS, DEFAULT_BACKEND, get_engine, model_available
 import matplotlib.pyplot as plt
 
-def segment_mango_image(input_path, output_path):
+def segment_mango_image(input_path, output_path, tiled=False, backend=None):
     """
     Load the trained U-Net model and perform segmentation on the input image.
+    With tiled=True the overlay is produced at the image's own resolution.
+    backend picks keras, tflite or onnx (default SEGMENTATION_BACKEND).
     """
     try:
         # Load the trained model
-        model_path = "mango_segmentation_model.h5"
-        if not os.path.exists(model_path):
+        if not model_available(backend=backend):
             print("Model file not found, using mock segmentation for testing")
             # Create mock segmentation: draw some green circles to simulate mangoes
             img = cv2.imread(input_path)
@@ -41,40 +44,19 @@ def segment_mango_image(input_path, output_path):
             print(f"Mock segmentation result saved to {output_path}")
             return True
 
-        model = load_model(model_path)
-        print("Model loaded successfully")
+        # Loaded once per process and reused across images
+        engine = get_engine(backend=backend)
 
         # Load and preprocess the input image
         img = cv2.imread(input_path)
         if img is None:
             raise ValueError(f"Could not load image from {input_path}")
 
-        # Resize to model input size (256x256)
-        img_resized = cv2.resize(img, (256, 256))
-        img_normalized = img_resized.astype(np.float32) / 255.0
-
-        # Add batch dimension
-        img_input = np.expand_dims(img_normalized, axis=0)
-
-        # Perform prediction
-        prediction = model.predict(img_input, verbose=0)
-
-        # Remove batch dimension and get the mask
-        mask = prediction[0]
-
-        # Threshold the mask
-        mask_binary = (mask > 0.5).astype(np.uint8)
-
-        # Convert to 3-channel mask for visualization
-        mask_rgb = np.zeros_like(img_resized)
-        mask_rgb[mask_binary[:, :, 0] == 1] = [0, 255, 0]  # Green for mango regions
-
-        # Overlay the mask on the original image
-        overlay = cv2.addWeighted(img_resized, 0.7, mask_rgb, 0.3, 0)
-
-        # Save the overlay
-        cv2.imwrite(output_path, overlay)
-        print(f"Segmentation result saved to {output_path}")
+        # Segment and count in process, then encode the overlay once, in memory
+        result = segment_and_count(img, engine, tiled=tiled)
+        with open(output_path, "wb") as f:
+            f.write(result.encode_overlay(os.path.splitext(output_path)[1] or ".png"))
+        print(f"Segmentation result saved to {output_path} ({result.count} mangoes)")
 
         return True
 
@@ -83,12 +65,12 @@ def segment_mango_image(input_path, output_path):
         return False
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python image_segmentation.py <input_image_path> <output_image_path>", file=sys.stderr)
-        sys.exit(1)
-
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-
-    success = segment_mango_image(input_path, output_path)
+    parser = argparse.ArgumentParser(description="Segment mangoes in an image and save the overlay.")
+    parser.add_argument("input_image_path")
+    parser.add_argument("output_image_path")
+    parser.add_argument("--tiled", action="store_true", help="segment at full resolution in overlapping tiles")
+    parser.add_argument("--engine", choices=BACKENDS, default=DEFAULT_BACKEND, help="inference backend")
+    args = parser.parse_args()
+
+    success = segment_mango_image(args.input_image_path, args.output_image_path, tiled=args.tiled, backend=args.engine)
     sys.exit(0 if success else 1)
@@ -1,12 +1,14 @@
 import os
+import argparse
 import numpy as np
-import cv2
+import tensorflow as tf
 from sklearn.model_selection import train_test_split
 from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Input, Conv2D, MaxPooling2D, UpSampling2D, concatenate
+from tensorflow.keras.layers import Input, Conv2D, SeparableConv2D, MaxPooling2D, UpSampling2D, concatenate
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import ModelCheckpoint
 import matplotlib.pyplot as plt
+from mangonet_cache import CACHE_DIR, PreprocessedStore, load_cached
 
 # Paths
 dataset_path = "Mango dataset/MangoNet Dataset"
@@ -20,106 +22,183 @@ IMG_HEIGHT = 224
 IMG_WIDTH = 224
 IMG_CHANNELS = 3
 
-# Load images and masks
-def load_data(original_path, annotated_path):
-    images = []
-    masks = []
-    for img_file in os.listdir(original_path):
+def pair_paths(original_path, annotated_path):
+    """(image, annotation) path pairs: IMG_xxx.JPG is annotated by Class_xxx.jpg."""
+    pairs = []
+    for img_file in sorted(os.listdir(original_path)):
         if img_file.endswith('.JPG'):
             img_path = os.path.join(original_path, img_file)
             ann_file = img_file.replace('IMG_', 'Class_').replace('.JPG', '.jpg')
             ann_path = os.path.join(annotated_path, ann_file)
             if os.path.exists(ann_path):
-                img = cv2.imread(img_path)
-                img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
-                img = img / 255.0
-                images.append(img)
-
-                mask = cv2.imread(ann_path)
-                mask = cv2.resize(mask, (IMG_WIDTH, IMG_HEIGHT))
-                # Convert to binary: green channel > 128 as mango
-                mask = (mask[:, :, 1] > 128).astype(np.uint8)
-                # Optional alternative using grayscale thresholding:
-                # gray = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
-                # _, bin_mask = cv2.threshold(gray, 128, 1, cv2.THRESH_BINARY)
-                # mask = bin_mask.astype(np.uint8)
-                masks.append(mask)
-    return np.array(images), np.array(masks)
-
-# Load train and test
-X_train, y_train = load_data(train_original_path, train_annotated_path)
-X_test, y_test = load_data(test_original_path, test_annotated_path)
-
-# Expand mask dimensions and convert to float32 for Keras compatibility
-y_train = np.expand_dims(y_train, axis=-1).astype('float32')
-y_test = np.expand_dims(y_test, axis=-1).astype('float32')
-
-print(f"Train images: {X_train.shape}, Train masks: {y_train.shape}")
-print(f"Test images: {X_test.shape}, Test masks: {y_test.shape}")
-print(f"After expanding dims: y_train shape = {y_train.shape}, y_test shape = {y_test.shape}")
+                pairs.append((img_path, ann_path))
+    return pairs
+
+# Load images and masks
+# Decoded, resized images and binary masks come from the preprocessed store in
+# mangonet_cache.py, so only new or changed files are decoded again.
+def load_data(original_path, annotated_path, normalize=True, cache_dir=CACHE_DIR):
+    images, masks = load_cached(pair_paths(original_path, annotated_path), (IMG_HEIGHT, IMG_WIDTH), cache_dir)
+    if normalize:
+        images = images / 255.0
+    return images, masks
+
+def _augment(img, mask):
+    # Flips are applied to image and mask together; colour jitter to the image only
+    stacked = tf.concat([img, mask], axis=-1)
+    stacked = tf.image.random_flip_left_right(stacked)
+    stacked = tf.image.random_flip_up_down(stacked)
+    img, mask = stacked[..., :IMG_CHANNELS], stacked[..., IMG_CHANNELS:]
+
+    img = tf.cast(img, tf.float32) / 255.0
+    img = tf.image.random_brightness(img, 0.1)
+    img = tf.image.random_contrast(img, 0.9, 1.1)
+    return tf.clip_by_value(img, 0.0, 1.0), tf.cast(mask, tf.float32)
+
+def _to_float(img, mask):
+    return tf.cast(img, tf.float32) / 255.0, tf.cast(mask, tf.float32)
+
+def make_dataset(pairs, batch_size=4, training=False, cache_dir=CACHE_DIR, augment=True):
+    """
+    Streaming tf.data pipeline over (image, annotation) path pairs.
+    Pairs are decoded in parallel into the memory-mapped preprocessed store (once per
+    content hash), rows are streamed from it, training batches are shuffled and augmented
+    on the fly, and batches are prefetched so the model never waits on the input.
+    """
+    store = PreprocessedStore((IMG_HEIGHT, IMG_WIDTH), cache_dir)
+    keys = store.update(pairs)
+
+    def rows():
+        for img, mask in store.iter_rows(keys):
+            yield img, mask[..., np.newaxis]
+
+    ds = tf.data.Dataset.from_generator(rows, output_signature=(
+        tf.TensorSpec((IMG_HEIGHT, IMG_WIDTH, IMG_CHANNELS), tf.uint8),
+        tf.TensorSpec((IMG_HEIGHT, IMG_WIDTH, 1), tf.uint8),
+    ))
+    if training:
+        options = tf.data.Options()
+        options.deterministic = False
+        ds = ds.with_options(options)
+        ds = ds.shuffle(max(1, min(len(keys), 1000)), reshuffle_each_iteration=True)  # buffer_size 0 is an error
+    ds = ds.map(_augment if training and augment else _to_float, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
 
 # U-Net model
-def unet_model(input_size=(IMG_HEIGHT, IMG_WIDTH, IMG_CHANNELS)):
+# width scales the filters per level (64 * width * 2**level), depth is the number of
+# down-sampling levels and separable swaps the 3x3 convs for depthwise-separable ones.
+# The defaults are the original 64 -> 1024 network.
+UNET_VARIANTS = {
+    "full": {"width": 1.0, "depth": 4, "separable": False},
+    "half": {"width": 0.5, "depth": 4, "separable": False},
+    "lite": {"width": 0.25, "depth": 4, "separable": True},
+    "tiny": {"width": 0.125, "depth": 3, "separable": True},
+}
+
+def conv_block(x, filters, separable=False):
+    conv = SeparableConv2D if separable else Conv2D
+    x = conv(filters, (3, 3), activation='relu', padding='same')(x)
+    x = conv(filters, (3, 3), activation='relu', padding='same')(x)
+    return x
+
+def unet_model(input_size=(IMG_HEIGHT, IMG_WIDTH, IMG_CHANNELS), width=1.0, depth=4, separable=False):
     inputs = Input(input_size)
+    filters = [max(8, int(round(64 * width * 2 ** level))) for level in range(depth + 1)]
 
-    # Encoder
-    c1 = Conv2D(64, (3, 3), activation='relu', padding='same')(inputs)
-    c1 = Conv2D(64, (3, 3), activation='relu', padding='same')(c1)
-    p1 = MaxPooling2D((2, 2))(c1)
-
-    c2 = Conv2D(128, (3, 3), activation='relu', padding='same')(p1)
-    c2 = Conv2D(128, (3, 3), activation='relu', padding='same')(c2)
-    p2 = MaxPooling2D((2, 2))(c2)
-
-    c3 = Conv2D(256, (3, 3), activation='relu', padding='same')(p2)
-    c3 = Conv2D(256, (3, 3), activation='relu', padding='same')(c3)
-    p3 = MaxPooling2D((2, 2))(c3)
-
-    c4 = Conv2D(512, (3, 3), activation='relu', padding='same')(p3)
-    c4 = Conv2D(512, (3, 3), activation='relu', padding='same')(c4)
-    p4 = MaxPooling2D((2, 2))(c4)
+    # Encoder (the first conv sees 3 channels, where a separable conv saves nothing)
+    x = Conv2D(filters[0], (3, 3), activation='relu', padding='same')(inputs)
+    x = (SeparableConv2D if separable else Conv2D)(filters[0], (3, 3), activation='relu', padding='same')(x)
+    skips = [x]
+    x = MaxPooling2D((2, 2))(x)
+    for level in range(1, depth):
+        x = conv_block(x, filters[level], separable)
+        skips.append(x)
+        x = MaxPooling2D((2, 2))(x)
 
-    c5 = Conv2D(1024, (3, 3), activation='relu', padding='same')(p4)
-    c5 = Conv2D(1024, (3, 3), activation='relu', padding='same')(c5)
+    # Bottleneck
+    x = conv_block(x, filters[depth], separable)
 
     # Decoder
-    u6 = UpSampling2D((2, 2))(c5)
-    u6 = concatenate([u6, c4])
-    c6 = Conv2D(512, (3, 3), activation='relu', padding='same')(u6)
-    c6 = Conv2D(512, (3, 3), activation='relu', padding='same')(c6)
+    for level in reversed(range(depth)):
+        x = UpSampling2D((2, 2))(x)
+        x = concatenate([x, skips[level]])
+        x = conv_block(x, filters[level], separable)
 
-    u7 = UpSampling2D((2, 2))(c6)
-    u7 = concatenate([u7, c3])
-    c7 = Conv2D(256, (3, 3), activation='relu', padding='same')(u7)
-    c7 = Conv2D(256, (3, 3), activation='relu', padding='same')(c7)
-
-    u8 = UpSampling2D((2, 2))(c7)
-    u8 = concatenate([u8, c2])
-    c8 = Conv2D(128, (3, 3), activation='relu', padding='same')(u8)
-    c8 = Conv2D(128, (3, 3), activation='relu', padding='same')(c8)
-
-    u9 = UpSampling2D((2, 2))(c8)
-    u9 = concatenate([u9, c1])
-    c9 = Conv2D(64, (3, 3), activation='relu', padding='same')(u9)
-    c9 = Conv2D(64, (3, 3), activation='relu', padding='same')(c9)
-
-    outputs = Conv2D(1, (1, 1), activation='sigmoid')(c9)
+    outputs = Conv2D(1, (1, 1), activation='sigmoid')(x)
 
     model = Model(inputs=[inputs], outputs=[outputs])
     model.compile(optimizer=Adam(learning_rate=1e-4), loss='binary_crossentropy', metrics=['accuracy'])
     return model
 
-model = unet_model()
-model.summary()
-
-# Train
-checkpoint = ModelCheckpoint('mango_segmentation_model.h5', save_best_only=True, monitor='val_loss', mode='min')
-history = model.fit(X_train, y_train, validation_data=(X_test, y_test), batch_size=4, epochs=50, callbacks=[checkpoint])
-
-# Plot history
-plt.plot(history.history['loss'], label='train_loss')
-plt.plot(history.history['val_loss'], label='val_loss')
-plt.legend()
-plt.show()
-
-print("Segmentation model trained and saved as mango_segmentation_model.h5")
+MODEL_OUTPUT_PATH = 'mango_segmentation_model.h5'
+
+def train(variant="full", epochs=50, batch_size=4, output_path=MODEL_OUTPUT_PATH, data=None, plot=True,
+          cache_dir=CACHE_DIR, augment=True, **overrides):
+    """
+    Train a U-Net variant (see UNET_VARIANTS; keyword overrides for width/depth/separable)
+    and save the best epoch to output_path. Returns (model, history).
+    Images are streamed through make_dataset unless data=(X_train, y_train, X_test, y_test) is given.
+    """
+    if data is None:
+        # Stream from the preprocessed store
+        train_pairs = pair_paths(train_original_path, train_annotated_path)
+        test_pairs = pair_paths(test_original_path, test_annotated_path)
+        train_data = make_dataset(train_pairs, batch_size, training=True, cache_dir=cache_dir, augment=augment)
+        val_data = make_dataset(test_pairs, batch_size, cache_dir=cache_dir)
+        print(f"Train pairs: {len(train_pairs)}, Test pairs: {len(test_pairs)}")
+        fit_kwargs = {"x": train_data, "validation_data": val_data}
+    else:
+        # In-memory arrays (e.g. benchmarks that reuse one loaded split)
+        X_train, y_train, X_test, y_test = data
+
+        # Expand mask dimensions and convert to float32 for Keras compatibility
+        y_train = np.expand_dims(y_train, axis=-1).astype('float32')
+        y_test = np.expand_dims(y_test, axis=-1).astype('float32')
+
+        print(f"Train images: {X_train.shape}, Train masks: {y_train.shape}")
+        print(f"Test images: {X_test.shape}, Test masks: {y_test.shape}")
+        fit_kwargs = {"x": X_train, "y": y_train, "validation_data": (X_test, y_test), "batch_size": batch_size}
+
+    config = dict(UNET_VARIANTS[variant], **{k: v for k, v in overrides.items() if v is not None})
+    model = unet_model(**config)
+    model.summary()
+
+    # Train
+    checkpoint = ModelCheckpoint(output_path, save_best_only=True, monitor='val_loss', mode='min')
+    history = model.fit(epochs=epochs, callbacks=[checkpoint], **fit_kwargs)
+
+    if plot:
+        # Plot history
+        plt.plot(history.history['loss'], label='train_loss')
+        plt.plot(history.history['val_loss'], label='val_loss')
+        plt.legend()
+        plt.show()
+
+    print(f"Segmentation model ({variant}, {config}) trained and saved as {output_path}")
+    return model, history
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the mango segmentation U-Net.")
+    parser.add_argument("--variant", choices=list(UNET_VARIANTS), default="full",
+                        help="architecture preset (default: full, the original 64->1024 U-Net)")
+    parser.add_argument("--width", type=float, help="override the preset's filter width multiplier")
+    parser.add_argument("--depth", type=int, help="override the preset's number of down-sampling levels")
+    parser.add_argument("--separable", action=argparse.BooleanOptionalAction, default=None,
+                        help="override the preset's depthwise-separable convs")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--output", default=MODEL_OUTPUT_PATH, help=f"saved model path (default: {MODEL_OUTPUT_PATH})")
+    parser.add_argument("--no-plot", action="store_true", help="skip the loss plot")
+    parser.add_argument("--no-augment", action="store_true", help="disable random flips and colour jitter")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"preprocessed image/mask store (default: {CACHE_DIR})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    train(args.variant, args.epochs, args.batch_size, args.output, plot=not args.no_plot,
+          cache_dir=args.cache_dir, augment=not args.no_augment,
+          width=args.width, depth=args.depth, separable=args.separable)
+
+if __name__ == "__main__":
+    main()
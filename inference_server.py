@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import base64
+import logging
+import threading
+import cv2
+from flask import Flask, request, jsonify, Response
+from simple_predict import load_artifacts, predict_yield_from_image
+from segmentation_engine import get_engine, model_available
+from mango_pipeline import segment_and_count
+from tracing import metrics_lines, stage, trace
+
+# Long-lived inference service for the Next.js image route.
+# The model, scaler and encoders are loaded once at startup instead of on every
+# `python simple_predict.py` spawn.
+#
+# Configuration (env vars):
+#   INFERENCE_HOST     - bind address, default 127.0.0.1
+#   INFERENCE_PORT     - bind port, default 5001
+#   INFERENCE_WORKERS  - max concurrent predictions, default 4
+#   INFERENCE_QUEUE_TIMEOUT - seconds a request may wait for a free worker, default 30
+
+HOST = os.getenv("INFERENCE_HOST", "127.0.0.1")
+PORT = int(os.getenv("INFERENCE_PORT", "5001"))
+WORKERS = max(1, int(os.getenv("INFERENCE_WORKERS", "4")))
+QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "30"))
+
+app = Flask(__name__)
+
+started_at = time.time()
+artifacts = load_artifacts()
+worker_slots = threading.BoundedSemaphore(WORKERS)
+stats = {"served": 0, "rejected": 0, "in_flight": 0}
+stats_lock = threading.Lock()
+
+@app.route("/health", methods=["GET"])
+def health():
+    with stats_lock:
+        snapshot = dict(stats)
+    return jsonify({
+        "status": "ok",
+        "model_loaded": artifacts is not None,
+        "model_version": artifacts["model_version"],
+        "workers": WORKERS,
+        "uptime_s": round(time.time() - started_at, 1),
+        **snapshot,
+    })
+
+@app.route("/predict-image", methods=["POST"])
+def predict_image():
+    data = request.get_json(silent=True) or {}
+    image_path = data.get("image_path")
+    if not image_path:
+        return jsonify({"error": "image_path is required"}), 400
+
+    # Bound concurrency so bursts queue here instead of overloading the host
+    if not worker_slots.acquire(timeout=QUEUE_TIMEOUT):
+        with stats_lock:
+            stats["rejected"] += 1
+        return jsonify({"error": "All inference workers are busy"}), 503
+
+    with stats_lock:
+        stats["in_flight"] += 1
+    try:
+        with trace("predict_image"):
+            yield_prediction = predict_yield_from_image(image_path, artifacts)
+    finally:
+        worker_slots.release()
+        with stats_lock:
+            stats["in_flight"] -= 1
+            stats["served"] += 1
+
+    return jsonify({"yield": yield_prediction})
+
+@app.route("/count-image", methods=["POST"])
+def count_image():
+    """
+    Segment and count mangoes in process: {"image_path", "tiled": false, "overlay": false}.
+    The overlay is only rendered when "overlay" is true and comes back as base64 PNG.
+    """
+    data = request.get_json(silent=True) or {}
+    image_path = data.get("image_path")
+    if not image_path:
+        return jsonify({"error": "image_path is required"}), 400
+    if not model_available():
+        return jsonify({"error": "Segmentation model not found"}), 503
+
+    if not worker_slots.acquire(timeout=QUEUE_TIMEOUT):
+        with stats_lock:
+            stats["rejected"] += 1
+        return jsonify({"error": "All inference workers are busy"}), 503
+
+    with stats_lock:
+        stats["in_flight"] += 1
+    try:
+        with trace("count_image") as request_trace:
+            with stage("imread"):
+                img = cv2.imread(image_path)
+            if img is None:
+                return jsonify({"error": f"Could not load image from {image_path}"}), 400
+            result = segment_and_count(img, get_engine(), tiled=bool(data.get("tiled")))
+            response = {"count": result.count, "areas": result.counts.areas.tolist()}
+            if data.get("overlay"):
+                response["overlay_png_base64"] = base64.b64encode(result.encode_overlay(".png")).decode("ascii")
+        response["trace"] = request_trace.to_dict()
+    finally:
+        worker_slots.release()
+        with stats_lock:
+            stats["in_flight"] -= 1
+            stats["served"] += 1
+
+    return jsonify(response)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    lines = metrics_lines()
+    with stats_lock:
+        lines += [
+            "# TYPE farm2value_inference_served_total counter",
+            f"farm2value_inference_served_total {stats['served']}",
+            "# TYPE farm2value_inference_rejected_total counter",
+            f"farm2value_inference_rejected_total {stats['rejected']}",
+        ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print(f"Inference server listening on {HOST}:{PORT} with {WORKERS} workers", file=sys.stderr)
+    app.run(host=HOST, port=PORT, threaded=True)
@@ -0,0 +1,153 @@
+import time
+import cv2
+import numpy as np
+from tracing import record
+
+# Mango counting on a binary segmentation mask, shared by count_mangoes.py,
+# image_yield_predict.py and the batch tools.
+# All blobs are measured in one cv2.connectedComponentsWithStats call and filtered with
+# NumPy; watershed runs only on the crops of large, non-round components that look like
+# touching fruit, instead of on the whole mask.
+
+# Area limits are in pixels of a REFERENCE_SIZE x REFERENCE_SIZE mask (the U-Net input); for
+# other mask sizes (e.g. full-resolution tiled masks) they scale with the mask area, and
+# boundary lengths with its square root, so the same fruit passes at any resolution.
+REFERENCE_SIZE = 224
+MIN_AREA = 20
+MAX_AREA = 15000
+MIN_CIRCULARITY = 0.3
+# Fewer boundary pixels than this is a speck, not a fruit
+MIN_BOUNDARY_PIXELS = 8
+
+# Components considered for splitting: at least this big, and either too big to be one
+# fruit or less round than a single fruit
+SPLIT_MIN_AREA = 2000
+SPLIT_MAX_CIRCULARITY = 0.7
+# Watershed seeds: distance-transform peaks above this fraction of the component's maximum
+SEED_THRESHOLD = 0.3
+
+# Scales an 8-connected boundary pixel count to the Euclidean perimeter (exact for a digital disk)
+PERIMETER_SCALE = np.pi / (2 * np.sqrt(2))
+
+KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+class CountResult:
+    """Mango count with per-fruit areas (pixels), centroids (x, y) and stage timings (ms)."""
+
+    def __init__(self, count, areas, centroids, split_components, timings):
+        self.count = count
+        self.areas = areas
+        self.centroids = centroids
+        self.split_components = split_components
+        self.timings = timings
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "areas": self.areas.tolist(),
+            "centroids": self.centroids.tolist(),
+            "split_components": self.split_components,
+            "timings_ms": self.timings,
+        }
+
+def clean_mask(mask):
+    """Binary uint8 (0/1) mask after the usual open/close cleanup."""
+    mask = (mask > 0).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, KERNEL, iterations=1)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, KERNEL, iterations=2)
+
+def component_shapes(mask, labels, areas):
+    """Boundary pixel count and circularity 4*pi*A/P^2 for every label (index 0 is background)."""
+    boundary = (mask > cv2.erode(mask, CROSS)) & (labels > 0)
+    boundary_pixels = np.bincount(labels[boundary], minlength=len(areas))
+    perimeter = boundary_pixels * PERIMETER_SCALE
+    with np.errstate(divide="ignore", invalid="ignore"):
+        circularity = np.where(perimeter > 0, 4 * np.pi * areas / (perimeter * perimeter), 0.0)
+    return boundary_pixels, circularity
+
+def split_component(component_mask, min_area=MIN_AREA):
+    """
+    Watershed one component crop; returns (areas, centroids) of the pieces, one row per fruit,
+    or None when it does not split into at least two pieces larger than min_area.
+    """
+    dist = cv2.distanceTransform(component_mask, cv2.DIST_L2, 5)
+    sure_fg = (dist > SEED_THRESHOLD * dist.max()).astype(np.uint8)
+    n_seeds, markers = cv2.connectedComponents(sure_fg)
+    if n_seeds <= 2:
+        return None
+
+    sure_bg = cv2.dilate(component_mask, KERNEL, iterations=2)
+    markers = markers + 1
+    markers[(sure_bg > 0) & (sure_fg == 0)] = 0
+    markers = cv2.watershed(cv2.cvtColor(component_mask * 255, cv2.COLOR_GRAY2BGR), markers)
+
+    # Watershed lines are -1 and the background 1; keep only the fruit pieces
+    pieces = np.where((component_mask > 0) & (markers > 1), markers, 0)
+    piece_labels = np.arange(2, n_seeds + 1)
+    areas = np.bincount(pieces.ravel(), minlength=n_seeds + 1)[piece_labels]
+    ys, xs = np.nonzero(pieces)
+    sums_x = np.bincount(pieces[ys, xs], weights=xs, minlength=n_seeds + 1)[piece_labels]
+    sums_y = np.bincount(pieces[ys, xs], weights=ys, minlength=n_seeds + 1)[piece_labels]
+    keep = areas > min_area
+    if keep.sum() < 2:
+        return None
+    centroids = np.stack([sums_x[keep] / areas[keep], sums_y[keep] / areas[keep]], axis=1)
+    return areas[keep], centroids
+
+def count_mask(mask, area_scale=None):
+    """
+    Count mangoes in a binary mask (any nonzero pixel is mango); returns a CountResult.
+    area_scale multiplies the area limits; by default it is the mask area over REFERENCE_SIZE**2.
+    """
+    start = time.perf_counter()
+    mask = clean_mask(mask)
+    cleaned = time.perf_counter()
+
+    if area_scale is None:
+        area_scale = mask.shape[0] * mask.shape[1] / REFERENCE_SIZE ** 2
+    min_area, max_area, split_min_area = MIN_AREA * area_scale, MAX_AREA * area_scale, SPLIT_MIN_AREA * area_scale
+    min_boundary_pixels = MIN_BOUNDARY_PIXELS * np.sqrt(area_scale)
+
+    n_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    areas = stats[:, cv2.CC_STAT_AREA]
+    boundary_pixels, circularity = component_shapes(mask, labels, areas)
+
+    fruit = ((areas > min_area) & (areas < max_area) & (circularity > MIN_CIRCULARITY)
+             & (boundary_pixels > min_boundary_pixels))
+    to_split = (areas >= split_min_area) & ((areas >= max_area) | (circularity < SPLIT_MAX_CIRCULARITY))
+    fruit[0] = to_split[0] = False
+    measured = time.perf_counter()
+
+    fruit_areas = [areas[fruit & ~to_split]]
+    fruit_centroids = [centroids[fruit & ~to_split]]
+    split_components = 0
+    for label in np.flatnonzero(to_split):
+        x, y, w, h = stats[label, :4]
+        crop = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+        # Pad so a background ring survives the sure-background dilation
+        pad = 4
+        crop = cv2.copyMakeBorder(crop, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=0)
+        pieces = split_component(crop, min_area)
+        if pieces is not None:
+            piece_areas, piece_centroids = pieces
+            fruit_areas.append(piece_areas)
+            fruit_centroids.append(piece_centroids + [x - pad, y - pad])
+            split_components += 1
+        else:
+            # No second seed: one (large or odd-shaped) fruit rather than none
+            fruit_areas.append(areas[label:label + 1])
+            fruit_centroids.append(centroids[label:label + 1])
+    done = time.perf_counter()
+
+    fruit_areas = np.concatenate(fruit_areas).astype(np.int64)
+    fruit_centroids = np.concatenate(fruit_centroids).reshape(-1, 2)
+    timings = {
+        "morphology": (cleaned - start) * 1000,
+        "components": (measured - cleaned) * 1000,
+        "watershed": (done - measured) * 1000,
+        "total": (done - start) * 1000,
+    }
+    for name in ("morphology", "components", "watershed"):
+        record(f"count_{name}", timings[name] / 1000)
+    return CountResult(len(fruit_areas), fruit_areas, fruit_centroids, split_components, timings)
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+from mango_counter import count_mask
+from segmentation_engine import get_engine
+from tracing import annotate, stage
+
+# In-process segmentation -> count.
+# The U-Net mask goes straight to the counter; nothing is written to disk and no overlay is
+# drawn unless the caller asks for one, in which case it is encoded into an in-memory buffer.
+
+class SegmentationResult:
+    """Mask, image it was predicted on and CountResult; the overlay is rendered on first request."""
+
+    def __init__(self, image, mask, counts):
+        self.image = image
+        self.mask = mask
+        self.counts = counts
+        self._overlay = None
+
+    @property
+    def count(self):
+        return self.counts.count
+
+    def overlay(self):
+        """BGR overlay with mango pixels tinted green (same rendering as image_segmentation.py)."""
+        if self._overlay is None:
+            with stage("overlay_render"):
+                mask_rgb = np.zeros_like(self.image)
+                mask_rgb[self.mask == 1] = [0, 255, 0]  # Green for mango regions
+                self._overlay = cv2.addWeighted(self.image, 0.7, mask_rgb, 0.3, 0)
+        return self._overlay
+
+    def encode_overlay(self, ext=".png"):
+        """Overlay encoded in memory (e.g. ".png", ".jpg"); returns bytes."""
+        overlay = self.overlay()
+        with stage("overlay_encode"):
+            ok, buffer = cv2.imencode(ext, overlay)
+        if not ok:
+            raise ValueError(f"Could not encode overlay as {ext}")
+        return buffer.tobytes()
+
+def segment_and_count(img, engine=None, tiled=False, threshold=0.5):
+    """Segment a BGR uint8 image and count mangoes on the mask; returns a SegmentationResult."""
+    engine = engine or get_engine()
+    annotate(image_shape=list(img.shape[:2]), tiled=tiled)
+    if tiled:
+        # Full resolution in overlapping tiles
+        image = img
+        mask = engine.predict_mask_tiled(img, threshold)
+    else:
+        image = engine.resize(img)
+        mask = engine.predict_mask(image, threshold)
+    counts = count_mask(mask)
+    annotate(count=counts.count)
+    return SegmentationResult(image, mask, counts)
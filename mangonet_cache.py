@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Preprocessed MangoNet store.
+# Resized uint8 images and bit-packed binary masks are written to .npy shards that are
+# opened with mmap_mode='r', plus an index keyed by the SHA-256 of the source image and
+# annotation. There is one store per target resolution. Only new or changed pairs are
+# decoded again; unchanged files are recognised by size and mtime without re-hashing.
+# Each entry lists every source pair with that content, and is dropped once none is left.
+#
+# Usage: python mangonet_cache.py   (builds/refreshes the store for the train and test splits)
+
+CACHE_DIR = os.path.join(".cache", "mangonet")
+INDEX_FORMAT_VERSION = 2
+
+# Pairs per shard; also bounds how many decoded images are held in memory while building
+SHARD_ROWS = 512
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def preprocess_pair(img_path, ann_path, size):
+    """Resized BGR uint8 image (H, W, 3) and packed mask (H, ceil(W/8)): green channel > 128 is mango."""
+    height, width = size
+    img = cv2.imread(img_path)
+    if img is None:
+        raise ValueError(f"Could not load image from {img_path}")
+    img = cv2.resize(img, (width, height))
+
+    ann = cv2.imread(ann_path)
+    if ann is None:
+        raise ValueError(f"Could not load annotation from {ann_path}")
+    ann = cv2.resize(ann, (width, height))
+    mask = (ann[:, :, 1] > 128).astype(np.uint8)
+    return img, np.packbits(mask, axis=-1)
+
+class PreprocessedStore:
+    def __init__(self, size, cache_dir=CACHE_DIR):
+        self.size = tuple(size)
+        self.dir = os.path.join(cache_dir, f"{size[0]}x{size[1]}")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.index = self._read_index()
+        self._shards = {}
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("format_version") == INDEX_FORMAT_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {"format_version": INDEX_FORMAT_VERSION, "files": {}, "entries": {}, "shards": {}, "next_shard": 0}
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _digest(self, path):
+        # Re-hash only when size or mtime changed since the last run
+        stat = os.stat(path)
+        cached = self.index["files"].get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = file_digest(path)
+        self.index["files"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def key(self, img_path, ann_path):
+        return hashlib.sha256((self._digest(img_path) + self._digest(ann_path)).encode()).hexdigest()[:32]
+
+    def update(self, pairs, workers=8):
+        """Make sure every (image, annotation) pair is in the store; returns their keys in order."""
+        os.makedirs(self.dir, exist_ok=True)
+        keys = [self.key(img_path, ann_path) for img_path, ann_path in pairs]
+        entries = self.index["entries"]
+        current = {tuple(pair): key for key, pair in zip(keys, pairs)}
+        sources = {}
+        for pair, key in current.items():
+            sources.setdefault(key, []).append(list(pair))
+
+        # A source pair whose content changed no longer references its old entry; an entry
+        # stays as long as any pair (from this or another split) still has its content
+        for key, entry in list(entries.items()):
+            refs = [pair for pair in entry[2] if current.get(tuple(pair), key) == key]
+            if refs:
+                entry[2] = refs
+            else:
+                del entries[key]
+        for key, pairs_for_key in sources.items():
+            if key in entries:
+                entries[key][2] += [pair for pair in pairs_for_key if pair not in entries[key][2]]
+
+        missing = {key: pairs_for_key[0] for key, pairs_for_key in sources.items() if key not in entries}
+        if missing:
+            # cv2 decode/resize releases the GIL, so threads decode in parallel
+            items = list(missing.items())
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for start in range(0, len(items), SHARD_ROWS):
+                    chunk = items[start:start + SHARD_ROWS]
+                    results = list(pool.map(lambda item: preprocess_pair(*item[1], self.size), chunk))
+                    shard = self._write_shard([img for img, _ in results], [mask for _, mask in results])
+                    for row, (key, _) in enumerate(chunk):
+                        entries[key] = [shard, row, sources[key]]
+        self._compact_if_needed()
+
+        self._write_index()
+        return keys
+
+    def _write_shard(self, images, masks, name=None):
+        name = name or f"shard_{self.index['next_shard']:05d}"
+        self.index["next_shard"] += 1
+        for suffix, arrays in (("images", images), ("masks", masks)):
+            path = os.path.join(self.dir, f"{name}_{suffix}.npy")
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, np.stack(arrays))
+            os.replace(f"{path}.tmp", path)
+        self.index["shards"][name] = len(images)
+        return name
+
+    def _compact_if_needed(self):
+        # Rewrite live rows into one shard once dead rows outnumber them
+        live = len(self.index["entries"])
+        total = sum(self.index["shards"].values())
+        if total - live <= live:
+            return
+        old_shards = list(self.index["shards"])
+        entries = list(self.index["entries"].items())
+        images = [self._arrays(shard)[0][row] for _, (shard, row, _) in entries]
+        masks = [self._arrays(shard)[1][row] for _, (shard, row, _) in entries]
+        shard = self._write_shard(images, masks) if entries else None
+        for row, (key, entry) in enumerate(entries):
+            self.index["entries"][key] = [shard, row, entry[2]]
+
+        self._shards.clear()
+        for name in old_shards:
+            del self.index["shards"][name]
+            for suffix in ("images", "masks"):
+                os.remove(os.path.join(self.dir, f"{name}_{suffix}.npy"))
+
+    def _arrays(self, shard):
+        arrays = self._shards.get(shard)
+        if arrays is None:
+            arrays = self._shards[shard] = tuple(
+                np.load(os.path.join(self.dir, f"{shard}_{suffix}.npy"), mmap_mode="r") for suffix in ("images", "masks")
+            )
+        return arrays
+
+    def get(self, key):
+        """(image uint8 (H, W, 3), mask uint8 (H, W)) for one key, read from the memory-mapped shard."""
+        shard, row, _ = self.index["entries"][key]
+        images, masks = self._arrays(shard)
+        return images[row], np.unpackbits(masks[row], axis=-1, count=self.size[1])
+
+    def iter_rows(self, keys):
+        for key in keys:
+            yield self.get(key)
+
+    def load(self, keys):
+        """Stacked images (N, H, W, 3) and masks (N, H, W) for keys."""
+        height, width = self.size
+        images = np.empty((len(keys), height, width, 3), dtype=np.uint8)
+        masks = np.empty((len(keys), height, width), dtype=np.uint8)
+        for i, key in enumerate(keys):
+            images[i], masks[i] = self.get(key)
+        return images, masks
+
+def load_cached(pairs, size, cache_dir=CACHE_DIR):
+    """Images and masks for (image, annotation) pairs, preprocessing only what is not cached yet."""
+    store = PreprocessedStore(size, cache_dir)
+    return store.load(store.update(pairs))
+
+if __name__ == "__main__":
+    import time
+    import image_train
+
+    for split, (original, annotated) in {
+        "train": (image_train.train_original_path, image_train.train_annotated_path),
+        "test": (image_train.test_original_path, image_train.test_annotated_path),
+    }.items():
+        start = time.perf_counter()
+        store = PreprocessedStore((image_train.IMG_HEIGHT, image_train.IMG_WIDTH))
+        keys = store.update(image_train.pair_paths(original, annotated))
+        print(f"{split}: {len(keys)} pairs ready in {store.dir} ({time.perf_counter() - start:.2f}s)", file=sys.stderr)
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import mmap
+import hashlib
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+from features import FeaturePipeline, typical_inputs as training_typical_inputs
+from tree_compile import FLAT_MODEL_PATH, HIST_PARITY_ATOL, FlatTreeEnsemble, flatten_gbr, load_flat_model, verify_parity
+
+# Versioned model bundle: one uncompressed joblib file holding the model, scaler,
+# encoders, feature order, flat tree arrays and training metadata, plus a small JSON
+# manifest next to it with the format version, model version and SHA-256 checksum.
+# Being uncompressed, its NumPy arrays can be loaded with mmap_mode='r' so several
+# worker processes share the same pages.
+#
+# save_bundle replaces the manifest before the bundle, and the manifest also records the
+# checksum of the bundle it replaces, so a reader that lands between the two renames gets
+# the previous bundle under its own version instead of a checksum error.
+
+BUNDLE_PATH = os.getenv("MODEL_BUNDLE_PATH", "yield_model_bundle.joblib")
+BUNDLE_FORMAT_VERSION = 1
+
+# Pre-bundle artifacts written by older train_model.py runs
+LEGACY_MODEL_PATHS = [
+    "yield_prediction_model.joblib",
+    "yield.joblib",
+    "farm2value_improved_model.pkl",
+]
+LEGACY_ENCODER_PATHS = {
+    "district": "district_encoder.pkl",
+    "season": "season_encoder.pkl",
+    "variety": "variety_encoder.pkl",
+    "soil_type": "soil_encoder.pkl",
+}
+# Rows used to check a legacy yield_model_flat.npz against its model before serving it
+LEGACY_PARITY_ROWS = 256
+# Training data used for typical inputs when a bundle predates metadata["typical_inputs"]
+TRAINING_CSV = "farm2.csv"
+
+class BundleError(Exception):
+    pass
+
+def manifest_path(path=BUNDLE_PATH):
+    return f"{path}.json"
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_manifest(path=BUNDLE_PATH):
+    with open(manifest_path(path)) as f:
+        return json.load(f)
+
+def _open_file_checksum(f):
+    # Hashed through an mmap of the open file: the pages land in the page cache, where
+    # joblib's own read (or mmap) of the same file finds them, so the bundle is read from disk once
+    if os.fstat(f.fileno()).st_size == 0:
+        return hashlib.sha256().hexdigest()
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return hashlib.sha256(mm).hexdigest()
+
+def _verified_version(f, manifest, path):
+    """Model version of the open bundle file, checked against the manifest checksums."""
+    checksum = _open_file_checksum(f)
+    if checksum == manifest["sha256"]:
+        return manifest["model_version"]
+    previous = manifest.get("previous") or {}
+    if checksum == previous.get("sha256"):
+        return previous["model_version"]
+    raise BundleError(f"Checksum mismatch for {path}; the bundle is corrupt or was replaced without its manifest")
+
+def save_bundle(model, scaler, encoders, metadata=None, flat_arrays=None, path=BUNDLE_PATH):
+    """Write the bundle and its manifest atomically; returns the manifest."""
+    feature_order = list(FeaturePipeline(encoders, scaler).feature_order)
+    created_at = datetime.now(timezone.utc)
+    payload = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "model": model,
+        "scaler": scaler,
+        "encoders": encoders,
+        "feature_order": feature_order,
+        "flat": flat_arrays,
+        "metadata": metadata or {},
+    }
+
+    tmp_path = f"{path}.tmp"
+    joblib.dump(payload, tmp_path, compress=0)
+    checksum = file_checksum(tmp_path)
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "model_version": f"{created_at:%Y%m%dT%H%M%SZ}-{checksum[:8]}",
+        "created_at": created_at.isoformat(),
+        "sha256": checksum,
+        "feature_order": feature_order,
+        "metadata": metadata or {},
+    }
+    try:
+        current = read_manifest(path)
+        manifest["previous"] = {"sha256": current["sha256"], "model_version": current["model_version"]}
+    except (OSError, ValueError, KeyError):
+        pass
+    with open(f"{manifest_path(path)}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    # Manifest first: in between, readers verify the old bundle against manifest["previous"]
+    os.replace(f"{manifest_path(path)}.tmp", manifest_path(path))
+    os.replace(tmp_path, path)
+    return manifest
+
+def load_bundle(path=BUNDLE_PATH, mmap_mode="r", verify=True):
+    """Load a bundle; raises BundleError on a checksum or format mismatch."""
+    manifest = read_manifest(path)
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format {manifest.get('format_version')} in {path}")
+
+    with open(path, "rb") as f:
+        model_version = _verified_version(f, manifest, path) if verify else manifest["model_version"]
+        if mmap_mode is None:
+            payload = joblib.load(f)
+        else:
+            # joblib only memory-maps when given a filename; make sure it opened the file we hashed
+            payload = joblib.load(path, mmap_mode=mmap_mode)
+            if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                raise BundleError(f"{path} was replaced while it was being loaded; retry")
+    payload["model_version"] = model_version
+    return payload
+
+def _load_legacy_flat(model):
+    """The legacy flat export, or None when it is missing or does not reproduce the model."""
+    if not os.path.exists(FLAT_MODEL_PATH):
+        return None
+    try:
+        flat = load_flat_model()
+        X = np.random.default_rng(0).normal(size=(LEGACY_PARITY_ROWS, model.n_features_in_))
+        verify_parity(model, flat, X, atol=HIST_PARITY_ATOL if flat.float64_inputs else 0.0)
+    except Exception as e:
+        print(f"Ignoring {FLAT_MODEL_PATH}, it does not match the legacy model: {e}", file=sys.stderr)
+        return None
+    return flat
+
+def _load_legacy():
+    model = None
+    for candidate in LEGACY_MODEL_PATHS:
+        try:
+            model = joblib.load(candidate)
+            break
+        except Exception:
+            continue
+    if model is None:
+        raise FileNotFoundError("No trained model file found. Please run train_model.py to generate a model bundle.")
+
+    scaler = joblib.load("scaler.pkl")
+    encoders = {col: joblib.load(p) for col, p in LEGACY_ENCODER_PATHS.items()}
+    flat = _load_legacy_flat(model)
+    return {
+        "model": model,
+        "scaler": scaler,
+        "encoders": encoders,
+        "feature_order": None,
+        "flat": flat,
+        "metadata": {},
+        "model_version": "legacy",
+    }
+
+def load_artifacts(path=BUNDLE_PATH, mmap_mode="r", verify=True):
+    """
+    Everything the serving code needs: model, scorer (flat evaluator when available),
+    compiled feature pipeline, metadata and model version.
+    Prefers the bundle, falls back to the legacy per-object pickles.
+    """
+    if os.path.exists(path) and os.path.exists(manifest_path(path)):
+        artifacts = load_bundle(path, mmap_mode=mmap_mode, verify=verify)
+        if artifacts["flat"] is not None:
+            artifacts["flat"] = FlatTreeEnsemble(artifacts["flat"])
+    else:
+        artifacts = _load_legacy()
+
+    artifacts["pipeline"] = FeaturePipeline(artifacts["encoders"], artifacts["scaler"], artifacts["feature_order"])
+    artifacts["scorer"] = artifacts["flat"] if artifacts["flat"] is not None else artifacts["model"]
+    return artifacts
+
+def typical_inputs(artifacts, csv_path=TRAINING_CSV):
+    """
+    Typical raw inputs of the model's training data (see features.typical_inputs).
+    Bundles without them fall back to csv_path; the row is cached on the artifacts dict.
+    """
+    typical = artifacts.get("typical_inputs")
+    if typical is None:
+        typical = artifacts["metadata"].get("typical_inputs")
+        if not typical:
+            import pandas as pd
+            typical = training_typical_inputs(pd.read_csv(csv_path))
+        artifacts["typical_inputs"] = typical
+    return dict(typical)
+
+if __name__ == "__main__":
+    # Convert the legacy pickles into a bundle: python model_bundle.py
+    legacy = _load_legacy()
+    flat_arrays = None
+    if hasattr(legacy["model"], "estimators_"):
+        flat_arrays = flatten_gbr(legacy["model"])
+    manifest = save_bundle(legacy["model"], legacy["scaler"], legacy["encoders"],
+                           metadata={"converted_from": "legacy pickles"}, flat_arrays=flat_arrays)
+    print(f"Wrote {BUNDLE_PATH} (model version {manifest['model_version']})", file=sys.stderr)
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+from model_bundle import BUNDLE_PATH, load_artifacts, manifest_path, read_manifest
+from tree_compile import HIST_PARITY_ATOL, verify_parity
+
+# Hot-swappable model for long-lived serving processes.
+# A new bundle is loaded next to the active one, validated on a canary batch and only
+# then swapped in with a single reference assignment. Requests take one snapshot via
+# get() and use it throughout, so in-flight requests finish on the model they started with.
+
+# Used when the bundle carries no canary rows of its own
+CANARY_CSV = "farm2.csv"
+CANARY_ROWS = 32
+
+class ModelRegistry:
+    def __init__(self, path=BUNDLE_PATH):
+        self.path = path
+        self._reload_lock = threading.Lock()
+        self._active = load_artifacts(path)
+        self._watched_mtime = self._bundle_mtimes()
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_error = None
+        self.loaded_at = time.time()
+
+    def get(self):
+        """Current artifacts snapshot (model, scorer, pipeline, model_version, ...)."""
+        return self._active
+
+    @property
+    def version(self):
+        return self._active["model_version"]
+
+    def _bundle_mtimes(self):
+        # Both files: save_bundle renames the manifest first, the bundle second
+        try:
+            return os.path.getmtime(manifest_path(self.path)), os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def canary_rows(self, artifacts):
+        rows = artifacts["metadata"].get("canary_rows")
+        if rows:
+            return rows
+        import pandas as pd
+        return pd.read_csv(CANARY_CSV, nrows=CANARY_ROWS).to_dict("records")
+
+    def validate(self, artifacts):
+        """Score a canary batch with the candidate; raises ValueError if it is unusable."""
+        X, errors = artifacts["pipeline"].transform_batch(self.canary_rows(artifacts))
+        valid = np.array([e is None for e in errors], dtype=bool)
+        if not valid.any():
+            raise ValueError(f"Candidate model rejected every canary row: {errors[0]}")
+
+        predictions = artifacts["scorer"].predict(X[valid])
+        if not np.all(np.isfinite(predictions)):
+            raise ValueError("Candidate model produced non-finite predictions on the canary batch")
+        flat = artifacts["scorer"]
+        if flat is not artifacts["model"]:
+            # Same tolerance as training/load time: exact for GBR, HIST_PARITY_ATOL for hist trees
+            try:
+                verify_parity(artifacts["model"], flat, X[valid], atol=HIST_PARITY_ATOL if flat.float64_inputs else 0.0)
+            except ValueError as e:
+                raise ValueError(f"Candidate flat trees disagree with the model on the canary batch: {e}") from e
+
+    def reload(self, force=False):
+        """
+        Load, validate and activate the bundle on disk.
+        Returns (swapped, message); a failed candidate leaves the active model untouched.
+        """
+        with self._reload_lock:
+            try:
+                manifest = read_manifest(self.path)
+                if not force and manifest["model_version"] == self.version:
+                    return False, f"Model {self.version} is already active"
+
+                candidate = load_artifacts(self.path)
+                if not force and candidate["model_version"] == self.version:
+                    # The new manifest landed before its bundle; the bundle rename triggers the next reload
+                    return False, f"Model {self.version} is still on disk"
+                self.validate(candidate)
+            except Exception as e:
+                self.reload_failures += 1
+                self.last_error = str(e)
+                return False, f"Reload failed, keeping {self.version}: {e}"
+
+            previous = self.version
+            self._active = candidate
+            self.reloads += 1
+            self.last_error = None
+            self.loaded_at = time.time()
+            return True, f"Swapped model {previous} -> {candidate['model_version']}"
+
+    def watch(self, interval):
+        """Poll the bundle and its manifest every `interval` seconds and reload when either changes."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                mtime = self._bundle_mtimes()
+                if mtime is None or mtime == self._watched_mtime:
+                    continue
+                self._watched_mtime = mtime
+                swapped, message = self.reload()
+                print(message, file=sys.stderr)
+
+        thread = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def metrics_lines(self):
+        """Prometheus text-format lines describing the active model and reload history."""
+        return [
+            "# TYPE farm2value_model_info gauge",
+            f'farm2value_model_info{{version="{self.version}"}} 1',
+            "# TYPE farm2value_model_loaded_timestamp_seconds gauge",
+            f"farm2value_model_loaded_timestamp_seconds {self.loaded_at:.0f}",
+            "# TYPE farm2value_model_reloads_total counter",
+            f"farm2value_model_reloads_total {self.reloads}",
+            "# TYPE farm2value_model_reload_failures_total counter",
+            f"farm2value_model_reload_failures_total {self.reload_failures}",
+        ]
@@ -0,0 +1,221 @@
+import os
+import threading
+import cv2
+import numpy as np
+from tracing import stage
+
+# Shared U-Net segmentation engine.
+# The model is loaded once per process, warmed with a dummy batch and reused,
+# instead of load_model() on every call. Three backends run the same U-Net:
+#   keras  - mango_segmentation_model.h5 through a compiled tf.function
+#   tflite - mango_segmentation_model.tflite (see export_segmentation.py), optionally quantized
+#   onnx   - mango_segmentation_model.onnx through ONNX Runtime
+# SEGMENTATION_BACKEND picks the default for every entry point.
+
+MODEL_PATH = "mango_segmentation_model.h5"
+MODEL_PATHS = {
+    "keras": MODEL_PATH,
+    "tflite": "mango_segmentation_model.tflite",
+    "onnx": "mango_segmentation_model.onnx",
+}
+BACKENDS = list(MODEL_PATHS)
+DEFAULT_BACKEND = os.getenv("SEGMENTATION_BACKEND", "keras")
+
+# Tiled mode: overlap between neighbouring tiles (pixels) and tiles per model call
+TILE_OVERLAP = 32
+TILE_BATCH_SIZE = 16
+
+class SegmentationEngine:
+    backend = "keras"
+
+    def __init__(self, model_path=MODEL_PATH, warmup=True):
+        self.model_path = model_path
+        height, width, channels = self._load(model_path)
+        self.input_size = (height, width)
+        self.channels = channels
+        if warmup:
+            with stage("warmup"):
+                self.predict_probs(np.zeros((1, height, width, channels), dtype=np.uint8))
+
+    def _load(self, model_path):
+        """Load the model; returns its input (height, width, channels)."""
+        with stage("tf_import"):
+            import tensorflow as tf
+
+        with stage("load_model"):
+            self.model = tf.keras.models.load_model(model_path, compile=False)
+        _, height, width, channels = self.model.input_shape
+
+        # uint8 -> float in the graph; a None batch dimension avoids retracing per batch size
+        @tf.function(input_signature=[tf.TensorSpec([None, height, width, channels], tf.uint8)])
+        def predict_fn(images):
+            x = tf.cast(images, tf.float32) / 255.0
+            return self.model(x, training=False)
+
+        self._predict_fn = predict_fn
+        return height, width, channels
+
+    def _run(self, images):
+        """Raw model output (N, H, W, 1) for a contiguous uint8 batch."""
+        return self._predict_fn(images).numpy()
+
+    def resize(self, img):
+        """Resize a BGR uint8 image to the model input size."""
+        height, width = self.input_size
+        with stage("resize"):
+            return cv2.resize(img, (width, height))
+
+    def predict_probs(self, images):
+        """Mango probability maps (N, H, W) float32 for a uint8 batch (N, H, W, C) at input size."""
+        images = np.ascontiguousarray(images, dtype=np.uint8)
+        if images.ndim == 3:
+            images = images[np.newaxis]
+        with stage("predict"):
+            return self._run(images)[..., 0]
+
+    def predict_mask(self, img_resized, threshold=0.5):
+        """Binary uint8 mask (H, W) for one image already at input size."""
+        return (self.predict_probs(img_resized)[0] > threshold).astype(np.uint8)
+
+    def _tile_batches(self, img, overlap, batch_size):
+        """Yield (positions, tiles) batches of input-size tiles covering img, batch_size at a time."""
+        tile_h, tile_w = self.input_size
+        ys = tile_starts(img.shape[0], tile_h, overlap)
+        xs = tile_starts(img.shape[1], tile_w, overlap)
+        positions = [(y, x) for y in ys for x in xs]
+        for i in range(0, len(positions), batch_size):
+            batch = positions[i:i + batch_size]
+            yield batch, np.stack([img[y:y + tile_h, x:x + tile_w] for y, x in batch])
+
+    def predict_probs_tiled(self, img, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE):
+        """
+        Full-resolution probability map (H, W) float32 for an image of any size.
+        Overlapping input-size tiles are streamed through the model batch_size at a time
+        and blended with a window that favours tile centres, so only the two accumulators
+        and one batch of tiles are ever in memory.
+        """
+        tile_h, tile_w = self.input_size
+        height, width = img.shape[:2]
+        # Images smaller than one tile are padded up to it and cropped afterwards
+        pad_h, pad_w = max(0, tile_h - height), max(0, tile_w - width)
+        if pad_h or pad_w:
+            img = cv2.copyMakeBorder(img, 0, pad_h, 0, pad_w, cv2.BORDER_REFLECT)
+
+        window = blend_window(tile_h, tile_w)
+        prob_sum = np.zeros(img.shape[:2], dtype=np.float32)
+        weight_sum = np.zeros(img.shape[:2], dtype=np.float32)
+        for positions, tiles in self._tile_batches(img, overlap, batch_size):
+            for (y, x), probs in zip(positions, self.predict_probs(tiles)):
+                prob_sum[y:y + tile_h, x:x + tile_w] += probs * window
+                weight_sum[y:y + tile_h, x:x + tile_w] += window
+
+        prob_sum /= weight_sum
+        return prob_sum[:height, :width]
+
+    def predict_mask_tiled(self, img, threshold=0.5, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE):
+        """Binary uint8 mask (H, W) at the image's own resolution, see predict_probs_tiled."""
+        return (self.predict_probs_tiled(img, overlap, batch_size) > threshold).astype(np.uint8)
+
+def tile_starts(length, tile, overlap):
+    """Tile offsets along one axis; the last tile is aligned to the far edge."""
+    if length <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+def blend_window(height, width):
+    """Separable sine window, strictly positive so every pixel gets some weight."""
+    wy = np.sin(np.pi * (np.arange(height) + 0.5) / height)
+    wx = np.sin(np.pi * (np.arange(width) + 0.5) / width)
+    return np.outer(wy, wx).astype(np.float32)
+
+class TFLiteSegmentationEngine(SegmentationEngine):
+    backend = "tflite"
+
+    def _load(self, model_path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        with stage("load_model"):
+            self.interpreter = Interpreter(model_path=model_path, num_threads=os.cpu_count())
+            self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = 1
+        # The interpreter holds per-invocation state, so calls are serialised
+        self._lock = threading.Lock()
+        _, height, width, channels = self._input["shape"]
+        return int(height), int(width), int(channels)
+
+    def _run(self, images):
+        x = images.astype(np.float32) / 255.0
+        if self._input["dtype"] != np.float32:
+            # Integer-only models take quantized inputs
+            scale, zero_point = self._input["quantization"]
+            x = np.round(x / scale + zero_point).astype(self._input["dtype"])
+
+        with self._lock:
+            if len(x) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], x.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(x)
+            self.interpreter.set_tensor(self._input["index"], x)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output["index"]).copy()
+
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+class OnnxSegmentationEngine(SegmentationEngine):
+    backend = "onnx"
+
+    def _load(self, model_path):
+        import onnxruntime as ort
+
+        with stage("load_model"):
+            self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        _, height, width, channels = model_input.shape
+        return int(height), int(width), int(channels)
+
+    def _run(self, images):
+        x = images.astype(np.float32) / 255.0
+        return self.session.run(None, {self._input_name: x})[0]
+
+ENGINES = {
+    "keras": SegmentationEngine,
+    "tflite": TFLiteSegmentationEngine,
+    "onnx": OnnxSegmentationEngine,
+}
+
+def create_engine(backend=None, model_path=None, warmup=True):
+    """A new engine for backend (default SEGMENTATION_BACKEND) and its model file."""
+    backend = backend or DEFAULT_BACKEND
+    if backend not in ENGINES:
+        raise ValueError(f"Unknown segmentation backend {backend!r}, expected one of {BACKENDS}")
+    return ENGINES[backend](model_path or MODEL_PATHS[backend], warmup=warmup)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def model_available(model_path=None, backend=None):
+    return os.path.exists(model_path or MODEL_PATHS[backend or DEFAULT_BACKEND])
+
+def get_engine(model_path=None, backend=None):
+    """Process-wide engine for (backend, model_path), created (and warmed) on first use."""
+    backend = backend or DEFAULT_BACKEND
+    key = (backend, model_path or MODEL_PATHS.get(backend))
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = create_engine(backend, model_path)
+    return engine
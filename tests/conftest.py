@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the flat root-level modules (features.py, tree_compile.py, ...) directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
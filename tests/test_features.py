@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from conftest import ROOT
+from features import CATEGORICAL_FEATURES, TARGET, FeaturePipeline, add_engineered_features, typical_inputs
+
+# FeaturePipeline must reproduce the LabelEncoder + StandardScaler path it replaced.
+
+@pytest.fixture(scope="module")
+def reference():
+    raw = pd.read_csv(os.path.join(ROOT, "farm2.csv")).drop(columns=[TARGET])
+    encoded = raw.copy()
+    encoders = {}
+    for col in CATEGORICAL_FEATURES:
+        encoders[col] = LabelEncoder()
+        encoded[col] = encoders[col].fit_transform(encoded[col])
+    add_engineered_features(encoded)
+    scaler = StandardScaler()
+    expected = scaler.fit_transform(encoded)
+    return raw, encoders, scaler, expected
+
+@pytest.fixture(scope="module")
+def pipeline(reference):
+    _, encoders, scaler, _ = reference
+    return FeaturePipeline(encoders, scaler)
+
+def test_transform_batch_matches_sklearn(reference, pipeline):
+    raw, _, _, expected = reference
+    X, errors = pipeline.transform_batch(raw.to_dict("records"))
+    assert errors == [None] * len(raw)
+    np.testing.assert_allclose(X, expected, rtol=0, atol=1e-12)
+
+def test_transform_row_matches_sklearn(reference, pipeline):
+    raw, _, _, expected = reference
+    for i, row in enumerate(raw.head(200).to_dict("records")):
+        np.testing.assert_allclose(pipeline.transform_row(row)[0], expected[i], rtol=0, atol=1e-12)
+
+def test_transform_frame_matches_sklearn(reference, pipeline):
+    raw, _, _, expected = reference
+    np.testing.assert_allclose(pipeline.transform_frame(raw), expected, rtol=0, atol=1e-12)
+
+def test_unseen_label_rejected_like_label_encoder(reference, pipeline):
+    raw, encoders, _, _ = reference
+    row = raw.iloc[0].to_dict()
+    row["district"] = "Atlantis"
+    with pytest.raises(ValueError):
+        encoders["district"].transform([row["district"]])
+    with pytest.raises(ValueError, match="district"):
+        pipeline.transform_row(row)
+
+def test_unseen_label_flags_only_that_batch_row(reference, pipeline):
+    raw, _, _, expected = reference
+    rows = raw.head(5).to_dict("records")
+    rows[2] = dict(rows[2], variety="Not A Mango")
+    rows[3] = dict(rows[3], rainfall_mm="lots")
+    X, errors = pipeline.transform_batch(rows)
+    assert "variety" in errors[2]
+    assert "rainfall_mm" in errors[3]
+    assert [errors[i] for i in (0, 1, 4)] == [None, None, None]
+    assert np.isnan(X[[2, 3]]).all()
+    np.testing.assert_allclose(X[[0, 1, 4]], expected[[0, 1, 4]], rtol=0, atol=1e-12)
+
+def test_typical_inputs_cover_every_pipeline_input(reference, pipeline):
+    raw, _, _, _ = reference
+    row = typical_inputs(raw)
+    assert set(row) == set(CATEGORICAL_FEATURES) | set(pipeline.numeric_features)
+    assert row["year"] == raw["year"].median()
+    assert np.isfinite(pipeline.transform_row(row)).all()
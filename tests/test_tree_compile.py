@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from conftest import ROOT
+from features import CATEGORICAL_FEATURES, TARGET, add_engineered_features
+from tree_compile import FlatTreeEnsemble, flatten_model, load_flat_model, save_flat_model
+
+# FlatTreeEnsemble.predict must reproduce model.predict for both training backends.
+
+@pytest.fixture(scope="module")
+def training_data():
+    df = pd.read_csv(os.path.join(ROOT, "farm2.csv"))
+    for col in CATEGORICAL_FEATURES:
+        df[col] = LabelEncoder().fit_transform(df[col])
+    add_engineered_features(df)
+    X = df.drop(columns=[TARGET])
+    return X, df[TARGET].to_numpy()
+
+def test_gbr_parity(training_data):
+    X, y = training_data
+    model = GradientBoostingRegressor(n_estimators=60, max_depth=4, random_state=0).fit(X.to_numpy(), y)
+    flat = FlatTreeEnsemble(flatten_model(model))
+    np.testing.assert_array_equal(flat.predict(X.to_numpy()), model.predict(X.to_numpy()))
+
+def test_gbr_parity_single_row(training_data):
+    X, y = training_data
+    model = GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X.to_numpy(), y)
+    flat = FlatTreeEnsemble(flatten_model(model))
+    row = X.to_numpy()[:1]
+    np.testing.assert_array_equal(flat.predict(row), model.predict(row))
+
+def test_hist_parity_with_categorical_splits(training_data):
+    X, y = training_data
+    categorical = [name in CATEGORICAL_FEATURES for name in X.columns]
+    model = HistGradientBoostingRegressor(max_iter=60, categorical_features=categorical,
+                                          random_state=0).fit(X.to_numpy(), y)
+    flat = FlatTreeEnsemble(flatten_model(model))
+    assert flat.has_categorical
+    np.testing.assert_allclose(flat.predict(X.to_numpy()), model.predict(X.to_numpy()), rtol=0, atol=1e-9)
+
+def test_hist_parity_missing_and_unknown_categories(training_data):
+    X, y = training_data
+    categorical = [name in CATEGORICAL_FEATURES for name in X.columns]
+    model = HistGradientBoostingRegressor(max_iter=40, categorical_features=categorical,
+                                          random_state=0).fit(X.to_numpy(), y)
+    flat = FlatTreeEnsemble(flatten_model(model))
+
+    X_odd = X.to_numpy()[:50].copy()
+    district = list(X.columns).index("district")
+    X_odd[:10, district] = 200  # category never seen in training
+    X_odd[10:20, district] = -1  # negative codes are treated as missing
+    X_odd[20:30, list(X.columns).index("rainfall_mm")] = np.nan
+    np.testing.assert_allclose(flat.predict(X_odd), model.predict(X_odd), rtol=0, atol=1e-9)
+
+def test_saved_arrays_round_trip(training_data, tmp_path):
+    X, y = training_data
+    categorical = [name in CATEGORICAL_FEATURES for name in X.columns]
+    model = HistGradientBoostingRegressor(max_iter=20, categorical_features=categorical,
+                                          random_state=0).fit(X.to_numpy(), y)
+    path = str(tmp_path / "flat.npz")
+    save_flat_model(flatten_model(model), path)
+    np.testing.assert_allclose(load_flat_model(path).predict(X.to_numpy()), model.predict(X.to_numpy()),
+                               rtol=0, atol=1e-9)
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from conftest import ROOT
+from features import CATEGORICAL_FEATURES, TARGET, FeaturePipeline, add_engineered_features, typical_inputs
+from yield_sweep import Sweep
+
+# A sweep must score every grid point exactly like a single /predict row with the same inputs.
+
+@pytest.fixture(scope="module")
+def trained():
+    raw = pd.read_csv(os.path.join(ROOT, "farm2.csv"))
+    encoded = raw.copy()
+    encoders = {}
+    for col in CATEGORICAL_FEATURES:
+        encoders[col] = LabelEncoder()
+        encoded[col] = encoders[col].fit_transform(encoded[col])
+    add_engineered_features(encoded)
+    X = encoded.drop(columns=[TARGET])
+    scaler = StandardScaler()
+    model = GradientBoostingRegressor(n_estimators=30, random_state=0).fit(scaler.fit_transform(X), raw[TARGET])
+    pipeline = FeaturePipeline(encoders, scaler)
+    return pipeline, model, typical_inputs(raw.drop(columns=[TARGET]))
+
+def dashboard_spec(pipeline):
+    # What app.py's surface sends: categoricals, a rainfall x temperature grid and one humidity
+    spec = {col: sorted(pipeline.lookups[col])[0] for col in CATEGORICAL_FEATURES}
+    spec["rainfall_mm"] = {"start": 200, "stop": 1500, "steps": 12}
+    spec["temperature_C"] = {"start": 15, "stop": 40, "steps": 9}
+    spec["humidity_percent"] = 70
+    return spec
+
+def expected_yield(pipeline, model, row):
+    return model.predict(pipeline.transform_row(row))[0]
+
+def test_dashboard_surface_end_to_end(trained):
+    pipeline, model, defaults = trained
+    spec = dashboard_spec(pipeline)
+    sweep = Sweep(pipeline, spec, defaults)
+    assert set(sweep.fixed) == {"year", "area_hectare", "production_tonnes"}
+
+    z = sweep.surface(sweep.run(model), "rainfall_mm", "temperature_C")
+    rainfall, temperature = sweep.axes["rainfall_mm"], sweep.axes["temperature_C"]
+    assert z.shape == (len(temperature), len(rainfall))
+    base = {**defaults, **{col: spec[col] for col in CATEGORICAL_FEATURES}, "humidity_percent": 70}
+    for j, i in [(0, 0), (3, 7), (8, 11)]:
+        row = dict(base, rainfall_mm=rainfall[i], temperature_C=temperature[j])
+        assert z[j, i] == pytest.approx(expected_yield(pipeline, model, row), rel=1e-6)
+
+def test_surface_picks_axes_by_name(trained):
+    pipeline, model, defaults = trained
+    spec = dashboard_spec(pipeline)
+    spec["humidity_percent"] = [40, 60, 80, 95]
+    spec["temperature_C"] = 30
+    sweep = Sweep(pipeline, spec, defaults)
+
+    z = sweep.surface(sweep.run(model), "humidity_percent", "rainfall_mm")
+    assert z.shape == (12, 4)
+    base = {**defaults, **{col: spec[col] for col in CATEGORICAL_FEATURES}, "temperature_C": 30}
+    row = dict(base, rainfall_mm=sweep.axes["rainfall_mm"][5], humidity_percent=80)
+    assert z[5, 2] == pytest.approx(expected_yield(pipeline, model, row), rel=1e-6)
+
+    with pytest.raises(ValueError, match="single value"):
+        sweep.surface(sweep.run(model), "rainfall_mm", "temperature_C")
+
+def test_sweep_values_override_defaults(trained):
+    pipeline, _, defaults = trained
+    spec = dict(dashboard_spec(pipeline), year=[2015, 2016])
+    sweep = Sweep(pipeline, spec, defaults)
+    assert "year" in sweep.axes and "year" not in sweep.fixed
+
+def test_missing_numeric_without_default_is_rejected(trained):
+    pipeline, _, _ = trained
+    with pytest.raises(ValueError, match="year"):
+        Sweep(pipeline, dashboard_spec(pipeline))
@@ -0,0 +1,183 @@
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Lightweight per-stage latency tracing for the image and tabular prediction paths.
+#
+#   with trace("image_yield"):          # one request / CLI run
+#       with stage("imread"):
+#           ...
+#
+# Every stage duration is observed into a Prometheus-style histogram (served on /metrics by
+# api.py and inference_server.py). A finished trace is emitted as one JSON line when
+# TRACE_LOG is set ("-" for stderr, otherwise a file path to append to).
+# TRACE_PROFILE=1 adds the top cProfile entries to each trace and TRACE_MEMORY=1 the
+# tracemalloc peak. Both hooks are process-wide, so they are single-request diagnostics:
+# only one trace at a time gets them, and concurrent traces (threaded Flask) run without
+# and are marked "diagnostics": "skipped".
+
+TRACE_LOG = os.getenv("TRACE_LOG")
+TRACE_PROFILE = os.getenv("TRACE_PROFILE", "").lower() in ("1", "true", "yes")
+TRACE_MEMORY = os.getenv("TRACE_MEMORY", "").lower() in ("1", "true", "yes")
+PROFILE_TOP = 15
+
+# Seconds; covers sub-millisecond transforms up to cold model loads
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by (pipeline, stage), rendered in Prometheus text format."""
+
+    def __init__(self, name, buckets=HISTOGRAM_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, pipeline, stage_name, seconds):
+        with self._lock:
+            series = self._series.get((pipeline, stage_name))
+            if series is None:
+                series = self._series[(pipeline, stage_name)] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+
+    def metrics_lines(self):
+        lines = [f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for (pipeline, stage_name), series in sorted(self._series.items()):
+                labels = f'pipeline="{pipeline}",stage="{stage_name}"'
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return lines
+
+STAGE_SECONDS = Histogram("farm2value_stage_seconds")
+
+# Held by the one trace running cProfile/tracemalloc
+_diagnostics_lock = threading.Lock()
+
+_local = threading.local()
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+class Trace:
+    def __init__(self, pipeline, profile=None, memory=None, log=None):
+        self.pipeline = pipeline
+        self.profile = TRACE_PROFILE if profile is None else profile
+        self.memory = TRACE_MEMORY if memory is None else memory
+        self.log = TRACE_LOG if log is None else log
+        self.stages = []
+        self.attributes = {}
+        self.total_ms = None
+        self.peak_memory_bytes = None
+        self.profile_stats = None
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._diagnostics = False
+
+    def __enter__(self):
+        self._parent = current_trace()
+        _local.trace = self
+        if self.profile or self.memory:
+            self._diagnostics = _diagnostics_lock.acquire(blocking=False)
+            if not self._diagnostics:
+                self.attributes["diagnostics"] = "skipped"
+        if self.memory and self._diagnostics:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        if self.profile and self._diagnostics:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self.total_ms = elapsed * 1000
+        if self._profiler is not None:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            self.profile_stats = out.getvalue()
+        if self.memory and self._diagnostics:
+            self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        if self._diagnostics:
+            _diagnostics_lock.release()
+            self._diagnostics = False
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+
+        _local.trace = self._parent
+        STAGE_SECONDS.observe(self.pipeline, "total", elapsed)
+        if self.log:
+            self.emit()
+        return False
+
+    def record(self, stage_name, seconds):
+        self.stages.append({"stage": stage_name, "ms": round(seconds * 1000, 3)})
+
+    def to_dict(self):
+        data = {
+            "pipeline": self.pipeline,
+            "total_ms": round(self.total_ms, 3) if self.total_ms is not None else None,
+            "stages": self.stages,
+            **self.attributes,
+        }
+        if self.peak_memory_bytes is not None:
+            data["peak_memory_bytes"] = self.peak_memory_bytes
+        if self.profile_stats is not None:
+            data["profile"] = self.profile_stats
+        return data
+
+    def emit(self):
+        line = json.dumps(self.to_dict(), default=str)
+        if self.log == "-":
+            print(line, file=sys.stderr)
+        else:
+            with open(self.log, "a") as f:
+                f.write(line + "\n")
+
+def trace(pipeline, **kwargs):
+    """Start a trace for one request or run; use as a context manager."""
+    return Trace(pipeline, **kwargs)
+
+def record(stage_name, seconds):
+    """Record an already measured duration against the active trace (if any) and the histogram."""
+    active = current_trace()
+    if active is not None:
+        active.record(stage_name, seconds)
+    STAGE_SECONDS.observe(active.pipeline if active is not None else "untraced", stage_name, seconds)
+
+def annotate(**attributes):
+    """Attach attributes (image size, row count, ...) to the active trace."""
+    active = current_trace()
+    if active is not None:
+        active.attributes.update(attributes)
+
+@contextmanager
+def stage(stage_name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage_name, time.perf_counter() - start)
+
+def metrics_lines():
+    return STAGE_SECONDS.metrics_lines()
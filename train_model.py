@@ -1,147 +1,353 @@
 # 🌾 Farm2Value - Improved Mango Yield Model (with Gradient Boosting)
 # -------------------------------------------------------
+import argparse
+import time
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
+from scipy.stats import loguniform, uniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV, cross_val_score
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
-import joblib
+import sklearn
 import matplotlib.pyplot as plt
+from features import FeaturePipeline, add_engineered_features, typical_inputs, CATEGORICAL_FEATURES, TARGET
+from tree_compile import HIST_PARITY_ATOL, FlatTreeEnsemble, flatten_model, verify_parity
+from model_bundle import BUNDLE_PATH, save_bundle
+from weather_fetch import fetch_seasonal_weather_batch
+
+WEATHER_COLUMNS = ['temperature_C', 'humidity_percent', 'rainfall_mm']
+WEATHER_KEYS = ['district', 'season']
+
+SEARCH_MODES = ['grid', 'halving', 'random']
+
+# Model backends:
+#   gbr  - GradientBoostingRegressor on LabelEncoded + standardized features
+#   hist - HistGradientBoostingRegressor with native categorical splits on the
+#          district/season/variety/soil_type codes and no scaling
+BACKENDS = ['gbr', 'hist']
+
+# HistGradientBoostingRegressor bins a native categorical feature into at most max_bins (255)
+# categories; a column with more labels is fed to hist as its ordinal LabelEncoder code instead.
+HIST_MAX_CATEGORIES = 255
+
+# Fast modes stop adding trees once a held-out split stops improving, so the
+# tree count is only an upper bound (and the halving budget) there.
+MAX_ESTIMATORS = 400
+EARLY_STOPPING = {'n_iter_no_change': 10, 'validation_fraction': 0.1, 'tol': 1e-4}
+
+SEARCH_SPACES = {
+    'gbr': {
+        # Tree-count parameter, used as the successive halving resource
+        'resource': 'n_estimators',
+        # Exhaustive grid (81 combinations x 5 folds)
+        'grid': {
+            'n_estimators': [200, 300, 400],
+            'learning_rate': [0.05, 0.08, 0.1],
+            'max_depth': [3, 4, 5],
+            'subsample': [0.8, 0.9, 1.0]
+        },
+        'random': {
+            'learning_rate': loguniform(0.03, 0.15),
+            'max_depth': [3, 4, 5],
+            'subsample': uniform(0.7, 0.3),
+        },
+    },
+    'hist': {
+        'resource': 'max_iter',
+        'grid': {
+            'max_iter': [200, 300, 400],
+            'learning_rate': [0.05, 0.08, 0.1],
+            'max_depth': [3, 4, 5],
+            'l2_regularization': [0.0, 0.1, 1.0]
+        },
+        'random': {
+            'learning_rate': loguniform(0.03, 0.15),
+            'max_depth': [3, 4, 5],
+            'l2_regularization': loguniform(1e-3, 1.0),
+        },
+    },
+}
+
+def load_dataset():
+    # Load dataset (prefer provided verified CSV, fallback to farm2.csv)
+    csv_candidates = [
+        "farm2value_verified_mango_yield.csv",
+        "farm2.csv",
+    ]
+
+    for path in csv_candidates:
+        try:
+            df = pd.read_csv(path)
+            print("✅ Loaded dataset:", path, df.shape)
+            return df
+        except Exception as e:
+            continue
 
-# Load dataset (prefer provided verified CSV, fallback to farm2.csv)
-csv_candidates = [
-    "farm2value_verified_mango_yield.csv",
-    "farm2.csv",
-]
-
-df = None
-for path in csv_candidates:
-    try:
-        df = pd.read_csv(path)
-        print("✅ Loaded dataset:", path, df.shape)
-        break
-    except Exception as e:
-        continue
-
-if df is None:
     raise FileNotFoundError("No dataset found. Place farm2value_verified_mango_yield.csv or farm2.csv in project root.")
 
-# Integrate weather data
-from weather_fetch import get_seasonal_weather
-import time
+def _pair_index(pairs):
+    pairs = list(pairs)
+    return pd.MultiIndex.from_arrays([[p[0] for p in pairs], [p[1] for p in pairs]], names=WEATHER_KEYS)
+
+def apply_weather(df, weather_data, failed_pairs=()):
+    """
+    Overwrite the weather columns of df in place from weather_data {(district, season): {...}}
+    with a single join on (district, season). Failed pairs fall back to their dataset means,
+    computed with one groupby. Rows whose pair has neither keep their original values.
+    """
+    table = pd.DataFrame([weather_data[pair] for pair in weather_data],
+                         index=_pair_index(weather_data), columns=WEATHER_COLUMNS)
 
-print("🌤️ Fetching seasonal weather data for training...")
-
-# Get unique district-season pairs
-unique_pairs = df[['district', 'season']].drop_duplicates()
-weather_data = {}
-
-for _, row in unique_pairs.iterrows():
-    district = row['district']
-    season = row['season']
-    try:
-        weather = get_seasonal_weather(district, season)
-        weather_data[(district, season)] = weather
-        print(f"✅ Fetched weather for {district} - {season}")
-        time.sleep(1)  # Rate limit
-    except Exception as e:
+    failed_pairs = [pair for pair in failed_pairs if pair not in weather_data]
+    if failed_pairs:
+        fallback = df.groupby(WEATHER_KEYS, sort=False)[WEATHER_COLUMNS].mean()
+        table = pd.concat([table, fallback.reindex(_pair_index(failed_pairs))])
+
+    table = table.assign(_matched=True)
+    joined = df[WEATHER_KEYS].join(table, on=WEATHER_KEYS)
+    matched = joined['_matched'].notna().to_numpy()
+    df.loc[matched, WEATHER_COLUMNS] = joined.loc[matched, WEATHER_COLUMNS].to_numpy()
+    return df
+
+def integrate_weather(df):
+    print("🌤️ Fetching seasonal weather data for training...")
+
+    # Get unique district-season pairs, fetched concurrently (rate-limited, cached on disk)
+    unique_pairs = df[WEATHER_KEYS].drop_duplicates()
+    weather_data, weather_errors = fetch_seasonal_weather_batch(
+        list(unique_pairs.itertuples(index=False, name=None))
+    )
+    print(f"✅ Weather ready for {len(weather_data)} district-season pairs")
+
+    for (district, season), e in weather_errors.items():
+        # Uses existing data as fallback
         print(f"❌ Failed to fetch weather for {district} - {season}: {e}")
-        # Use existing data as fallback
-        weather_data[(district, season)] = {
-            'temperature_C': df[(df['district'] == district) & (df['season'] == season)]['temperature_C'].mean(),
-            'humidity_percent': df[(df['district'] == district) & (df['season'] == season)]['humidity_percent'].mean(),
-            'rainfall_mm': df[(df['district'] == district) & (df['season'] == season)]['rainfall_mm'].mean()
-        }
-
-# Update df with fetched weather
-for idx, row in df.iterrows():
-    key = (row['district'], row['season'])
-    if key in weather_data:
-        df.at[idx, 'temperature_C'] = weather_data[key]['temperature_C']
-        df.at[idx, 'humidity_percent'] = weather_data[key]['humidity_percent']
-        df.at[idx, 'rainfall_mm'] = weather_data[key]['rainfall_mm']
-
-print("✅ Dataset updated with weather data.")
-
-# Encode categorical features
-le_district = LabelEncoder()
-le_season = LabelEncoder()
-le_variety = LabelEncoder()
-le_soil = LabelEncoder()
-
-df["district"] = le_district.fit_transform(df["district"])
-df["season"] = le_season.fit_transform(df["season"])
-df["variety"] = le_variety.fit_transform(df["variety"])
-df["soil_type"] = le_soil.fit_transform(df["soil_type"])
-
-# Feature engineering
-df["rain_temp_ratio"] = df["rainfall_mm"] / (df["temperature_C"] + 1)
-df["humidity_temp_index"] = df["humidity_percent"] / (df["temperature_C"] + 1)
-df["temp_rain_interaction"] = df["temperature_C"] * df["rainfall_mm"] / 100
-
-# Features and target
-X = df.drop("yield_quintal_per_acre", axis=1)
-y = df["yield_quintal_per_acre"]
-
-# Scale numeric features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Split
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-# Grid search tuning
-params = {
-    'n_estimators': [200, 300, 400],
-    'learning_rate': [0.05, 0.08, 0.1],
-    'max_depth': [3, 4, 5],
-    'subsample': [0.8, 0.9, 1.0]
-}
 
-grid = GridSearchCV(GradientBoostingRegressor(random_state=42),
-                    param_grid=params,
-                    scoring='r2',
-                    cv=5,
-                    n_jobs=-1,
-                    verbose=1)
-
-grid.fit(X_train, y_train)
-best_model = grid.best_estimator_
-
-print("\n🏆 Best parameters found:", grid.best_params_)
-
-# Evaluate
-y_pred = best_model.predict(X_test)
-
-r2 = r2_score(y_test, y_pred)
-mae = mean_absolute_error(y_test, y_pred)
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-
-cv_r2 = cross_val_score(best_model, X_scaled, y, cv=5, scoring='r2').mean()
-
-print(f"\n📊 Improved Model Performance:")
-print(f"R² Score (Test): {r2:.3f}")
-print(f"MAE: {mae:.3f}")
-print(f"RMSE: {rmse:.3f}")
-print(f"Average Cross-Validated R²: {cv_r2:.3f}")
-
-# Plot actual vs predicted
-plt.figure(figsize=(6,6))
-plt.scatter(y_test, y_pred, color='green', alpha=0.7)
-plt.plot([y.min(), y.max()], [y.min(), y.max()], 'r--')
-plt.xlabel("Actual Yield (quintals/acre)")
-plt.ylabel("Predicted Yield (quintals/acre)")
-plt.title("Actual vs Predicted Mango Yield (Improved Farm2Value Model)")
-plt.grid(True)
-plt.show()
-
-# Save improved model and objects
-joblib.dump(best_model, "yield_prediction_model.joblib")
-joblib.dump(scaler, "scaler.pkl")
-joblib.dump(le_district, "district_encoder.pkl")
-joblib.dump(le_season, "season_encoder.pkl")
-joblib.dump(le_variety, "variety_encoder.pkl")
-joblib.dump(le_soil, "soil_encoder.pkl")
-
-print("\n💾 Improved model and encoders saved successfully!")
+    # Update df with fetched weather
+    apply_weather(df, weather_data, weather_errors.keys())
+    print("✅ Dataset updated with weather data.")
+    return df
+
+def native_categoricals(encoders):
+    """Categorical columns hist can split natively; the rest stay ordinal codes (see HIST_MAX_CATEGORIES)."""
+    native = [col for col in CATEGORICAL_FEATURES if len(encoders[col].classes_) <= HIST_MAX_CATEGORIES]
+    for col in CATEGORICAL_FEATURES:
+        if col not in native:
+            print(f"⚠️ {col} has {len(encoders[col].classes_)} labels (hist limit {HIST_MAX_CATEGORIES}); "
+                  f"using ordinal codes instead of native categorical splits")
+    return native
+
+def make_estimator(backend, feature_names, early_stopping=False, categorical=CATEGORICAL_FEATURES):
+    if backend == 'gbr':
+        return GradientBoostingRegressor(random_state=42, **(EARLY_STOPPING if early_stopping else {}))
+    if backend == 'hist':
+        return HistGradientBoostingRegressor(random_state=42,
+                                             categorical_features=[name in categorical for name in feature_names],
+                                             early_stopping=early_stopping,
+                                             **EARLY_STOPPING)
+    raise ValueError(f"Unknown model backend: {backend}")
+
+def make_scaler(backend):
+    """
+    hist needs no scaling; it still gets an identity StandardScaler so every backend
+    writes the same bundle (its scaler carries the feature order FeaturePipeline relies on).
+    """
+    if backend == 'hist':
+        return StandardScaler(with_mean=False, with_std=False)
+    return StandardScaler()
+
+def build_search(mode, backend='gbr', feature_names=(), n_iter=20, cv=5, categorical=CATEGORICAL_FEATURES):
+    space = SEARCH_SPACES[backend]
+    resource = space['resource']
+    if mode == 'grid':
+        return GridSearchCV(make_estimator(backend, feature_names, categorical=categorical),
+                            param_grid=space['grid'],
+                            scoring='r2',
+                            cv=cv,
+                            n_jobs=-1,
+                            verbose=1)
+
+    early_stopping_model = make_estimator(backend, feature_names, early_stopping=True, categorical=categorical)
+    if mode == 'halving':
+        # Successive halving: every candidate starts with a few trees, only the best third
+        # of each round gets 3x more, up to MAX_ESTIMATORS
+        return HalvingGridSearchCV(early_stopping_model,
+                                   param_grid={k: v for k, v in space['grid'].items() if k != resource},
+                                   resource=resource,
+                                   min_resources=MAX_ESTIMATORS // 9,
+                                   max_resources=MAX_ESTIMATORS,
+                                   factor=3,
+                                   scoring='r2',
+                                   cv=cv,
+                                   n_jobs=-1,
+                                   random_state=42,
+                                   verbose=1)
+    if mode == 'random':
+        # Budgeted random search over continuous ranges
+        return RandomizedSearchCV(early_stopping_model.set_params(**{resource: MAX_ESTIMATORS}),
+                                  param_distributions=space['random'],
+                                  n_iter=n_iter,
+                                  scoring='r2',
+                                  cv=cv,
+                                  n_jobs=-1,
+                                  random_state=42,
+                                  verbose=1)
+    raise ValueError(f"Unknown search mode: {mode}")
+
+def n_trees(model):
+    return getattr(model, 'n_estimators_', None) or model.n_iter_
+
+def run_search(mode, X_train, y_train, X_test, y_test, n_iter=20, backend='gbr', feature_names=(),
+               categorical=CATEGORICAL_FEATURES):
+    """Fit one search mode; returns its best model with wall-clock time and test metrics."""
+    search = build_search(mode, backend, feature_names, n_iter=n_iter, categorical=categorical)
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    elapsed = time.perf_counter() - start
+
+    model = search.best_estimator_
+    y_pred = model.predict(X_test)
+    return {
+        'model': model,
+        'params': search.best_params_,
+        'seconds': elapsed,
+        'r2': r2_score(y_test, y_pred),
+        'mae': mean_absolute_error(y_test, y_pred),
+        'trees': n_trees(model),
+    }
+
+def encode_features(df):
+    """
+    Fit LabelEncoders on the categorical columns and add the engineered features.
+    Returns (X, y, encoders) with X still unscaled.
+    """
+    encoders = {}
+    df = df.copy()
+    for col in CATEGORICAL_FEATURES:
+        encoders[col] = LabelEncoder()
+        df[col] = encoders[col].fit_transform(df[col])
+
+    # Feature engineering (shared with serving, see features.py)
+    df = add_engineered_features(df)
+
+    # Features and target
+    X = df.drop(TARGET, axis=1)
+    y = df[TARGET]
+    return X, y, encoders
+
+def print_comparison(results):
+    print(f"\n⏱️ Search comparison:")
+    print(f"{'mode':<10}{'wall s':>10}{'R²':>8}{'MAE':>8}{'trees':>7}  best params")
+    for mode, result in results.items():
+        print(f"{mode:<10}{result['seconds']:>10.1f}{result['r2']:>8.3f}{result['mae']:>8.3f}"
+              f"{result['trees']:>7}  {result['params']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the Farm2Value mango yield model.")
+    parser.add_argument('--backend', choices=BACKENDS, default='gbr',
+                        help="model backend: GradientBoostingRegressor (default) or "
+                             "HistGradientBoostingRegressor with native categorical support")
+    parser.add_argument('--search', choices=SEARCH_MODES, default='grid',
+                        help="hyperparameter search: exhaustive grid (default), successive halving, "
+                             "or budgeted random search; halving/random use early stopping")
+    parser.add_argument('--n-iter', type=int, default=20,
+                        help="candidates sampled by --search random (default: 20)")
+    parser.add_argument('--compare', action='store_true',
+                        help="run every search mode and print wall-clock time and test metrics side by side; "
+                             "the model from --search is saved")
+    parser.add_argument('--no-plot', action='store_true', help="skip the actual-vs-predicted plot")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = integrate_weather(load_dataset())
+
+    # Keep the raw (unencoded) frame to verify the serving pipeline after fitting
+    raw_df = df.copy()
+
+    # Encode categorical features and add engineered features
+    X, y, encoders = encode_features(df)
+
+    # Scale numeric features (identity for the hist backend)
+    scaler = make_scaler(args.backend)
+    X_scaled = scaler.fit_transform(X)
+
+    # The compiled serving pipeline must reproduce the training features exactly
+    pipeline = FeaturePipeline(encoders, scaler)
+    if not np.allclose(pipeline.transform_frame(raw_df), X_scaled, rtol=0, atol=1e-12, equal_nan=True):
+        raise RuntimeError("Serving feature pipeline does not match training features.")
+
+    # Split
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+    # Hyperparameter search
+    modes = SEARCH_MODES if args.compare else [args.search]
+    categorical = native_categoricals(encoders) if args.backend == 'hist' else CATEGORICAL_FEATURES
+    results = {
+        mode: run_search(mode, X_train, y_train, X_test, y_test, args.n_iter, args.backend, list(X.columns),
+                         categorical)
+        for mode in modes
+    }
+    if args.compare:
+        print_comparison(results)
+
+    best_model = results[args.search]['model']
+
+    print(f"\n🏆 Best parameters found ({args.backend} backend, {args.search} search, {results[args.search]['seconds']:.1f}s):",
+          results[args.search]['params'])
+
+    # Evaluate
+    y_pred = best_model.predict(X_test)
+
+    r2 = r2_score(y_test, y_pred)
+    mae = mean_absolute_error(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+
+    cv_r2 = cross_val_score(best_model, X_scaled, y, cv=5, scoring='r2').mean()
+
+    print(f"\n📊 Improved Model Performance:")
+    print(f"R² Score (Test): {r2:.3f}")
+    print(f"MAE: {mae:.3f}")
+    print(f"RMSE: {rmse:.3f}")
+    print(f"Average Cross-Validated R²: {cv_r2:.3f}")
+
+    # Plot actual vs predicted
+    if not args.no_plot:
+        plt.figure(figsize=(6,6))
+        plt.scatter(y_test, y_pred, color='green', alpha=0.7)
+        plt.plot([y.min(), y.max()], [y.min(), y.max()], 'r--')
+        plt.xlabel("Actual Yield (quintals/acre)")
+        plt.ylabel("Predicted Yield (quintals/acre)")
+        plt.title("Actual vs Predicted Mango Yield (Improved Farm2Value Model)")
+        plt.grid(True)
+        plt.show()
+
+    # Flat array export for low-latency serving (verified against best_model.predict)
+    flat_arrays = flatten_model(best_model)
+    verify_parity(best_model, FlatTreeEnsemble(flat_arrays), X_scaled,
+                  atol=0.0 if args.backend == 'gbr' else HIST_PARITY_ATOL)
+
+    # Save model, scaler, encoders and flat trees as one versioned bundle
+    manifest = save_bundle(best_model, scaler, encoders, flat_arrays=flat_arrays, metadata={
+        'backend': args.backend,
+        'search': args.search,
+        'params': results[args.search]['params'],
+        'rows': len(df),
+        'r2_test': r2,
+        'mae_test': mae,
+        'rmse_test': rmse,
+        'cv_r2': cv_r2,
+        'sklearn_version': sklearn.__version__,
+        # Scored by api.py's hot reload before a new bundle is swapped in
+        'canary_rows': raw_df.drop(columns=[TARGET]).head(32).to_dict('records'),
+        # Defaults for inputs a caller leaves out (simple_predict.py, what-if sweeps)
+        'typical_inputs': typical_inputs(raw_df),
+    })
+    print(f"\n📦 Model bundle written: {BUNDLE_PATH} (version {manifest['model_version']})")
+
+    print("💾 Improved model and encoders saved successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import sys
+import numpy as np
+
+# Flat, array-based evaluator for a trained GradientBoostingRegressor or
+# HistGradientBoostingRegressor. All trees are packed into contiguous arrays
+# (feature, threshold, left, right, value) and scored for every tree at once,
+# one tree level per step, which avoids sklearn's per-call predict overhead.
+# Hist models add per-node missing-value directions and categorical split bitsets.
+
+FLAT_MODEL_PATH = "yield_model_flat.npz"
+# Rows scored per traversal step; bounds the (rows x trees) node-index arrays
+PREDICT_CHUNK_ROWS = 4096
+# Hist leaf sums can differ from sklearn's in the last bits; GBR parity is exact
+HIST_PARITY_ATOL = 1e-9
+
+def flatten_model(model):
+    """Flatten either supported backend."""
+    if hasattr(model, "estimators_"):
+        return flatten_gbr(model)
+    if hasattr(model, "_predictors"):
+        return flatten_hist(model)
+    raise ValueError(f"Cannot flatten {type(model).__name__}")
+
+def flatten_gbr(model):
+    """Pack the trees of a fitted GradientBoostingRegressor into flat NumPy arrays."""
+    if model.estimators_.shape[1] != 1:
+        raise ValueError("Only single-output regression models can be flattened.")
+
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        nodes = np.arange(tree.node_count, dtype=np.int64)
+        is_leaf = tree.children_left < 0
+        # Leaves point at themselves so every tree can be walked for max_depth steps
+        left.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        right.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        # Pre-scale leaf values by the learning rate, as sklearn does when predicting
+        value.append(model.learning_rate * tree.value[:, 0, 0])
+
+    if model.init_ == "zero":
+        baseline = 0.0
+    else:
+        baseline = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+
+    return {
+        "feature": np.ascontiguousarray(np.concatenate(feature), dtype=np.int32),
+        "threshold": np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64),
+        "left": np.ascontiguousarray(np.concatenate(left), dtype=np.int32),
+        "right": np.ascontiguousarray(np.concatenate(right), dtype=np.int32),
+        "value": np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+        "roots": offsets.astype(np.int32),
+        "baseline": np.float64(baseline),
+        "max_depth": np.int32(max(t.max_depth for t in trees)),
+        "n_features": np.int32(model.n_features_in_),
+    }
+
+def flatten_hist(model):
+    """
+    Pack the trees of a fitted HistGradientBoostingRegressor into flat NumPy arrays.
+    Mirrors sklearn's _predict_one_from_raw_data: NaN follows missing_go_to_left, categorical
+    nodes go left when the category is in the node's bitset, right when it is another known
+    category, and unknown or negative categories are treated as missing.
+    """
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("Only single-output regression models can be flattened.")
+
+    predictors = [iteration[0] for iteration in model._predictors]
+    sizes = np.array([p.nodes.shape[0] for p in predictors], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    missing_left, is_categorical, bitset_index, bitsets = [], [], [], []
+    n_bitsets = 0
+    for predictor, offset in zip(predictors, offsets):
+        nodes = predictor.nodes
+        index = np.arange(nodes.shape[0], dtype=np.int64)
+        is_leaf = nodes["is_leaf"].astype(bool)
+        left.append(np.where(is_leaf, index, nodes["left"]) + offset)
+        right.append(np.where(is_leaf, index, nodes["right"]) + offset)
+        feature.append(np.where(is_leaf, 0, nodes["feature_idx"]))
+        threshold.append(nodes["num_threshold"])
+        # Leaf values already include the learning rate
+        value.append(nodes["value"])
+        missing_left.append(nodes["missing_go_to_left"].astype(bool))
+        categorical = nodes["is_categorical"].astype(bool) & ~is_leaf
+        is_categorical.append(categorical)
+        bitset_index.append(np.where(categorical, nodes["bitset_idx"].astype(np.int64) + n_bitsets, 0))
+        raw = np.asarray(predictor.raw_left_cat_bitsets, dtype=np.uint32).reshape(-1, 8)
+        bitsets.append(raw)
+        n_bitsets += raw.shape[0]
+
+    known_bitsets, feature_map = model._bin_mapper.make_known_categories_bitsets()
+    max_depth = max(int(p.nodes["depth"].max()) for p in predictors)
+
+    return {
+        "feature": np.ascontiguousarray(np.concatenate(feature), dtype=np.int32),
+        "threshold": np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64),
+        "left": np.ascontiguousarray(np.concatenate(left), dtype=np.int32),
+        "right": np.ascontiguousarray(np.concatenate(right), dtype=np.int32),
+        "value": np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+        "roots": offsets.astype(np.int32),
+        "baseline": np.float64(np.ravel(model._baseline_prediction)[0]),
+        "max_depth": np.int32(max_depth),
+        "n_features": np.int32(model.n_features_in_),
+        # Hist trees compare float64 inputs
+        "float64_inputs": np.bool_(True),
+        "missing_left": np.ascontiguousarray(np.concatenate(missing_left)),
+        "is_categorical": np.ascontiguousarray(np.concatenate(is_categorical)),
+        "bitset_index": np.ascontiguousarray(np.concatenate(bitset_index), dtype=np.int32),
+        "left_bitsets": np.ascontiguousarray(np.concatenate(bitsets) if n_bitsets else np.zeros((1, 8)), dtype=np.uint32),
+        "known_bitsets": np.ascontiguousarray(np.asarray(known_bitsets).reshape(-1, 8), dtype=np.uint32),
+        "known_feature_map": np.ascontiguousarray(feature_map, dtype=np.int32),
+    }
+
+def _in_bitset(bitsets, rows, codes):
+    return ((bitsets[rows, codes >> 5] >> (codes & 31).astype(np.uint32)) & 1).astype(bool)
+
+class FlatTreeEnsemble:
+    """Scores rows with the arrays produced by flatten_gbr()."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.baseline = float(arrays["baseline"])
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features_in_ = int(arrays["n_features"])
+        # Hist-only arrays; absent for GBR exports
+        self.float64_inputs = bool(arrays["float64_inputs"]) if "float64_inputs" in arrays else False
+        self.missing_left = arrays["missing_left"] if "missing_left" in arrays else None
+        self.is_categorical = arrays["is_categorical"] if "is_categorical" in arrays else None
+        self.has_categorical = self.is_categorical is not None and bool(self.is_categorical.any())
+        if self.has_categorical:
+            self.bitset_index = arrays["bitset_index"]
+            self.left_bitsets = arrays["left_bitsets"]
+            self.known_bitsets = arrays["known_bitsets"]
+            self.known_feature_map = arrays["known_feature_map"]
+
+    def predict(self, X):
+        # GBR trees compare float32 inputs against float64 thresholds, hist trees float64
+        X = np.asarray(X, dtype=np.float64 if self.float64_inputs else np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n = X.shape[0]
+        if n > PREDICT_CHUNK_ROWS:
+            return np.concatenate([
+                self.predict(X[i:i + PREDICT_CHUNK_ROWS]) for i in range(0, n, PREDICT_CHUNK_ROWS)
+            ])
+        rows = np.arange(n)[:, None]
+
+        nodes = np.broadcast_to(self.roots, (n, self.roots.shape[0]))
+        for _ in range(self.max_depth):
+            features = self.feature[nodes]
+            values = X[rows, features]
+            go_left = values <= self.threshold[nodes]
+            if self.missing_left is not None:
+                missing_left = self.missing_left[nodes]
+                if self.has_categorical:
+                    go_left = self._categorical_left(nodes, features, values, go_left, missing_left)
+                go_left = np.where(np.isnan(values), missing_left, go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # Accumulate stages left to right from the baseline (cumsum is sequential),
+        # matching the summation order of sklearn's predict
+        leaf_values = self.value[nodes]
+        stages = np.empty((n, leaf_values.shape[1] + 1), dtype=np.float64)
+        stages[:, 0] = self.baseline
+        stages[:, 1:] = leaf_values
+        return np.cumsum(stages, axis=1)[:, -1]
+
+    def _categorical_left(self, nodes, features, values, go_left, missing_left):
+        categorical = self.is_categorical[nodes]
+        if not categorical.any():
+            return go_left
+        # sklearn casts the raw value to uint8 before the bitset lookup
+        valid = ~np.isnan(values) & (values >= 0)
+        codes = np.where(valid, values, 0).astype(np.int64) & 0xFF
+        in_left = _in_bitset(self.left_bitsets, self.bitset_index[nodes], codes)
+        known = _in_bitset(self.known_bitsets, self.known_feature_map[features], codes)
+        cat_left = np.where(in_left, True, np.where(known, False, missing_left))
+        cat_left = np.where(valid, cat_left, missing_left)
+        return np.where(categorical, cat_left, go_left)
+
+def save_flat_model(arrays, path=FLAT_MODEL_PATH):
+    np.savez(path, **arrays)
+
+def load_flat_model(path=FLAT_MODEL_PATH):
+    with np.load(path) as data:
+        return FlatTreeEnsemble({key: data[key] for key in data.files})
+
+def verify_parity(model, flat, X, atol=0.0):
+    """Raise if the flat evaluator does not reproduce model.predict on X (exactly unless atol is given)."""
+    expected = model.predict(X)
+    actual = flat.predict(X)
+    if not np.allclose(expected, actual, rtol=0, atol=atol):
+        diff = np.max(np.abs(expected - actual))
+        raise ValueError(f"Flat tree evaluator diverges from model.predict (max abs diff {diff:.3e})")
+
+def export_flat_model(model, X_check, path=FLAT_MODEL_PATH):
+    """Flatten, verify against model.predict on X_check, and save."""
+    arrays = flatten_model(model)
+    verify_parity(model, FlatTreeEnsemble(arrays), X_check, atol=HIST_PARITY_ATOL if "float64_inputs" in arrays else 0.0)
+    save_flat_model(arrays, path)
+    return arrays
+
+if __name__ == "__main__":
+    # Export a flat evaluator for a model saved as legacy pickles (bundles already carry one)
+    import pandas as pd
+    from model_bundle import load_artifacts
+
+    artifacts = load_artifacts()
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "farm2.csv"
+    X_check = artifacts["pipeline"].transform_frame(pd.read_csv(csv_path))
+    arrays = export_flat_model(artifacts["model"], X_check)
+    print(f"Exported {len(arrays['roots'])} trees ({len(arrays['value'])} nodes) to {FLAT_MODEL_PATH}; "
+          f"predictions match model.predict on {len(X_check)} rows")
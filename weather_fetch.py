@@ -1,5 +1,10 @@
 import requests
 import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +12,21 @@ load_dotenv()
 # OpenWeatherMap API key
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
 
+# Open-Meteo archive endpoint (override to point training at a local stub server)
+OPEN_METEO_ARCHIVE_URL = os.getenv('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+
+# On-disk cache for seasonal weather, keyed by coordinates, season and year
+WEATHER_CACHE_DIR = os.getenv('WEATHER_CACHE_DIR', os.path.join('.cache', 'weather'))
+
+# Define season date ranges (approximate)
+SEASON_RANGES = {
+    'Summer': {'start': '03-01', 'end': '05-31'},
+    'Monsoon': {'start': '06-01', 'end': '09-30'},
+    'Winter': {'start': '12-01', 'end': '02-28'}
+}
+
+DEFAULT_SEASON_YEAR = 2023  # Default to recent year
+
 # District coordinates (approximate for Karnataka districts)
 DISTRICT_COORDS = {
     'Tumkur': {'lat': 13.34, 'lon': 77.10},
@@ -35,32 +55,25 @@ def get_current_weather(district):
 
     return {'temperature_C': temperature, 'humidity_percent': humidity}
 
-def get_seasonal_weather(district, season, year=None):
+def get_seasonal_weather(district, season, year=None, session=None):
     """Fetch average weather for a season using Open-Meteo historical API."""
     if district not in DISTRICT_COORDS:
         raise ValueError(f"District {district} not found in coordinates.")
 
     coords = DISTRICT_COORDS[district]
 
-    # Define season date ranges (approximate)
-    season_ranges = {
-        'Summer': {'start': '03-01', 'end': '05-31'},
-        'Monsoon': {'start': '06-01', 'end': '09-30'},
-        'Winter': {'start': '12-01', 'end': '02-28'}
-    }
-
-    if season not in season_ranges:
+    if season not in SEASON_RANGES:
         raise ValueError(f"Season {season} not supported.")
 
     if year is None:
-        year = 2023  # Default to recent year
+        year = DEFAULT_SEASON_YEAR
 
-    start_date = f"{year}-{season_ranges[season]['start']}"
-    end_date = f"{year}-{season_ranges[season]['end']}"
+    start_date = f"{year}-{SEASON_RANGES[season]['start']}"
+    end_date = f"{year}-{SEASON_RANGES[season]['end']}"
 
-    url = f"https://archive-api.open-meteo.com/v1/archive?latitude={coords['lat']}&longitude={coords['lon']}&start_date={start_date}&end_date={end_date}&daily=temperature_2m_mean,relative_humidity_2m_mean,precipitation_sum&timezone=Asia/Kolkata"
+    url = f"{OPEN_METEO_ARCHIVE_URL}?latitude={coords['lat']}&longitude={coords['lon']}&start_date={start_date}&end_date={end_date}&daily=temperature_2m_mean,relative_humidity_2m_mean,precipitation_sum&timezone=Asia/Kolkata"
 
-    response = requests.get(url)
+    response = (session or requests).get(url, timeout=30)
     if response.status_code != 200:
         raise Exception(f"Open-Meteo API error: {response.status_code}")
 
@@ -80,3 +93,95 @@ def get_seasonal_weather(district, season, year=None):
         'humidity_percent': avg_humidity,
         'rainfall_mm': total_rain
     }
+
+class TokenBucket:
+    """Thread-safe token bucket: at most `rate` acquisitions per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class WeatherCache:
+    """One JSON file per (lat, lon, season, year) under cache_dir."""
+
+    def __init__(self, cache_dir=WEATHER_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, district, season, year):
+        coords = DISTRICT_COORDS[district]
+        return os.path.join(self.cache_dir, f"{coords['lat']}_{coords['lon']}_{season}_{year}.json")
+
+    def get(self, district, season, year):
+        try:
+            with open(self._path(district, season, year)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, district, season, year, weather):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(district, season, year)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(weather, f)
+        os.replace(tmp_path, path)
+
+def fetch_seasonal_weather_batch(pairs, year=None, max_workers=8, rate_per_sec=5, cache_dir=WEATHER_CACHE_DIR):
+    """
+    Fetch seasonal weather for many (district, season) pairs concurrently.
+    Requests share a pooled Session and a token-bucket rate limit; results are read from
+    and written to the on-disk cache, so reruns need no network calls.
+    Returns (weather, errors): dicts keyed by (district, season).
+    """
+    if year is None:
+        year = DEFAULT_SEASON_YEAR
+    cache = WeatherCache(cache_dir) if cache_dir else None
+    weather, errors, pending = {}, {}, []
+
+    for district, season in dict.fromkeys(pairs):
+        cached = cache.get(district, season, year) if cache and district in DISTRICT_COORDS else None
+        if cached is not None:
+            weather[(district, season)] = cached
+        else:
+            pending.append((district, season))
+
+    if not pending:
+        return weather, errors
+
+    bucket = TokenBucket(rate_per_sec)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    def fetch(pair):
+        bucket.acquire()
+        result = get_seasonal_weather(pair[0], pair[1], year, session=session)
+        if cache:
+            cache.put(pair[0], pair[1], year, result)
+        return result
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pair: pool.submit(fetch, pair) for pair in pending}
+        for pair, future in futures.items():
+            try:
+                weather[pair] = future.result()
+            except Exception as e:
+                errors[pair] = e
+
+    return weather, errors
@@ -0,0 +1,207 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+import model_bundle
+from features import CATEGORICAL_FEATURES
+from tracing import annotate, stage, trace
+
+# What-if yield sweeps for scenario planning.
+#
+# A sweep fixes (or lists) the categorical inputs and gives a range for each weather input:
+#
+#   {"district": "Tumkur", "season": "Summer", "variety": ["Alphonso", "Totapuri"], "soil_type": "Clayey",
+#    "rainfall_mm": {"start": 200, "stop": 1500, "steps": 50},
+#    "temperature_C": {"start": 20, "stop": 38, "step": 0.5},
+#    "humidity_percent": [50, 60, 70]}
+#
+# Every combination of the categorical lists is a scenario; within a scenario the weather grid
+# is the Cartesian product of the axes. Numeric inputs the spec leaves out (year, area_hectare,
+# production_tonnes, ...) are held at a fixed default, by default the training data's typical
+# value (model_bundle.typical_inputs). Grid points are generated lazily, CHUNK_SIZE at a time,
+# from flat indices (np.unravel_index), transformed column-wise into one reused buffer and
+# scored with one predict call per chunk, so memory stays flat however large the grid is.
+# The result is a float32 array shaped (scenarios, *axis lengths).
+#
+# Usage:
+#   python yield_sweep.py sweep.json --output surface.parquet   (or .npz)
+
+CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", "65536"))
+MAX_SWEEP_POINTS = int(os.getenv("MAX_SWEEP_POINTS", "2000000"))
+MAX_AXIS_STEPS = 10000
+
+def axis_values(name, spec):
+    """
+    Values of one sweep axis: a number, a list of numbers, {"start", "stop", "steps"} (inclusive
+    linspace) or {"start", "stop", "step"} (inclusive arange). Raises ValueError on bad specs.
+    """
+    if isinstance(spec, dict):
+        try:
+            start, stop = float(spec["start"]), float(spec["stop"])
+            if "steps" in spec:
+                steps = int(spec["steps"])
+            else:
+                step = float(spec["step"])
+                if step <= 0:
+                    raise ValueError(f"'{name}' step must be positive")
+                steps = int(np.floor((stop - start) / step + 1e-9)) + 1
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"'{name}' range needs start, stop and steps or step") from e
+        if not 1 <= steps <= MAX_AXIS_STEPS:
+            raise ValueError(f"'{name}' must have between 1 and {MAX_AXIS_STEPS} steps")
+        if "steps" in spec:
+            return np.linspace(start, stop, steps)
+        return start + step * np.arange(steps)
+    values = spec if isinstance(spec, (list, tuple)) else [spec]
+    try:
+        values = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"'{name}' values must be numbers") from e
+    if values.ndim != 1 or not 1 <= len(values) <= MAX_AXIS_STEPS or np.isnan(values).any():
+        raise ValueError(f"'{name}' must be a number, a list of numbers or a range")
+    return values
+
+class Sweep:
+    """
+    A validated sweep request: categorical scenarios x a grid over the numeric inputs in the spec.
+    Numeric inputs missing from the spec take their value from defaults (a raw input row).
+    """
+
+    def __init__(self, pipeline, spec, defaults=None):
+        if not isinstance(spec, dict):
+            raise ValueError("Expected a JSON object")
+        self.pipeline = pipeline
+
+        categorical = {}
+        for col in CATEGORICAL_FEATURES:
+            values = spec.get(col)
+            values = values if isinstance(values, list) else [values]
+            unknown = [v for v in values if not isinstance(v, str) or v not in pipeline.lookups[col]]
+            if unknown or not values:
+                raise ValueError(f"Unknown or missing value for '{col}': {unknown[0] if unknown else None!r}")
+            categorical[col] = values
+        self.scenarios = [dict(zip(CATEGORICAL_FEATURES, combo))
+                          for combo in itertools.product(*categorical.values())]
+
+        defaults = defaults or {}
+        self.axes = {}
+        self.fixed = {}
+        for col in pipeline.numeric_features:
+            if spec.get(col) is not None:
+                self.axes[col] = axis_values(col, spec[col])
+            elif defaults.get(col) is not None:
+                self.fixed[col] = float(defaults[col])
+            else:
+                raise ValueError(f"Missing value for '{col}'")
+        if not self.axes:
+            raise ValueError("A sweep needs at least one numeric input to vary")
+        self.shape = tuple(len(v) for v in self.axes.values())
+        self.grid_points = int(np.prod(self.shape))
+        self.points = self.grid_points * len(self.scenarios)
+        if self.points > MAX_SWEEP_POINTS:
+            raise ValueError(f"Sweep has {self.points} points, the limit is {MAX_SWEEP_POINTS}")
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """Yield (scenario index, flat grid slice, columns) for every chunk of the grid."""
+        axis_names = list(self.axes)
+        for s, scenario in enumerate(self.scenarios):
+            for start in range(0, self.grid_points, chunk_size):
+                stop = min(start + chunk_size, self.grid_points)
+                coords = np.unravel_index(np.arange(start, stop), self.shape)
+                columns = {**scenario, **self.fixed}
+                for name, idx in zip(axis_names, coords):
+                    columns[name] = self.axes[name][idx]
+                yield s, slice(start, stop), columns
+
+    def run(self, scorer, chunk_size=CHUNK_SIZE):
+        """Score the whole sweep; returns a float32 array shaped (scenarios, *axis lengths)."""
+        out = np.empty((len(self.scenarios), self.grid_points), dtype=np.float32)
+        buffer = np.empty((min(chunk_size, self.grid_points), self.pipeline.n_features), dtype=np.float64)
+        for s, flat, columns in self.iter_chunks(chunk_size):
+            n = flat.stop - flat.start
+            with stage("transform"):
+                X = self.pipeline.transform_columns(columns, n, out=buffer)
+            with stage("predict"):
+                out[s, flat] = scorer.predict(X)
+        return out.reshape((len(self.scenarios),) + self.shape)
+
+    def surface(self, yields, x, y, scenario=0):
+        """
+        2-D slice of run() output for one scenario: rows along axis y, columns along axis x.
+        Every other axis must have a single value.
+        """
+        names = list(self.axes)
+        for name in (x, y):
+            if name not in self.axes:
+                raise ValueError(f"'{name}' is not a sweep axis")
+        others = [name for name in names if name not in (x, y)]
+        if any(len(self.axes[name]) != 1 for name in others):
+            raise ValueError(f"A surface over {y} x {x} needs a single value for {', '.join(others)}")
+        grid = np.moveaxis(yields[scenario], [names.index(y), names.index(x)], [0, 1])
+        return grid.reshape(len(self.axes[y]), len(self.axes[x]))
+
+    def to_dict(self, yields, decimals=4):
+        """JSON-friendly result: axis values, fixed inputs, scenarios and the C-order flattened yields."""
+        return {
+            "axes": {name: values.tolist() for name, values in self.axes.items()},
+            "fixed": self.fixed,
+            "scenarios": self.scenarios,
+            "shape": [len(self.scenarios), *self.shape],
+            "yield": np.round(yields.astype(np.float64), decimals).ravel().tolist(),
+        }
+
+    def to_frame(self, yields):
+        """Long-format DataFrame, one row per point; categoricals use the pandas category dtype."""
+        import pandas as pd
+        n_scenarios = len(self.scenarios)
+        scenario_idx = np.repeat(np.arange(n_scenarios), self.grid_points)
+        data = {}
+        for col in CATEGORICAL_FEATURES:
+            codes, categories = pd.factorize([scenario[col] for scenario in self.scenarios])
+            data[col] = pd.Categorical.from_codes(codes[scenario_idx], categories=categories)
+        coords = np.unravel_index(np.arange(self.grid_points), self.shape)
+        for name, idx in zip(self.axes, coords):
+            data[name] = np.tile(self.axes[name][idx].astype(np.float32), n_scenarios)
+        for name, value in self.fixed.items():
+            data[name] = np.full(n_scenarios * self.grid_points, value, dtype=np.float32)
+        data["yield"] = yields.reshape(-1)
+        return pd.DataFrame(data)
+
+    def to_parquet(self, yields):
+        buffer = io.BytesIO()
+        self.to_frame(yields).to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+def run_sweep(spec, artifacts=None, chunk_size=CHUNK_SIZE):
+    """Validate and score a sweep spec; returns (Sweep, yields)."""
+    artifacts = artifacts or model_bundle.load_artifacts()
+    sweep = Sweep(artifacts["pipeline"], spec, model_bundle.typical_inputs(artifacts))
+    annotate(points=sweep.points, scenarios=len(sweep.scenarios))
+    return sweep, sweep.run(artifacts["scorer"], chunk_size)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score a what-if yield sweep")
+    parser.add_argument("spec", help="sweep JSON file (see the module comment)")
+    parser.add_argument("--output", default="yield_sweep.parquet", help="results file, .parquet or .npz (default: yield_sweep.parquet)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"grid points per predict call (default: {CHUNK_SIZE})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.spec) as f:
+        spec = json.load(f)
+    start = time.perf_counter()
+    with trace("yield_sweep"):
+        sweep, yields = run_sweep(spec, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    if args.output.lower().endswith(".npz"):
+        np.savez_compressed(args.output, yields=yields, **sweep.axes, **sweep.fixed)
+    else:
+        with open(args.output, "wb") as f:
+            f.write(sweep.to_parquet(yields))
+    print(f"{sweep.points} points in {elapsed:.2f} s ({sweep.points / elapsed:,.0f} points/s) -> {args.output}",
+          file=sys.stderr)